@@ -0,0 +1,423 @@
+##! /usr/bin/python
+__author__ = 'Zach Dischner'
+__copyright__ = "NA"
+__credits__ = ["NA"]
+__license__ = "NA"
+__version__ = "1.0.0"
+__maintainer__ = "Zach Dischner"
+__email__ = "zach.dischner@gmail.com"
+__status__ = "Dev"
+
+"""
+File name: Benchmark.py
+Authors: Zach Dischner
+Created: 6/24/2014
+Modified:
+
+Per-stage benchmarks for ParseEvents, run against synthetic event files.
+
+Realistic input files are generated for every event type (SAT pairs for the STK-format types) at the requested
+row counts, then each stage of the conversion is timed on its own:
+    load        Reading the CSVs into a dataframe
+    pairing     Finding the files of a product
+    times       Parsing the Start and Stop columns
+    tokenize    Reading the files with the memory-mapped `StkTokenizer` instead, times included (load + times)
+    ids         Leasing and handing out one Unique ID per row
+    records     Building the compact `EventRecords` every serializer works from
+    tree        Building the <Event> elements
+    indent      Pretty-printing the tree
+    write       Serializing the tree to disk
+    stream      Rendering and writing every event from string templates, the streaming path (tree + indent + write)
+
+Each (type, rows) case runs in its own process, so the reported peak memory belongs to that case alone. The
+bytes each event takes as a record (array row plus its share of the interned tables) is reported with it.
+Results can be saved as a baseline, and later runs compared against it to catch a regression in any stage.
+
+Cold start is measured separately: the whole `python ParseEvents.py file` command, interpreter start and imports
+included, with the pandas-free lite engine and with the DataFrame path, on small files.
+
+Examples:
+    python Benchmark.py --sizes 1000 10000 100000 --save
+    python Benchmark.py --sizes 1000 10000 100000        # exits 1 if any stage regressed
+    python Benchmark.py --cold-start 2 100 1000 --types MANEUVER PHOTO
+"""
+
+# -------------------------
+# --- IMPORT AND GLOBAL ---
+# -------------------------
+import sys, os, json, time, shutil, tempfile, resource, multiprocessing, pickle, logging, subprocess
+import xml.etree.cElementTree as ET
+import numpy as np
+import ParseEvents
+import UniqueIDs
+import EventRecords
+import StkTokenizer
+
+"""
+Global Variables
+@param baseline_file:   Default file to save and compare baselines
+@param default_sizes:   Default row counts to benchmark. The full range goes up to 1e7
+@param stages:          Stage names, in the order they run
+@param months:          Month abbreviations for writing STK dates
+@param cold_start_sizes: Default row counts for the cold start runs, the sizes schedulers mostly see
+"""
+baseline_file = "Benchmark.json"
+default_sizes = [1000, 10000, 100000]
+stages = ["load", "pairing", "times", "tokenize", "ids", "records", "tree", "indent", "write", "stream"]
+cold_start_sizes = [2, 100, 1000]
+months = ["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"]
+
+
+def _stkTime(t):
+    """Formats a datetime like STK does, I.E. '4 Jul 2014 00:58:19.332'"""
+    return "%d %s %d %02d:%02d:%02d.%03d" % (t.day, months[t.month-1], t.year, t.hour, t.minute, t.second,
+                                             t.microsecond//1000)
+
+
+def _commTime(t):
+    """Formats a datetime like the COMM files do, I.E. '2012/07/17_08:12:17.500'"""
+    return "%04d/%02d/%02d_%02d:%02d:%02d.%03d" % (t.year, t.month, t.day, t.hour, t.minute, t.second,
+                                                   t.microsecond//1000)
+
+
+def _syntheticIntervals(rows, seed):
+    """Sorted, non-overlapping (start, stop) datetime pairs, spaced a few minutes apart"""
+    rng = np.random.RandomState(seed)
+    durations = rng.randint(5000, 2400000, size=rows)              # ms
+    gaps = rng.randint(1000, 3600000, size=rows)                    # ms
+    starts = np.cumsum(gaps + np.concatenate([[0], durations[:-1]]))
+    epoch = np.datetime64('2014-07-04T00:00:00.000')
+    starts = epoch + starts.astype('timedelta64[ms]')
+    stops = starts + durations.astype('timedelta64[ms]')
+    return starts.astype('M8[ms]').tolist(), stops.astype('M8[ms]').tolist(), durations
+
+
+def generateEventFiles(event_type, rows, out_dir, seed=0):
+    """Writes a synthetic event product with about `rows` events in total. STK-format types are split evenly
+    over a SAT1/SAT2 pair, like the real inputs.
+
+    Args:
+        event_type:     Key into ParseEvents.event_types
+        rows:           Total number of events
+        out_dir:        Directory to write into
+
+    Kwargs:
+        seed:   Random seed, so runs are repeatable
+
+    Returns:
+        fnames:     Filenames written, the first one is the one to convert
+
+    Examples:
+        fnames = Benchmark.generateEventFiles("ECLIPSE", 100000, "/tmp/bench")
+    """
+    stamp = "20140704000000_20140711000000_20140604123800_V1"
+    if event_type == "COMM":
+        fname = "%s/COMM_%s.csv" % (out_dir, stamp)
+        starts,stops,durations = _syntheticIntervals(rows, seed)
+        f = open(fname, 'w')
+        f.write("Name,Priority,Start,Stop,Duration,Status,Groups,Resources\n")
+        for i,(start,stop,dur) in enumerate(zip(starts,stops,durations)):
+            sat = "SAT%d" % (i % 2 + 1)
+            f.write("%sCOMM(%d),5,%s,%s,0_day(s)_%02d:%02d:%02d.%03d,Assigned,%s, GRD\n" %
+                    (sat, i+1, _commTime(start), _commTime(stop), dur//3600000, dur//60000 % 60, dur//1000 % 60,
+                     dur % 1000, sat))
+        f.close()
+        return [fname]
+
+    fnames = []
+    for k,sat in enumerate(["SAT1","SAT2"]):
+        fname = "%s/%s_%s_%s.csv" % (out_dir, event_type, sat, stamp)
+        starts,stops,durations = _syntheticIntervals(rows//2, seed + k)
+        f = open(fname, 'w')
+        if event_type == "MANEUVER":
+            f.write('"Target","Start Time (UTCG)","Stop Time (UTCG)","Duration (sec)"\n')
+            targets = ["NADIR","SUN","TARGET%d" % k]
+            for i,(start,stop,dur) in enumerate(zip(starts,stops,durations)):
+                f.write("%s,%s,%s,%.3f\n" % (targets[i % 3], _stkTime(start), _stkTime(stop), dur/1e3))
+        else:
+            f.write('"Start Time (UTCG)","Stop Time (UTCG)","Duration (sec)"\n')
+            for start,stop,dur in zip(starts,stops,durations):
+                f.write("%s,%s,%.3f\n" % (_stkTime(start), _stkTime(stop), dur/1e3))
+        f.close()
+        fnames.append(fname)
+    return fnames
+
+
+def peakMemory():
+    """Peak resident memory of this process so far, in MB"""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    ## Linux reports kB, OSX reports bytes
+    return maxrss / (1024.0*1024.0 if sys.platform == 'darwin' else 1024.0)
+
+
+def benchmarkStages(event_type, fname, work_dir):
+    """Runs and times each conversion stage on its own, in the same order parseCSV() would.
+
+    Args:
+        event_type:     Key into ParseEvents.event_types
+        fname:          Input file to convert
+        work_dir:       Scratch directory for the ID counter and output
+
+    Returns:
+        results:    Dict of stage -> {'seconds', 'rows_per_sec', 'peak_mb'}, plus 'rows' and 'bytes_per_event'
+
+    Examples:
+        results = Benchmark.benchmarkStages("PHOTO", fnames[0], "/tmp/bench")
+    """
+    spec = ParseEvents.event_types[event_type]
+    results = {}
+    timings = []
+
+    def timed(stage, func, *args, **kwargs):
+        t0 = time.time()
+        out = func(*args, **kwargs)
+        timings.append((stage, time.time() - t0, peakMemory()))
+        return out
+
+    ###### Use a scratch ID counter, never the real one
+    ParseEvents.pName = work_dir + "/UniqueID.pickle"
+    f = open(ParseEvents.pName, 'w')
+    pickle.dump(0, f)
+    f.close()
+
+    if spec['paired'] is True:
+        members,combo_fn = timed("pairing", ParseEvents.findPairedEventFiles, fname)
+        ## Raw read only, ParseEvents.loadEventFiles() would parse the times too
+        def load():
+            frames = [ParseEvents.zsheet.import_csv(fname, header=0, names=spec['columns']).assign(Sat=sat)
+                        for fname,sat in members]
+            return ParseEvents.pd.concat(frames).dropna()
+        df = timed("load", load)
+    else:
+        timings.append(("pairing", 0.0, peakMemory()))
+        combo_fn = fname.split('/')[-1]
+        df = timed("load", lambda: ParseEvents.zsheet.import_csv(fname, header=0, names=spec['columns']).dropna())
+    rows = len(df)
+
+    timed("times", ParseEvents.parseEventTimes, df, input_format=spec['time_format'])
+    if spec['time_format'] == ParseEvents.typical_in_format:
+        timed("tokenize", lambda: [StkTokenizer.readStkEventFile(fname, spec['columns'], ParseEvents.lite_na_values)
+                                    for fname,sat in members])
+    else:
+        timings.append(("tokenize", 0.0, peakMemory()))
+    startTime,stopTime = ParseEvents.getStartStopTimes(df)
+
+    def allocate():
+        with UniqueIDs.leaseUniqueIDs(rows, ParseEvents.pName) as lease:
+            for i in xrange(rows):
+                lease.nextID()
+    timed("ids", allocate)
+    records = timed("records", EventRecords.EventRecords.fromFrame, df, spec, 1)
+
+    root = ParseEvents.generateXMLHeader(startTime, stopTime, combo_fn)
+    root = timed("tree", ParseEvents.getEventEmitter(event_type), root, df)
+    timed("indent", ParseEvents.indent, root)
+    timed("write", ET.ElementTree(root).write, work_dir + "/out.xml", xml_declaration=True, method="xml")
+
+    def stream():
+        writer = ParseEvents.XMLEventWriter(out_filename=work_dir + "/stream.xml")
+        writer.writeHeader(ParseEvents.generateXMLHeader(startTime, stopTime, combo_fn))
+        ParseEvents.getEventEmitter(event_type)(None, df, writer=writer)
+        writer.close()
+    timed("stream", stream)
+
+    ###### Order stages like the `stages` global
+    for stage,seconds,peak_mb in timings:
+        results[stage] = {'seconds': seconds, 'rows_per_sec': rows / seconds if seconds > 0 else None,
+                          'peak_mb': peak_mb}
+    results['rows'] = rows
+    results['bytes_per_event'] = records.nbytes / float(rows) if rows else None
+    return results
+
+
+def _runCase(event_type, rows, queue):
+    """Process target for one (type, rows) case. Puts the results (or the error) on the queue."""
+    work_dir = tempfile.mkdtemp(prefix="eventbench_")
+    try:
+        ## Quiet the parser's progress output
+        sys.stdout = open(os.devnull, 'w')
+        logging.getLogger("ParseEvents").disabled = True
+        fnames = generateEventFiles(event_type, rows, work_dir)
+        queue.put(benchmarkStages(event_type, fnames[0], work_dir))
+    except Exception as e:
+        queue.put({'error': "%s: %s" % (type(e).__name__, e)})
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def runBenchmarks(event_types=None, sizes=default_sizes):
+    """Benchmarks every event type at every size, each case in a fresh process.
+
+    Kwargs:
+        event_types:    List of event types. Defaults to all of ParseEvents.event_types
+        sizes:          List of total row counts
+
+    Returns:
+        results:    Dict of "TYPE/rows" -> `benchmarkStages()` results
+
+    Examples:
+        results = Benchmark.runBenchmarks(["ECLIPSE"], sizes=[1000,1000000])
+    """
+    if event_types is None:
+        event_types = sorted(ParseEvents.event_types.keys())
+    results = {}
+    for event_type in event_types:
+        for rows in sizes:
+            queue = multiprocessing.Queue()
+            proc = multiprocessing.Process(target=_runCase, args=(event_type, rows, queue))
+            proc.start()
+            result = queue.get()
+            proc.join()
+            results["%s/%d" % (event_type, rows)] = result
+            printCase("%s/%d" % (event_type, rows), result)
+    return results
+
+
+def benchmarkColdStart(event_type, rows, repeats=5):
+    """Times whole `ParseEvents.py` runs on a small product, with the lite engine and with the DataFrame path
+    (--lite-max-bytes 0), each in a fresh interpreter. The two outputs are checked to be identical.
+
+    Args:
+        event_type:     Key into ParseEvents.event_types
+        rows:           Total number of events
+
+    Kwargs:
+        repeats:    Runs of each engine, the median is reported
+
+    Returns:
+        result:     Dict with 'lite_ms' and 'pandas_ms' (median wall time), 'bytes' (input size) and 'identical'
+
+    Examples:
+        result = Benchmark.benchmarkColdStart("MANEUVER", 2)
+    """
+    work_dir = tempfile.mkdtemp(prefix="eventcold_")
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ParseEvents.py")
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.dirname(script)] + filter(None, [env.get('PYTHONPATH')]))
+    try:
+        os.makedirs(work_dir + "/Input")
+        os.makedirs(work_dir + "/Output")
+        fnames = generateEventFiles(event_type, rows, work_dir + "/Input")
+        result = {'bytes': sum(os.path.getsize(fname) for fname in fnames)}
+        outputs = {}
+        for engine,limit in [("lite", 1<<30), ("pandas", 0)]:
+            times = []
+            for k in range(repeats):
+                ## Same IDs every run, so the outputs can be compared
+                f = open(work_dir + "/UniqueID.pickle", 'w')
+                pickle.dump(0, f)
+                f.close()
+                t0 = time.time()
+                subprocess.check_call([sys.executable, script, fnames[0], "--log-level", "ERROR",
+                                       "--lite-max-bytes", str(limit)], cwd=work_dir, env=env)
+                times.append(time.time() - t0)
+            result[engine + '_ms'] = sorted(times)[len(times)//2] * 1e3
+            outputs[engine] = [[line for line in open(work_dir + "/Output/" + name) if "CREATION_DATE" not in line]
+                                for name in sorted(os.listdir(work_dir + "/Output"))]
+        result['identical'] = outputs["lite"] == outputs["pandas"]
+        return result
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def runColdStarts(event_types=None, sizes=cold_start_sizes, repeats=5):
+    """Runs `benchmarkColdStart()` for every type and size, printing a table as it goes
+
+    Kwargs:
+        event_types:    List of event types. Defaults to all of ParseEvents.event_types
+        sizes:          List of total row counts
+        repeats:        Runs of each engine per case
+
+    Returns:
+        results:    Dict of "TYPE/rows" -> `benchmarkColdStart()` result
+    """
+    if event_types is None:
+        event_types = sorted(ParseEvents.event_types.keys())
+    results = {}
+    print "    %-16s %10s %10s %12s %10s" % ("case", "bytes", "lite ms", "pandas ms", "identical")
+    for event_type in event_types:
+        for rows in sizes:
+            case = "%s/%d" % (event_type, rows)
+            results[case] = r = benchmarkColdStart(event_type, rows, repeats=repeats)
+            print "    %-16s %10d %10.1f %12.1f %10s" % (case, r['bytes'], r['lite_ms'], r['pandas_ms'], r['identical'])
+    return results
+
+
+def printCase(case, result):
+    """Prints one case's per-stage table"""
+    print "\n%s" % case
+    if 'error' in result:
+        print "    FAILED: %s" % result['error']
+        return
+    print "    %-8s %10s %14s %10s" % ("stage", "seconds", "rows/sec", "peak MB")
+    for stage in stages:
+        r = result[stage]
+        rate = "%14.0f" % r['rows_per_sec'] if r['rows_per_sec'] else "%14s" % "-"
+        print "    %-8s %10.4f %s %10.1f" % (stage, r['seconds'], rate, r['peak_mb'])
+    if result.get('bytes_per_event'):
+        print "    %.1f bytes per event as records" % result['bytes_per_event']
+
+
+def compareToBaseline(results, baseline, tolerance=0.2):
+    """Finds every stage whose throughput dropped more than `tolerance` below the baseline.
+
+    Args:
+        results:    Results from `runBenchmarks()`
+        baseline:   Earlier results to compare against
+
+    Kwargs:
+        tolerance:  Fractional slowdown allowed before a stage counts as regressed
+
+    Returns:
+        regressions:    List of (case, stage, baseline rows/sec, current rows/sec)
+
+    Examples:
+        regressions = Benchmark.compareToBaseline(results, json.load(open("Benchmark.json")))
+    """
+    regressions = []
+    for case,result in sorted(results.items()):
+        if case not in baseline or 'error' in result or 'error' in baseline[case]:
+            continue
+        for stage in stages:
+            ## Baselines saved before a stage existed can't say anything about it
+            if stage not in baseline[case]:
+                continue
+            old = baseline[case][stage]['rows_per_sec']
+            new = result[stage]['rows_per_sec']
+            ## Stages too quick to time don't say anything
+            if not old or not new or baseline[case][stage]['seconds'] < 1e-2:
+                continue
+            if new < old * (1.0 - tolerance):
+                regressions.append((case, stage, old, new))
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+    argparser = argparse.ArgumentParser(description="Per-stage ParseEvents benchmarks on synthetic event files")
+    argparser.add_argument("--types", nargs='+', default=None, help="Event types to run (default: all)")
+    argparser.add_argument("--sizes", nargs='+', type=int, default=default_sizes, help="Total rows per case")
+    argparser.add_argument("--baseline", default=baseline_file, help="Baseline file to compare with / save to")
+    argparser.add_argument("--save", action="store_true", help="Save these results as the new baseline")
+    argparser.add_argument("--tolerance", type=float, default=0.2, help="Allowed fractional slowdown per stage")
+    argparser.add_argument("--cold-start", nargs='*', type=int, default=None, metavar="ROWS",
+                           help="Time whole runs on small files instead, lite engine vs pandas (default rows: %s)" %
+                                " ".join(str(rows) for rows in cold_start_sizes))
+    args = argparser.parse_args()
+
+    if args.cold_start is not None:
+        results = runColdStarts(args.types, args.cold_start or cold_start_sizes)
+        sys.exit(0 if all(r['identical'] for r in results.values()) else 1)
+
+    results = runBenchmarks(args.types, args.sizes)
+
+    if args.save:
+        json.dump(results, open(args.baseline, 'w'), indent=2, sort_keys=True)
+        print "\nSaved baseline to %s" % args.baseline
+    elif os.path.exists(args.baseline):
+        regressions = compareToBaseline(results, json.load(open(args.baseline)), tolerance=args.tolerance)
+        for case,stage,old,new in regressions:
+            print "REGRESSION %s %s: %.0f -> %.0f rows/sec" % (case, stage, old, new)
+        if len(regressions):
+            sys.exit(1)
+        print "\nNo regressions against %s" % args.baseline
@@ -0,0 +1,170 @@
+##! /usr/bin/python
+__author__ = 'Zach Dischner'
+__copyright__ = "NA"
+__credits__ = ["NA"]
+__license__ = "NA"
+__version__ = "1.0.0"
+__maintainer__ = "Zach Dischner"
+__email__ = "zach.dischner@gmail.com"
+__status__ = "Dev"
+
+"""
+File name: EventCache.py
+Authors: Zach Dischner
+Created: 6/26/2014
+Modified:
+
+On-disk cache of parsed event files, so reruns on the same inputs skip the CSV tokenizing and timestamp parsing.
+
+Each input file is cached under a key made from the SHA1 of its contents plus the column names and time format
+it was read with, so renamed or copied files still hit and edited files never do. A cache entry is a directory
+of NumPy .npy files, one per column, loaded back memory-mapped:
+    StartTime, StopTime     datetime64[ns] parsed times
+    Start, Stop             Original time strings, fixed width bytes (categorical if any are missing)
+    other text columns      Categorical, int32 codes with the categories in meta.json (Target, Groups, Status...)
+    numeric columns         As read (float durations...)
+    meta.json               Column order and how each column is stored
+
+Entries are written to a temp directory and renamed into place, so concurrent conversions never see a partial one.
+
+Examples:
+    df = EventCache.loadEventFile("Input/ECLIPSE_SAT1_..._V1.csv", cols, time_format, "Cache", reader)
+"""
+
+# -------------------------
+# --- IMPORT AND GLOBAL ---
+# -------------------------
+import pandas as pd
+import numpy as np
+import os, json, hashlib, shutil, tempfile
+import Metrics
+
+"""
+Global Variables
+@param cache_version:   Bumped whenever the entry layout changes, so old entries are never misread
+@param time_columns:    Raw time string columns, kept as fixed width bytes rather than categoricals
+"""
+cache_version = 1
+time_columns = ["Start", "Stop"]
+
+
+def getCacheKey(filename, cols, time_format):
+    """Cache key for an input file: SHA1 of its contents and of how it is read
+
+    Args:
+        filename:       Input event file
+        cols:           Column names it is read with (None for the file's header)
+        time_format:    Input date format of the Start and Stop columns
+
+    Returns:
+        key:    Hex digest string
+
+    Examples:
+        key = EventCache.getCacheKey("Input/ECLIPSE_SAT1_..._V1.csv", ["Start","Stop","Duration"], fmt)
+    """
+    digest = hashlib.sha1(json.dumps([cache_version, cols, time_format]))
+    f = open(filename, 'rb')
+    try:
+        for block in iter(lambda: f.read(1<<20), ''):
+            digest.update(block)
+    finally:
+        f.close()
+    return digest.hexdigest()
+
+
+def saveEntry(entry_dir, df):
+    """Writes a parsed dataframe as a cache entry. Already existing entries are left alone.
+
+    Args:
+        entry_dir:  Directory of the entry, `cache_dir/key`
+        df:         Dataframe with times parsed (StartTime and StopTime columns)
+    """
+    if os.path.isdir(entry_dir):
+        return
+    parent = os.path.dirname(entry_dir)
+    if not os.path.isdir(parent):
+        try:
+            os.makedirs(parent)
+        except OSError:
+            ## Somebody else made it first
+            pass
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".tmp_")
+    try:
+        meta = {'columns': [], 'kinds': {}, 'categories': {}}
+        for k,name in enumerate(df.columns):
+            values = df[name].values
+            if values.dtype == object and name in time_columns and not pd.isnull(values).any():
+                kind = 'bytes'
+                values = values.astype(str)
+            elif values.dtype == object or pd.api.types.is_categorical_dtype(values):
+                kind = 'categorical'
+                categorical = pd.Categorical(values)
+                meta['categories'][name] = list(categorical.categories)
+                values = categorical.codes.astype(np.int32)
+            else:
+                kind = 'array'
+            meta['columns'].append(name)
+            meta['kinds'][name] = kind
+            np.save(os.path.join(tmp_dir, "%d.npy" % k), values)
+        f = open(os.path.join(tmp_dir, "meta.json"), 'w')
+        json.dump(meta, f)
+        f.close()
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        ## Lost the race to another writer of the same entry, theirs is just as good
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def loadEntry(entry_dir):
+    """Loads a cache entry back into a dataframe, column arrays memory-mapped
+
+    Args:
+        entry_dir:  Directory of the entry, `cache_dir/key`
+
+    Returns:
+        df:     Dataframe with the same columns (and times parsed) as when it was saved
+    """
+    f = open(os.path.join(entry_dir, "meta.json"))
+    meta = json.load(f)
+    f.close()
+    data = {}
+    for k,name in enumerate(meta['columns']):
+        values = np.load(os.path.join(entry_dir, "%d.npy" % k), mmap_mode='r')
+        kind = meta['kinds'][name]
+        if kind == 'bytes':
+            values = values.astype(object)
+        elif kind == 'categorical':
+            ## json hands text back as unicode, the csv reader gave str
+            categories = [c.encode('utf-8') if isinstance(c, unicode) else c for c in meta['categories'][name]]
+            values = pd.Categorical.from_codes(values, categories)
+        data[str(name)] = values
+    return pd.DataFrame(data, columns=[str(name) for name in meta['columns']])
+
+
+def loadEventFile(filename, cols, time_format, cache_dir, reader):
+    """Loads an event file through the cache. On a miss the file is read with `reader`, its times parsed and
+    the result saved for next time.
+
+    Args:
+        filename:       Input event file
+        cols:           Column names to read it with (None for the file's header)
+        time_format:    Input date format of the Start and Stop columns
+        cache_dir:      Directory holding the cache entries
+        reader:         Function reader(filename, cols, time_format) returning the dataframe with times parsed
+
+    Returns:
+        df:     Dataframe with times parsed, exactly what `reader` returns
+
+    Examples:
+        reader = lambda fname, cols, fmt: ParseEvents.parseEventTimes(pd.read_csv(fname, names=cols), fmt)
+        df = EventCache.loadEventFile(fname, cols, fmt, "Cache", reader)
+    """
+    entry_dir = os.path.join(cache_dir, getCacheKey(filename, cols, time_format))
+    if os.path.isdir(entry_dir):
+        Metrics.count("cache_hits")
+        return loadEntry(entry_dir)
+
+    Metrics.count("cache_misses")
+    df = reader(filename, cols, time_format)
+    saveEntry(entry_dir, df)
+    return df
@@ -0,0 +1,236 @@
+##! /usr/bin/python
+__author__ = 'Zach Dischner'
+__copyright__ = "NA"
+__credits__ = ["NA"]
+__license__ = "NA"
+__version__ = "1.0.0"
+__maintainer__ = "Zach Dischner"
+__email__ = "zach.dischner@gmail.com"
+__status__ = "Dev"
+
+"""
+File name: EventConflicts.py
+Authors: Zach Dischner
+Created: 7/1/2014
+Modified:
+
+Validation of a plan across event types. Every type is converted on its own, so nothing else notices a PHOTO
+window overlapping a MANEUVER on the same satellite. This merges the parsed events of all types per satellite
+(from an `EventStore`) and finds, in one sort plus a sweep:
+    overlaps    Two events sharing time, one not inside the other
+    contains    One event entirely inside another
+    gaps        Time on a satellite with no event of any checked type at all
+Pairs of the same type are skipped unless asked for, so overlapping eclipses don't drown the real conflicts.
+
+The sweep is done on sorted arrays: with events sorted by start, the events overlapping event i are exactly the
+ones after it starting before it stops, found with one binary search per event. Total cost is O(n log n + k)
+for k reported pairs, all in numpy. The report is JSON, written next to the XML products.
+
+Examples:
+    python EventConflicts.py Input --out Output/CONFLICTS.json
+    report = EventConflicts.checkConflicts(EventStore.EventStore.fromDirectory("Input"))
+"""
+
+# -------------------------
+# --- IMPORT AND GLOBAL ---
+# -------------------------
+import numpy as np
+import os, json, logging
+from datetime import datetime
+import EventStore
+
+"""
+Global Variables
+@param log:     Logger for progress and warnings
+"""
+log = logging.getLogger("EventConflicts")
+
+
+def findOverlaps(start, stop, codes=None, block=65536):
+    """Finds every pair of overlapping intervals. Touching intervals (one stops as the other starts) don't count.
+
+    Args:
+        start:  int64 start times, sorted
+        stop:   int64 stop times, same order
+
+    Kwargs:
+        codes:  Optional group code per interval (event type), pairs within the same group are skipped
+        block:  Intervals handled per pass, bounds the memory used for pairs that end up skipped
+
+    Returns:
+        first:  Index of the earlier starting interval of each pair
+        second: Index of the later starting interval of each pair
+
+    Examples:
+        i,j = EventConflicts.findOverlaps(np.array([0,5,20]), np.array([10,8,30]))   # -> [0],[1]
+    """
+    ## Everything after i that starts before i stops overlaps it
+    ends = np.searchsorted(start, stop, side='left')
+    firsts,seconds = [],[]
+    for b0 in xrange(0, len(start), block):
+        idx = np.arange(b0, min(b0 + block, len(start)))
+        counts = np.maximum(ends[idx] - idx - 1, 0)
+        first = np.repeat(idx, counts)
+        second = first + 1 + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        ## Zero length intervals sitting right on a start don't share any time
+        keep = stop[second] > start[first]
+        if codes is not None:
+            keep &= codes[first] != codes[second]
+        firsts.append(first[keep])
+        seconds.append(second[keep])
+    if len(firsts) == 0:
+        return np.arange(0),np.arange(0)
+    return np.concatenate(firsts),np.concatenate(seconds)
+
+
+def findGaps(start, stop, min_gap=0):
+    """Finds the stretches not covered by any interval, between the first start and the last stop
+
+    Args:
+        start:  int64 start times, sorted
+        stop:   int64 stop times, same order
+
+    Kwargs:
+        min_gap:    Only report gaps longer than this (same units as the times)
+
+    Returns:
+        gap_start:  Start of each gap
+        gap_stop:   End of each gap
+    """
+    if len(start) < 2:
+        return start[:0],start[:0]
+    reach = np.maximum.accumulate(stop)[:-1]
+    gap = start[1:] - reach
+    keep = gap > min_gap
+    return reach[keep],start[1:][keep]
+
+
+def _isoTime(ns):
+    """int64 nanoseconds as an ISO 8601 string to the millisecond"""
+    return str(np.datetime64(int(ns), 'ns').astype('datetime64[ms]'))
+
+
+def _eventSources(frame):
+    """Source file and row in it of each event of a frame (see `EventStore.EventStore.addFrame()`). Frames that
+    don't carry them fall back to their own index and no file"""
+    if 'SourceRow' in frame:
+        return np.asarray(frame.SourceFile, dtype=object),frame.SourceRow.values
+    return np.repeat(None, len(frame)),frame.index.values
+
+
+def checkSatellite(frames, same_type=False, min_gap=0):
+    """Checks the events of one satellite
+
+    Args:
+        frames:     Dict of event type -> dataframe of the satellite's events (times parsed)
+
+    Kwargs:
+        same_type:  Also report overlaps between two events of the same type
+        min_gap:    Only report gaps longer than this many seconds
+
+    Returns:
+        result:     Dict with 'overlaps' (list of pair dicts with 'kind' 'overlap' or 'contains') and 'gaps'.
+                    Each event of a pair is reported by its type, times, and 'file' and 'row' it was read from
+    """
+    types = sorted(frames)
+    start = np.concatenate([frames[t].StartTime.values.view('i8') for t in types])
+    stop = np.concatenate([frames[t].StopTime.values.view('i8') for t in types])
+    type_codes = np.concatenate([np.repeat(k, len(frames[t])) for k,t in enumerate(types)])
+    sources = [_eventSources(frames[t]) for t in types]
+    files = np.concatenate([source[0] for source in sources])
+    rows = np.concatenate([source[1] for source in sources])
+
+    ###### One sort, then the sweep
+    order = np.argsort(start, kind='mergesort')
+    start,stop,type_codes,files,rows = start[order],stop[order],type_codes[order],files[order],rows[order]
+    first,second = findOverlaps(start, stop, codes=None if same_type else type_codes)
+
+    ## Earlier start wins ties of containment, equal starts are checked both ways
+    contains = (stop[second] <= stop[first]) | ((start[second] == start[first]) & (stop[second] >= stop[first]))
+    shared = np.minimum(stop[first], stop[second]) - start[second]
+
+    overlaps = []
+    for i,j,inside,ns in zip(first.tolist(), second.tolist(), contains.tolist(), shared.tolist()):
+        overlaps.append({'kind': 'contains' if inside else 'overlap', 'overlap_s': ns / 1e9,
+                         'a': {'type': types[type_codes[i]], 'file': files[i], 'row': int(rows[i]),
+                               'start': _isoTime(start[i]), 'stop': _isoTime(stop[i])},
+                         'b': {'type': types[type_codes[j]], 'file': files[j], 'row': int(rows[j]),
+                               'start': _isoTime(start[j]), 'stop': _isoTime(stop[j])}})
+
+    gap_start,gap_stop = findGaps(start, stop, min_gap=int(min_gap * 1e9))
+    gaps = [{'start': _isoTime(a), 'stop': _isoTime(b), 'length_s': (b - a) / 1e9}
+                for a,b in zip(gap_start.tolist(), gap_stop.tolist())]
+    return {'overlaps': overlaps, 'gaps': gaps}
+
+
+def checkConflicts(store, t0=None, t1=None, sats=None, types=None, same_type=False, min_gap=0):
+    """Checks every satellite in an event store for overlaps, containment and gaps across event types
+
+    Args:
+        store:  EventStore of the parsed events
+
+    Kwargs:
+        t0,t1,sats,types:   Restrict the check, see `EventStore.query()`
+        same_type:          Also report overlaps between two events of the same type
+        min_gap:            Only report gaps longer than this many seconds
+
+    Returns:
+        report:     Dict with 'created', 'summary' and per satellite results under 'sats' (see `checkSatellite()`)
+
+    Examples:
+        report = EventConflicts.checkConflicts(store, types=["PHOTO","MANEUVER"], min_gap=3600)
+    """
+    report = {'created': datetime.utcnow().isoformat(), 'sats': {},
+              'summary': {'overlap': 0, 'contains': 0, 'gaps': 0}}
+    for sat in store.sats():
+        if sats is not None and sat not in sats:
+            continue
+        frames = store.query(t0, t1, sats=[sat], types=types)
+        if len(frames) == 0:
+            continue
+        result = checkSatellite(frames, same_type=same_type, min_gap=min_gap)
+        report['sats'][sat] = result
+        for pair in result['overlaps']:
+            report['summary'][pair['kind']] += 1
+        report['summary']['gaps'] += len(result['gaps'])
+    return report
+
+
+def writeReport(report, filename):
+    """Writes a report as JSON, to a temp file renamed into place
+
+    Args:
+        report:     Dict from `checkConflicts()`
+        filename:   JSON file to write
+    """
+    tmp_filename = filename + ".tmp"
+    f = open(tmp_filename, 'w')
+    json.dump(report, f, indent=1, sort_keys=True)
+    f.close()
+    os.rename(tmp_filename, filename)
+
+
+if __name__ == "__main__":
+    """
+    Main method. Check the event files of a directory (or a saved store) and write the report
+    """
+    import argparse
+    argparser = argparse.ArgumentParser(description="Find overlapping events and gaps across event types")
+    argparser.add_argument("in_dir", nargs='?', default="Input", help="Directory of event files to check")
+    argparser.add_argument("--store", metavar="DIR", default=None, help="Check a saved EventStore instead")
+    argparser.add_argument("--out", default="Output/CONFLICTS.json", help="Report file")
+    argparser.add_argument("--sats", nargs='+', default=None, help="Satellites to check")
+    argparser.add_argument("--types", nargs='+', default=None, help="Event types to check")
+    argparser.add_argument("--same-type", action="store_true", help="Also report overlaps within a type")
+    argparser.add_argument("--min-gap", type=float, default=0, help="Only report gaps longer than this many seconds")
+    args = argparser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.store is not None:
+        store = EventStore.EventStore.load(args.store)
+    else:
+        store = EventStore.EventStore.fromDirectory(args.in_dir)
+    report = checkConflicts(store, sats=args.sats, types=args.types, same_type=args.same_type, min_gap=args.min_gap)
+    writeReport(report, args.out)
+    log.info("%(overlap)d overlaps, %(contains)d contained events, %(gaps)d gaps" % report['summary'])
+    log.info("Report written to %s", args.out)
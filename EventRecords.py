@@ -0,0 +1,178 @@
+##! /usr/bin/python
+__author__ = 'Zach Dischner'
+__copyright__ = "NA"
+__credits__ = ["NA"]
+__license__ = "NA"
+__version__ = "1.0.0"
+__maintainer__ = "Zach Dischner"
+__email__ = "zach.dischner@gmail.com"
+__status__ = "Dev"
+
+"""
+File name: EventRecords.py
+Authors: Zach Dischner
+Created: 7/4/2014
+Modified:
+
+Compact, array backed events of one product, the form every parser hands to the serializers. Each event is one
+row of a NumPy structured array (see `recordDtype()`):
+    start       Start time, int64 seconds since the epoch (the XML only carries seconds)
+    stop        Stop time, int64 seconds
+    duration    Duration in milliseconds, float64 (written as str() of it)
+    uid         Unique_Id, int64
+    sat         Index into the interned satellite table
+    p0, p1...   Index into the interned value table of each parameter read from a column
+Constant parameters, parameter names and the description are held once per product, not per event. That is
+36 bytes per event plus 4 per column parameter, where a dict of strings or an <Event> subtree runs to about a
+kilobyte. Ten million events fit in under half a GB.
+
+Examples:
+    records = EventRecords.EventRecords.fromFrame(df, ParseEvents.event_types["MANEUVER"], first_uid=1)
+    records.nbytes / float(len(records))      # Bytes per event
+    first_day = records.take(records.rows['start'] < records.rows['start'][0] + 86400)
+"""
+
+# -------------------------
+# --- IMPORT AND GLOBAL ---
+# -------------------------
+import sys
+import numpy as np
+import pandas as pd
+
+"""
+Global Variables
+@param base_fields:     Fields every record has, before the parameter codes
+"""
+base_fields = [('start', np.int64), ('stop', np.int64), ('duration', np.float64), ('uid', np.int64), ('sat', np.int32)]
+
+
+def recordDtype(n_columns):
+    """Structured dtype of a record with some number of column parameters
+
+    Args:
+        n_columns:  Number of parameters read from a column (constants aren't stored per event)
+
+    Returns:
+        dtype:  numpy dtype, fields as in the module docs
+    """
+    return np.dtype(base_fields + [('p%d' % k, np.int32) for k in range(n_columns)])
+
+
+def internValue(value):
+    """Interns strings, so every event sharing a value shares one string object. Anything else is left alone"""
+    return intern(value) if type(value) is str else value
+
+
+def internColumn(values):
+    """Factorizes a column into codes and a table of interned distinct values
+
+    Args:
+        values:     Series or array of values
+
+    Returns:
+        codes:  int32 array, index of each value in the table
+        table:  Object array of the distinct values, as Python objects (str, int, float...)
+
+    Examples:
+        codes,table = EventRecords.internColumn(df.Sat)      # -> [0,0,1...], ['SAT1','SAT2']
+    """
+    codes,uniques = pd.factorize(values)
+    table = [internValue(value) for value in np.asarray(uniques, dtype=object).tolist()]
+    ## Missing values get a slot of their own, written as 'nan' like before
+    if (codes < 0).any():
+        codes = np.where(codes < 0, len(table), codes)
+        table.append(float('nan'))
+    values = np.empty(len(table), dtype=object)
+    values[:] = table
+    return codes.astype(np.int32),values
+
+
+class EventRecords(object):
+    """Compact events of one product, see module docs
+
+    Examples:
+        records = EventRecords.EventRecords.fromFrame(df, spec, first_uid=1000)
+        records.satValues()         # -> ['SAT1','SAT1',...]
+    """
+    __slots__ = ['rows', 'description', 'sats', 'params']
+
+    def __init__(self, rows, description, sats, params):
+        """
+        Args:
+            rows:           Structured array of `recordDtype()`
+            description:    Event_Description text
+            sats:           Object array of satellites, indexed by rows['sat']
+            params:         List of parameter dicts in output order, each {'name':..., 'value':...} for constants or
+                            {'name':..., 'field':..., 'values':...} for columns, values indexed by rows[field]
+        """
+        self.rows = rows
+        self.description = description
+        self.sats = sats
+        self.params = params
+
+    @classmethod
+    def fromFrame(cls, df, spec, first_uid):
+        """Builds the records of a prepared dataframe (see `ParseEvents.prepareEventColumns()`)
+
+        Args:
+            df:         Dataframe with times parsed
+            spec:       `ParseEvents.event_types` entry
+            first_uid:  Unique_Id of the first row, the rest follow in row order
+
+        Returns:
+            records:    EventRecords, in row order
+        """
+        params = [dict((key, internValue(value)) for key,value in param.items()) for param in spec['parameters']]
+        columns = [param for param in params if 'column' in param]
+        rows = np.empty(len(df), dtype=recordDtype(len(columns)))
+        rows['start'] = df.StartTime.values.astype('datetime64[s]').astype(np.int64)
+        rows['stop'] = df.StopTime.values.astype('datetime64[s]').astype(np.int64)
+        if spec['duration_column'] is None:
+            ## A single vectorized subtraction if the file doesn't carry durations
+            rows['duration'] = (df.StopTime - df.StartTime).values / np.timedelta64(1,'ms')
+        else:
+            rows['duration'] = df[spec['duration_column']].values * 1e3
+        rows['uid'] = np.arange(first_uid, first_uid + len(df), dtype=np.int64)
+        rows['sat'],sats = internColumn(df[spec['sat_column']])
+        for k,param in enumerate(columns):
+            param['field'] = 'p%d' % k
+            rows[param['field']],param['values'] = internColumn(df[param.pop('column')])
+        return cls(rows, internValue(spec['description']), sats, params)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def nbytes(self):
+        """Bytes held, the record array plus the interned tables"""
+        tables = [self.sats] + [param['values'] for param in self.params if 'field' in param]
+        return self.rows.nbytes + sum(table.nbytes + sum(sys.getsizeof(value) for value in table) for table in tables)
+
+    def take(self, index):
+        """Records of some events (a slice, boolean mask or positions), sharing this product's tables
+
+        Args:
+            index:  Anything numpy can index the record array with
+
+        Returns:
+            records:    EventRecords
+        """
+        return EventRecords(self.rows[index], self.description, self.sats, self.params)
+
+    def satValues(self, lo=0, hi=None):
+        """List of the satellite of each event in rows [lo, hi)"""
+        return self.sats.take(self.rows['sat'][lo:hi]).tolist()
+
+    def paramValues(self, lo=0, hi=None):
+        """Values of each parameter for the events in rows [lo, hi), in output order
+
+        Returns:
+            columns:    One list per parameter (a repeat of the value for constants, to zip with the rows)
+        """
+        n = len(self.rows[lo:hi])
+        return [param['values'].take(self.rows[param['field']][lo:hi]).tolist() if 'field' in param
+                    else [param['value']] * n for param in self.params]
+
+    def paramNames(self):
+        """Parameter names, in output order"""
+        return [param['name'] for param in self.params]
@@ -0,0 +1,289 @@
+##! /usr/bin/python
+__author__ = 'Zach Dischner'
+__copyright__ = "NA"
+__credits__ = ["NA"]
+__license__ = "NA"
+__version__ = "1.0.0"
+__maintainer__ = "Zach Dischner"
+__email__ = "zach.dischner@gmail.com"
+__status__ = "Dev"
+
+"""
+File name: EventStore.py
+Authors: Zach Dischner
+Created: 6/30/2014
+Modified:
+
+Time indexed store of parsed events of every type, for pulling out just the events in a time window (one orbit,
+one day...) for some satellites and types, and writing them out as their own FDF_to_FP product.
+
+Events are grouped by (event type, Sat). Each group keeps its parsed dataframe sorted by start time, along with
+    start:      int64 start times (ns), sorted
+    stop:       int64 stop times (ns), in the same order
+    maxstop:    Running maximum of stop, the interval index
+An event overlaps [t0, t1] when start <= t1 and stop >= t0. Binary searching start for t1 gives the last
+candidate, and binary searching maxstop (which never decreases) for t0 gives the first, so a query costs
+O(log n + k) per group, k being the events between the two bounds. That is the matches plus any events nested
+inside a long earlier one.
+
+Stores are saved as one `EventCache` style entry (memory-mapped .npy columns) per group, plus index.json.
+
+Examples:
+    store = EventStore.EventStore.fromDirectory("Input")
+    frames = store.query("04 Jul 2014 00:00:00", "05 Jul 2014 00:00:00", sats=["SAT1"])
+    store.writeXML("SAT1_20140704.xml", "04 Jul 2014 00:00:00", "05 Jul 2014 00:00:00", sats=["SAT1"])
+    store.save("Store")
+"""
+
+# -------------------------
+# --- IMPORT AND GLOBAL ---
+# -------------------------
+import pandas as pd
+import numpy as np
+import os, json, shutil, logging
+import ParseEvents
+import EventCache
+
+"""
+Global Variables
+@param log:     Logger for progress and warnings
+"""
+log = logging.getLogger("EventStore")
+
+
+def toNanoseconds(t):
+    """Converts a time (datetime, Timestamp, datetime64, or a string pandas can parse) to int64 nanoseconds
+
+    Args:
+        t:  Time, or None
+
+    Returns:
+        ns:     int64 nanoseconds since the epoch, None for None
+    """
+    if t is None:
+        return None
+    return pd.Timestamp(t).value
+
+
+class EventStore(object):
+    """Parsed events of any number of types and satellites, indexed by time. See module docs.
+
+    Examples:
+        store = EventStore.EventStore()
+        store.addFrame("ECLIPSE", df)
+        frames = store.query(t0, t1, sats=["SAT1","SAT2"], types=["ECLIPSE","PHOTO"])
+    """
+    def __init__(self):
+        self.groups = {}    # (event_type, sat) -> dict of 'frame', 'start', 'stop', 'maxstop'
+
+    def addFrame(self, event_type, df):
+        """Adds a parsed dataframe of one event type, like the ones from `ParseEvents.loadEventProduct()`.
+        Events of a (type, Sat) already in the store are merged in.
+
+        Each event keeps where it came from in 'SourceFile' and 'SourceRow' (its data row in that file), for
+        reports like `EventConflicts`. Frames without them get their own index as the row and no file.
+
+        Args:
+            event_type:     Key into `ParseEvents.event_types`
+            df:             Dataframe with times parsed, and the type's sat column
+        """
+        if 'SourceRow' not in df:
+            df = df.assign(SourceFile=None, SourceRow=df.index.values)
+        sat_column = ParseEvents.event_types[event_type]['sat_column']
+        for sat,frame in df.groupby(df[sat_column].astype(str), sort=True):
+            key = (event_type, sat)
+            if key in self.groups:
+                frame = pd.concat([self.groups[key]['frame'], frame])
+            self._setGroup(key, frame)
+
+    def _setGroup(self, key, frame):
+        """Sorts a group's frame by start time and builds its index arrays"""
+        order = np.argsort(frame.StartTime.values.view('i8'), kind='mergesort')
+        frame = frame.iloc[order].reset_index(drop=True)
+        stop = frame.StopTime.values.view('i8')
+        self.groups[key] = {'frame': frame, 'start': frame.StartTime.values.view('i8'), 'stop': stop,
+                            'maxstop': np.maximum.accumulate(stop) if len(stop) else stop}
+
+    def types(self):
+        """Sorted list of event types in the store"""
+        return sorted(set(event_type for event_type,sat in self.groups))
+
+    def sats(self):
+        """Sorted list of satellites in the store"""
+        return sorted(set(sat for event_type,sat in self.groups))
+
+    def __len__(self):
+        return sum(len(group['start']) for group in self.groups.values())
+
+    def _matchGroup(self, group, t0, t1):
+        """Row positions of a group's events overlapping [t0, t1] (either may be None for open ended)"""
+        hi = len(group['start']) if t1 is None else np.searchsorted(group['start'], t1, side='right')
+        lo = 0 if t0 is None else np.searchsorted(group['maxstop'], t0, side='left')
+        if lo >= hi:
+            return np.arange(0)
+        if t0 is None:
+            return np.arange(lo, hi)
+        return lo + np.flatnonzero(group['stop'][lo:hi] >= t0)
+
+    def query(self, t0=None, t1=None, sats=None, types=None):
+        """Finds every event overlapping a time window
+
+        Kwargs:
+            t0:     Window start (datetime, Timestamp, datetime64 or string). None for no lower bound
+            t1:     Window end. None for no upper bound
+            sats:   List of satellites to include. None for all
+            types:  List of event types to include. None for all
+
+        Returns:
+            frames:     Dict of event type -> dataframe of its matching events, satellite then start time order.
+                        Types without matches are left out
+
+        Examples:
+            frames = store.query("04 Jul 2014 00:00:00", "04 Jul 2014 01:40:00", sats=["SAT1"])
+            frames["ECLIPSE"].StartTime
+        """
+        t0,t1 = toNanoseconds(t0),toNanoseconds(t1)
+        matches = {}
+        for (event_type,sat),group in sorted(self.groups.items()):
+            if (sats is not None and sat not in sats) or (types is not None and event_type not in types):
+                continue
+            rows = self._matchGroup(group, t0, t1)
+            if len(rows):
+                matches.setdefault(event_type, []).append(group['frame'].take(rows))
+        return dict((event_type, pd.concat(frames, ignore_index=True)) for event_type,frames in matches.items())
+
+    def writeXML(self, filename, t0=None, t1=None, sats=None, types=None, out_dir='Output'):
+        """Writes the events of a query (see `query()`) as an FDF_to_FP product, through the same header and
+        emitters as a full conversion. Events get fresh Unique IDs, like any other product.
+
+        Args:
+            filename:   Product filename (the header FILENAME, and the output file in out_dir)
+
+        Kwargs:
+            t0,t1,sats,types:   See `query()`
+            out_dir:            Directory to write to
+
+        Returns:
+            root:   Etree XML root object with the header, no events. None if nothing matched
+
+        Examples:
+            store.writeXML("SAT1_ORBIT12_V1.xml", t0, t1, sats=["SAT1"])
+        """
+        frames = self.query(t0, t1, sats=sats, types=types)
+        if len(frames) == 0:
+            log.warning("No events match, %s not written", filename)
+            return None
+        startTime = ParseEvents.convertTimeFormat(min(df.StartTime.min() for df in frames.values()), from_string=True)
+        stopTime = ParseEvents.convertTimeFormat(max(df.StopTime.max() for df in frames.values()), from_string=True)
+        root = ParseEvents.generateXMLHeader(startTime, stopTime, filename)
+        writer = ParseEvents.XMLEventWriter(out_dir=out_dir)
+        try:
+            writer.writeHeader(root)
+            for event_type in sorted(frames):
+                ParseEvents.getEventEmitter(event_type)(root, frames[event_type], writer=writer)
+        except:
+            writer.abort()
+            raise
+        writer.close()
+        return root
+
+    def save(self, store_dir):
+        """Saves the store, one memory-mappable `EventCache` entry per (type, Sat) group, replacing what is there
+
+        Args:
+            store_dir:  Directory to save to
+        """
+        if os.path.isdir(store_dir):
+            shutil.rmtree(store_dir)
+        os.makedirs(store_dir)
+        index = []
+        for k,(key,group) in enumerate(sorted(self.groups.items())):
+            EventCache.saveEntry(os.path.join(store_dir, str(k)), group['frame'])
+            index.append([key[0], key[1], str(k)])
+        f = open(os.path.join(store_dir, "index.json"), 'w')
+        json.dump(index, f)
+        f.close()
+
+    @classmethod
+    def load(cls, store_dir):
+        """Loads a store written by `save()`, columns memory-mapped
+
+        Args:
+            store_dir:  Directory the store was saved to
+
+        Returns:
+            store:  EventStore
+        """
+        f = open(os.path.join(store_dir, "index.json"))
+        index = json.load(f)
+        f.close()
+        store = cls()
+        for event_type,sat,entry in index:
+            store._setGroup((str(event_type), str(sat)), EventCache.loadEntry(os.path.join(store_dir, entry)))
+        return store
+
+    @classmethod
+    def fromFiles(cls, fnames):
+        """Builds a store by loading event products, see `ParseEvents.loadEventProduct()`
+
+        Args:
+            fnames:     Filenames, one per product (see `ParseEvents.discoverEventFiles()`)
+
+        Returns:
+            store:  EventStore
+        """
+        store = cls()
+        for fname in fnames:
+            event_type = fname.split('/')[-1].split('_')[0]
+            df,combo_filename = ParseEvents.loadEventProduct(fname, event_type)
+            ## Rows keep the index they were read with, their position in their own file
+            if ParseEvents.event_types[event_type]['paired'] is True:
+                members,combo_filename = ParseEvents.findPairedEventFiles(fname)
+                df['SourceFile'] = df.Sat.map(dict((sat, os.path.basename(member)) for member,sat in members))
+            else:
+                df['SourceFile'] = os.path.basename(fname)
+            df['SourceRow'] = df.index.values
+            store.addFrame(event_type, df)
+        return store
+
+    @classmethod
+    def fromDirectory(cls, in_dir):
+        """Builds a store from every event product in a directory
+
+        Args:
+            in_dir:     Directory holding the event files
+
+        Returns:
+            store:  EventStore
+        """
+        return cls.fromFiles(ParseEvents.discoverEventFiles(in_dir))
+
+
+if __name__ == "__main__":
+    """
+    Main method. Build a store from a directory and/or write the events of a time window as a product
+    """
+    import argparse
+    argparser = argparse.ArgumentParser(description="Build and query a time indexed event store")
+    argparser.add_argument("--build", metavar="DIR", default=None, help="Build the store from the event files in DIR")
+    argparser.add_argument("--store", metavar="DIR", default="Store", help="Store directory to save to or load from")
+    argparser.add_argument("--t0", default=None, help="Window start, like '04 Jul 2014 00:00:00'")
+    argparser.add_argument("--t1", default=None, help="Window end")
+    argparser.add_argument("--sats", nargs='+', default=None, help="Satellites to include")
+    argparser.add_argument("--types", nargs='+', default=None, help="Event types to include")
+    argparser.add_argument("--out", default=None, help="Write the matching events to this product filename in Output")
+    args = argparser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.build is not None:
+        store = EventStore.fromDirectory(args.build)
+        store.save(args.store)
+        log.info("Stored %d events from %s in %s", len(store), args.build, args.store)
+    else:
+        store = EventStore.load(args.store)
+
+    if args.out is not None:
+        store.writeXML(args.out, args.t0, args.t1, sats=args.sats, types=args.types)
+    else:
+        for event_type,df in sorted(store.query(args.t0, args.t1, sats=args.sats, types=args.types).items()):
+            log.info("%-10s %d events", event_type, len(df))
@@ -0,0 +1,361 @@
+##! /usr/bin/python
+__author__ = 'Zach Dischner'
+__copyright__ = "NA"
+__credits__ = ["NA"]
+__license__ = "NA"
+__version__ = "1.0.0"
+__maintainer__ = "Zach Dischner"
+__email__ = "zach.dischner@gmail.com"
+__status__ = "Dev"
+
+"""
+File name: EventWatch.py
+Authors: Zach Dischner
+Created: 6/27/2014
+Modified:
+
+Long running watch mode for ParseEvents. Instead of starting Python (and pandas) once per file from cron, this
+stays up, watches an input directory and converts products as their files show up or change.
+
+A manifest (JSON) maps each product to the content hashes of its member files and the output it produced:
+    products:   product key -> {'members': {filename: sha1}, 'output': output filename, 'ok': bool, 'converted': time}
+    files:      filename -> [mtime, size, sha1], so unchanged files are never re-hashed
+A product is converted again only when its set of member hashes changes, so a combined SAT product is redone
+when any one of its satellite files changes and left alone otherwise. Failed products are retried once their
+inputs change.
+
+Between changes the only work is a directory listing and a stat per file every `interval` seconds, or nothing
+at all with inotify (pyinotify, used when installed). Once something changes, the directory has to sit still
+for `settle` seconds before converting, so a burst of arriving files is converted as one batch. pandas and NumPy
+are imported once when the watch starts and the worker pool is started once after that, so no batch pays their
+startup again.
+
+Examples:
+    python EventWatch.py Input --interval 5 --settle 2 --workers 4
+    python EventWatch.py Input --once        # Bring Output up to date and exit
+"""
+
+# -------------------------
+# --- IMPORT AND GLOBAL ---
+# -------------------------
+import os, json, time, hashlib, logging, multiprocessing
+import ParseEvents
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+"""
+Global Variables
+@param manifest_version:    Bumped whenever the manifest layout changes, older manifests are started over
+@param log:                 Logger for progress and warnings
+"""
+manifest_version = 1
+log = logging.getLogger("EventWatch")
+
+
+def hashFile(filename):
+    """SHA1 of a file's contents
+
+    Args:
+        filename:   File to hash
+
+    Returns:
+        sha1:   Hex digest string
+    """
+    digest = hashlib.sha1()
+    f = open(filename, 'rb')
+    try:
+        for block in iter(lambda: f.read(1<<20), ''):
+            digest.update(block)
+    finally:
+        f.close()
+    return digest.hexdigest()
+
+
+def loadManifest(manifest_path):
+    """Loads the manifest, or starts a new one if there isn't one (or it is from an older version)
+
+    Args:
+        manifest_path:  Manifest JSON filename
+
+    Returns:
+        manifest:   Dict with 'version', 'products' and 'files'
+    """
+    if os.path.exists(manifest_path):
+        f = open(manifest_path)
+        manifest = json.load(f)
+        f.close()
+        if manifest.get('version') == manifest_version:
+            return manifest
+        log.warning("Manifest %s is from an older version, starting over", manifest_path)
+    return {'version': manifest_version, 'products': {}, 'files': {}}
+
+
+def saveManifest(manifest_path, manifest):
+    """Writes the manifest to a temp file and renames it into place, so it is never left half written
+
+    Args:
+        manifest_path:  Manifest JSON filename
+        manifest:       Dict from `loadManifest()`
+    """
+    tmp_path = manifest_path + ".tmp"
+    f = open(tmp_path, 'w')
+    json.dump(manifest, f, indent=1, sort_keys=True)
+    f.close()
+    os.rename(tmp_path, manifest_path)
+
+
+def statInputs(in_dir):
+    """Cheap snapshot of the event files in a directory, used to notice that something changed
+
+    Args:
+        in_dir:     Directory to look through
+
+    Returns:
+        stats:  Dict of filename -> (mtime, size) for every event csv, compressed or not
+    """
+    stats = {}
+    for f in os.listdir(in_dir):
+        if ParseEvents.splitCompression(f)[0].endswith('.csv') and ParseEvents.parseEventFilename(f) is not None:
+            fname = in_dir + '/' + f
+            try:
+                st = os.stat(fname)
+            except OSError:
+                ## Deleted since the listing
+                continue
+            stats[fname] = (st.st_mtime, st.st_size)
+    return stats
+
+
+def scanProducts(in_dir, files):
+    """Groups the event files of a directory into products (see `ParseEvents.discoverEventFiles()`) and hashes
+    their members. Files whose mtime and size match the manifest keep their recorded hash.
+
+    Args:
+        in_dir:     Directory to look through
+        files:      Manifest 'files' dict, filename -> [mtime, size, sha1]. Updated in place
+
+    Returns:
+        products:   Dict of product key -> (filename to convert, {member filename: sha1})
+    """
+    stats = statInputs(in_dir)
+    products = {}
+    for key,members in ParseEvents.getEventFileIndex(in_dir).items():
+        if key[0] not in ParseEvents.event_types:
+            continue
+        if ParseEvents.event_types[key[0]]['paired'] is True:
+            groups = [('_'.join(key), [fname for sat,fname in members])]
+        else:
+            ## Every file is its own product
+            groups = [(fname.split('/')[-1], [fname]) for sat,fname in members]
+        for product_key,fnames in groups:
+            hashes = {}
+            for fname in fnames:
+                if fname not in stats:
+                    continue
+                mtime,size = stats[fname]
+                known = files.get(fname)
+                if known is None or known[0] != mtime or known[1] != size:
+                    files[fname] = known = [mtime, size, hashFile(fname)]
+                hashes[fname] = known[2]
+            if len(hashes):
+                ## Convert with the first member still there, the way discoverEventFiles() picks it
+                products[product_key] = ([fname for fname in fnames if fname in hashes][0], hashes)
+
+    ###### Forget files that are gone
+    for fname in files.keys():
+        if fname not in stats:
+            del files[fname]
+    return products
+
+
+def convertChanged(in_dir, manifest, workers=None, pool=None, **kwargs):
+    """Converts every product that is new or whose member files changed since the manifest was written
+
+    Args:
+        in_dir:     Directory holding the event files
+        manifest:   Dict from `loadManifest()`. Updated in place
+
+    Kwargs:
+        workers:    Number of worker processes, see `ParseEvents.convertFiles()`
+        pool:       Already running multiprocessing.Pool to convert in, see `ParseEvents.convertFiles()`
+        kwargs:     Passed on to `ParseEvents.parseCSV()` (stream, chunksize...)
+
+    Returns:
+        results:    List of (filename, ok, message) tuples for the products converted
+
+    Examples:
+        manifest = EventWatch.loadManifest("Output/EventWatch.json")
+        EventWatch.convertChanged("Input", manifest)
+    """
+    products = scanProducts(in_dir, manifest['files'])
+    for product_key in manifest['products'].keys():
+        if product_key not in products:
+            log.info("Product %s is gone from %s", product_key, in_dir)
+            del manifest['products'][product_key]
+
+    changed = dict((fname, (product_key, hashes)) for product_key,(fname,hashes) in products.items()
+                    if manifest['products'].get(product_key, {}).get('members') != hashes)
+    if len(changed) == 0:
+        return []
+
+    log.info("Converting %d new or changed products", len(changed))
+    results = ParseEvents.convertFiles(sorted(changed), workers=workers, pool=pool, **kwargs)
+    for fname,ok,message in results:
+        product_key,hashes = changed[fname]
+        manifest['products'][product_key] = {'members': hashes, 'ok': ok, 'converted': time.time(),
+                                             'output': message if ok else None}
+    return results
+
+
+class _Poller(object):
+    """Waits by sleeping, changes are found by the next scan"""
+    def wait(self, timeout):
+        time.sleep(timeout)
+
+    def close(self):
+        pass
+
+
+if pyinotify is not None:
+    class _IgnoreEvents(pyinotify.ProcessEvent):
+        """Events only wake the loop up, the scan works out what changed"""
+        def process_default(self, event):
+            pass
+
+
+class _Inotifier(object):
+    """Waits for inotify events on the input directory, or the timeout"""
+    def __init__(self, in_dir):
+        self.wm = pyinotify.WatchManager()
+        self.notifier = pyinotify.Notifier(self.wm, default_proc_fun=_IgnoreEvents())
+        self.wm.add_watch(in_dir, pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO | pyinotify.IN_MOVED_FROM |
+                                  pyinotify.IN_DELETE | pyinotify.IN_CREATE)
+
+    def wait(self, timeout):
+        if self.notifier.check_events(timeout=int(timeout*1000)):
+            self.notifier.read_events()
+            self.notifier.process_events()
+
+    def close(self):
+        self.notifier.stop()
+
+
+def settleInputs(in_dir, stats, settle):
+    """Waits until the directory has not changed for `settle` seconds, so files still arriving (or still being
+    written) end up in the same batch
+
+    Args:
+        in_dir:     Directory to watch
+        stats:      Latest `statInputs()` snapshot
+        settle:     Seconds without changes to wait for
+
+    Returns:
+        stats:  Snapshot the directory settled on
+    """
+    while settle > 0:
+        time.sleep(settle)
+        new_stats = statInputs(in_dir)
+        if new_stats == stats:
+            break
+        stats = new_stats
+    return stats
+
+
+def watchDirectory(in_dir, manifest_path="Output/EventWatch.json", interval=5.0, settle=2.0, use_inotify=True,
+                   once=False, workers=None, **kwargs):
+    """Watches a directory and converts products as their files arrive or change. Runs until interrupted.
+
+    Args:
+        in_dir:     Directory holding the event files
+
+    Kwargs:
+        manifest_path:  Manifest JSON filename
+        interval:       Seconds between polls. With inotify, seconds between safety rescans
+        settle:         Seconds the directory must sit still before a batch is converted
+        use_inotify:    Use inotify when pyinotify is installed, else poll
+        once:           Bring everything up to date once and return
+        workers:        Number of worker processes, see `ParseEvents.convertFiles()`. Started once, for every batch
+        kwargs:         Passed on to `ParseEvents.parseCSV()` (stream, chunksize...)
+
+    Examples:
+        EventWatch.watchDirectory("Input", interval=10, workers=4, stream=True)
+    """
+    manifest = loadManifest(manifest_path)
+    if use_inotify is True and pyinotify is not None:
+        waiter = _Inotifier(in_dir)
+        log.info("Watching %s with inotify", in_dir)
+    else:
+        waiter = _Poller()
+        log.info("Watching %s every %g seconds", in_dir, interval)
+
+    ###### Paid once here, not per batch. The lite engine never imports them, and workers forked after inherit them
+    import numpy, pandas
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+
+    last_stats = None
+    try:
+        while True:
+            stats = statInputs(in_dir)
+            if stats != last_stats:
+                if last_stats is not None:
+                    stats = settleInputs(in_dir, stats, settle)
+                convertChanged(in_dir, manifest, workers=workers, pool=pool, **kwargs)
+                saveManifest(manifest_path, manifest)
+                last_stats = stats
+            if once is True:
+                return
+            waiter.wait(interval)
+    finally:
+        waiter.close()
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+if __name__ == "__main__":
+    """
+    Main method. Watch a directory until interrupted, or bring it up to date once with --once
+    """
+    import argparse
+    argparser = argparse.ArgumentParser(description="Watch a directory and convert event files as they change")
+    argparser.add_argument("in_dir", help="Directory of event files to watch")
+    argparser.add_argument("--manifest", default="Output/EventWatch.json", help="Manifest of converted inputs")
+    argparser.add_argument("--interval", type=float, default=5.0, help="Seconds between polls")
+    argparser.add_argument("--settle", type=float, default=2.0, help="Seconds without changes before converting a batch")
+    argparser.add_argument("--poll", action="store_true", help="Poll even if inotify is available")
+    argparser.add_argument("--once", action="store_true", help="Convert whatever is new or changed, then exit")
+    argparser.add_argument("--workers", type=int, default=None, help="Worker processes (default: number of CPUs)")
+    argparser.add_argument("--stream", action="store_true", help="No effect, events are always streamed (kept for old scripts)")
+    argparser.add_argument("--chunksize", type=int, default=None, help="Read and convert inputs in batches of this many rows")
+    argparser.add_argument("--time-order", action="store_true", help="Merge satellites' events in start time order")
+    argparser.add_argument("--pipeline", action="store_true", help="Read, convert and write chunks in overlapping threads")
+    argparser.add_argument("--shard-by", choices=["events","bytes","window"], default=None,
+                           help="Split each product into shards plus a manifest, by event count, XML bytes or time window")
+    argparser.add_argument("--shard-size", type=int, default=None, help="Events, bytes or seconds per shard")
+    argparser.add_argument("--delta", action="store_true",
+                           help="Convert reissues against the previous version in Output, keep unchanged events' IDs")
+    argparser.add_argument("--cache", metavar="DIR", default=None, help="Cache parsed inputs in DIR")
+    argparser.add_argument("--compress", choices=["gz","bz2","xz","none"], default=None,
+                           help="Compress the XML products (default: same as each input file)")
+    argparser.add_argument("--log-level", default="INFO", help="Logging level (DEBUG, INFO, WARNING...)")
+    args = argparser.parse_args()
+    if (args.shard_by is None) != (args.shard_size is None):
+        argparser.error("--shard-by and --shard-size go together")
+    if args.shard_by is not None and args.delta:
+        argparser.error("--delta products can't be sharded")
+
+    logging.basicConfig(level=getattr(logging, args.log_level.upper()), format="%(asctime)s %(message)s")
+    ParseEvents.cache_dir = args.cache
+    if args.compress is not None:
+        ParseEvents.output_compression = '' if args.compress == "none" else '.' + args.compress
+    try:
+        watchDirectory(args.in_dir, manifest_path=args.manifest, interval=args.interval, settle=args.settle,
+                       use_inotify=not args.poll, once=args.once, workers=args.workers, stream=True,
+                       chunksize=args.chunksize, time_order=args.time_order, pipeline=args.pipeline,
+                       shard_by=args.shard_by, shard_size=args.shard_size, delta=args.delta)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,65 @@
+##! /usr/bin/python
+__author__ = 'Zach Dischner'
+__copyright__ = "NA"
+__credits__ = ["NA"]
+__license__ = "NA"
+__version__ = "1.0.0"
+__maintainer__ = "Zach Dischner"
+__email__ = "zach.dischner@gmail.com"
+__status__ = "Dev"
+
+"""
+File name: LazyImport.py
+Authors: Zach Dischner
+Created: 7/3/2014
+Modified:
+
+Modules imported on first use. Importing pandas (and NumPy with it) takes far longer than converting a small
+event file, so ParseEvents holds stand-ins for its heavy dependencies, and runs that never touch a DataFrame
+never pay for them.
+
+Examples:
+    pd = LazyImport.lazyModule("pandas")      # Nothing imported yet
+    df = pd.read_csv("events.csv")             # Now it is
+"""
+
+# -------------------------
+# --- IMPORT AND GLOBAL ---
+# -------------------------
+import importlib
+
+
+class LazyModule(object):
+    """Stands in for a module, importing it the first time an attribute is looked up"""
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        if self.__dict__['_module'] is None:
+            self.__dict__['_module'] = importlib.import_module(self.__dict__['_name'])
+        return self.__dict__['_module']
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        return "<lazy module '%s'%s>" % (self.__dict__['_name'], "" if self.__dict__['_module'] is None else " (loaded)")
+
+
+def lazyModule(name):
+    """Returns a stand-in for a module that imports it on first use
+
+    Args:
+        name:   Full module name, like "ZD_Utils.SpreadsheetUtils"
+
+    Returns:
+        module:     LazyModule
+
+    Examples:
+        np = LazyImport.lazyModule("numpy")
+    """
+    return LazyModule(name)
@@ -0,0 +1,250 @@
+##! /usr/bin/python
+__author__ = 'Zach Dischner'
+__copyright__ = "NA"
+__credits__ = ["NA"]
+__license__ = "NA"
+__version__ = "1.0.0"
+__maintainer__ = "Zach Dischner"
+__email__ = "zach.dischner@gmail.com"
+__status__ = "Dev"
+
+"""
+File name: Metrics.py
+Authors: Zach Dischner
+Created: 6/25/2014
+Modified:
+
+Lightweight instrumentation for the ParseEvents pipeline.
+
+Stages are wrapped with `stage()`, which records wall time and rows handled. Plain counters (bytes written,
+ID counter updates...) go through `count()`. Everything is off until `enable()` is called, and a disabled
+`stage()` is a shared no-op context manager, so instrumented code costs next to nothing in normal runs.
+Stages are only ever wrapped around whole files, chunks or dataframes, never single rows. Totals are updated
+under a lock, since pipelined runs (see `Pipeline`) record stages from several threads at once.
+
+Collected metrics can be written as JSON or as a Prometheus textfile (node_exporter textfile collector), and
+an optional cProfile run can be dumped alongside.
+
+Examples:
+    Metrics.enable(profile=True)
+    with Metrics.stage("load", rows=len(df)):
+        ...
+    Metrics.writeMetrics("metrics.prom")
+    Metrics.writeProfile("parse.prof")
+"""
+
+# -------------------------
+# --- IMPORT AND GLOBAL ---
+# -------------------------
+import os, json, time, threading
+
+"""
+Global Variables
+@param enabled:     Whether anything is being recorded
+@param stages:      Stage name -> {'seconds': total wall time, 'rows': total rows, 'calls': number of times run}
+@param counters:    Counter name -> total
+@param profiler:    Running cProfile.Profile, or None
+@param lock:        Guards stages and counters
+"""
+enabled = False
+stages = {}
+counters = {}
+profiler = None
+lock = threading.Lock()
+
+
+class _NoStage(object):
+    """Shared do-nothing context manager handed out while metrics are disabled"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+    def addRows(self, rows):
+        pass
+
+_no_stage = _NoStage()
+
+
+class _Stage(object):
+    """Times one run of a stage and adds it to the totals on exit"""
+    def __init__(self, name, rows):
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self.t0 = time.time()
+        return self
+
+    def addRows(self, rows):
+        """For stages that only know how many rows they handled once they're done"""
+        self.rows += rows
+
+    def __exit__(self, exc_type, exc_value, tb):
+        seconds = time.time() - self.t0
+        with lock:
+            totals = stages.setdefault(self.name, {'seconds': 0.0, 'rows': 0, 'calls': 0})
+            totals['seconds'] += seconds
+            totals['rows'] += self.rows
+            totals['calls'] += 1
+        return False
+
+
+def stage(name, rows=0):
+    """Context manager recording wall time and rows for a pipeline stage
+
+    Args:
+        name:   Stage name, like "load" or "emit"
+
+    Kwargs:
+        rows:   Rows handled in this run of the stage
+
+    Returns:
+        Context manager. No-op if metrics are disabled
+
+    Examples:
+        with Metrics.stage("times", rows=len(df)):
+            ParseEvents.parseEventTimes(df)
+    """
+    if not enabled:
+        return _no_stage
+    return _Stage(name, rows)
+
+
+def count(name, value=1):
+    """Adds to a counter
+
+    Args:
+        name:   Counter name, like "bytes_written"
+
+    Kwargs:
+        value:  Amount to add
+
+    Examples:
+        Metrics.count("bytes_written", 1024)
+    """
+    if enabled:
+        with lock:
+            counters[name] = counters.get(name, 0) + value
+
+
+def enable(profile=False):
+    """Starts recording metrics, and optionally a cProfile run
+
+    Kwargs:
+        profile:    Also run cProfile, see `writeProfile()`
+    """
+    global enabled, profiler
+    enabled = True
+    if profile and profiler is None:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+
+def reset():
+    """Clears everything recorded so far"""
+    stages.clear()
+    counters.clear()
+
+
+def snapshot():
+    """Copy of everything recorded so far, for sending back from worker processes
+
+    Returns:
+        snap:   Dict with 'stages' and 'counters'
+    """
+    return {'stages': dict((name, dict(totals)) for name,totals in stages.items()), 'counters': dict(counters)}
+
+
+def merge(snap):
+    """Adds a `snapshot()` (from a worker process, usually) into this process's totals
+
+    Args:
+        snap:   Dict from `snapshot()`
+    """
+    for name,totals in snap['stages'].items():
+        mine = stages.setdefault(name, {'seconds': 0.0, 'rows': 0, 'calls': 0})
+        for key in mine:
+            mine[key] += totals[key]
+    for name,value in snap['counters'].items():
+        counters[name] = counters.get(name, 0) + value
+
+
+def summary():
+    """Everything recorded so far, with rows per second worked out for each stage
+
+    Returns:
+        summary:    Dict with 'stages' and 'counters'
+
+    Examples:
+        print json.dumps(Metrics.summary(), indent=2)
+    """
+    snap = snapshot()
+    for totals in snap['stages'].values():
+        totals['rows_per_sec'] = totals['rows'] / totals['seconds'] if totals['rows'] and totals['seconds'] > 0 else None
+    return snap
+
+
+def toPrometheus(prefix="parseevents"):
+    """Formats everything recorded as Prometheus text exposition format
+
+    Kwargs:
+        prefix:     Metric name prefix
+
+    Returns:
+        text:   Prometheus textfile contents
+    """
+    summ = summary()
+    lines = []
+    for metric,key,help_text in [("stage_seconds", "seconds", "Wall time spent in each pipeline stage"),
+                                 ("stage_rows", "rows", "Rows handled by each pipeline stage"),
+                                 ("stage_calls", "calls", "Number of times each pipeline stage ran"),
+                                 ("stage_rows_per_second", "rows_per_sec", "Rows per second through each pipeline stage")]:
+        lines.append("# HELP %s_%s %s" % (prefix, metric, help_text))
+        lines.append("# TYPE %s_%s gauge" % (prefix, metric))
+        for name,totals in sorted(summ['stages'].items()):
+            if totals[key] is not None:
+                lines.append('%s_%s{stage="%s"} %r' % (prefix, metric, name, float(totals[key])))
+    for name,value in sorted(summ['counters'].items()):
+        lines.append("# TYPE %s_%s gauge" % (prefix, name))
+        lines.append("%s_%s %r" % (prefix, name, float(value)))
+    return "\n".join(lines) + "\n"
+
+
+def writeMetrics(filename):
+    """Writes everything recorded to a file. '.prom' files get Prometheus textfile format, anything else JSON.
+    Written to a temp file and renamed, so a textfile collector never sees a partial file.
+
+    Args:
+        filename:   File to write
+
+    Examples:
+        Metrics.writeMetrics("/var/lib/node_exporter/parseevents.prom")
+    """
+    if filename.endswith(".prom"):
+        text = toPrometheus()
+    else:
+        text = json.dumps(summary(), indent=2, sort_keys=True)
+    tmp_filename = filename + ".tmp"
+    f = open(tmp_filename, 'w')
+    f.write(text)
+    f.close()
+    os.rename(tmp_filename, filename)
+
+
+def writeProfile(filename):
+    """Stops the cProfile run started by `enable(profile=True)` and dumps its stats (read with pstats)
+
+    Args:
+        filename:   Stats file to write
+
+    Examples:
+        import pstats; pstats.Stats("parse.prof").sort_stats("cumulative").print_stats(20)
+    """
+    global profiler
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(filename)
+        profiler = None
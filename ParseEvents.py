@@ -20,40 +20,136 @@ Run this file on any of the input file types ["ECLIPSE","PHOTO","MANEUVER"...] a
 into Flexplan-compliant XML will be generated. 
 
 Have fun! 
-
-@todos 
-    *Rework the getPairedEventFiles() method, kinda clugy now.
-    *Integrate simpler row parser, lots of repeated code within parse`EVENT` methods. Should be quick 
 """
 
 # -------------------------
 # --- IMPORT AND GLOBAL ---
 # -------------------------
-import pandas as pd
 import sys as sys
-import numpy as np
-import os, string, pickle, fnmatch, operator
+import os, string, pickle, fnmatch, operator, traceback, multiprocessing, itertools, functools, cStringIO, heapq, logging
+import csv, re, json
+import gzip, bz2
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        ## .xz files need Python 3 or the backports.lzma package
+        lzma = None
 from datetime import datetime
 import xml.etree.cElementTree as ET  # Great XLM library.
 # Easy tutorial http://stackoverflow.com/questions/3605680/creating-a-simple-xml-file-using-python
-from ZD_Utils import SpreadsheetUtils as zsheet
-from ZD_Utils import XMLUtils as zxml
+import UniqueIDs
+import Metrics
+import Pipeline
+import LazyImport
+## Heavy dependencies are only imported once something uses them, small files never do (see `lite_max_bytes`)
+pd = LazyImport.lazyModule("pandas")
+np = LazyImport.lazyModule("numpy")
+zsheet = LazyImport.lazyModule("ZD_Utils.SpreadsheetUtils")
+zxml = LazyImport.lazyModule("ZD_Utils.XMLUtils")
+EventCache = LazyImport.lazyModule("EventCache")
+EventRecords = LazyImport.lazyModule("EventRecords")
+StkTokenizer = LazyImport.lazyModule("StkTokenizer")
 
 """
 Global Variables
 @param pname:  Pickle filename storing unique ID incrementor 
 @param typical_in_format:  Input date format of string in CSV
 @param xml_date_format:  Output date format of string for XML
+@param comm_date_format:  Input date format of string in COMM CSV
+@param time_parsers:  Cache of compiled vectorized time parsers, keyed by input format
+@param event_types:  Registry of event file types, keyed by the filename prefix. Each entry gives
+    columns:            Column names to read the CSV with (None to use the file's header)
+    time_format:        Input date format of the Start and Stop columns
+    description:        Event_Description text
+    sat_column:         Column holding the satellite ('Sat' is filled in from the filename for paired files)
+    duration_column:    Column holding the duration in seconds. None to use Stop - Start
+    parameters:         Event parameters, each {'name':..., 'column':...} or {'name':..., 'value':...}
+    paired:             Whether there is one file per satellite to combine (see `findPairedEventFiles()`)
+    warning:            Optional note printed after parsing a file of this type
+    column_types:       Optional dtypes to carry columns through as, like {'Priority': 'int64', 'Status': 'category'}
+    day_duration_column: Optional column holding '0_day(s)_HH:MM:SS.fff' durations, parsed into 'DurationSec'
+                        and checked against Stop - Start (see `prepareEventColumns()`)
+@param event_emitters:  Cache of row emitters compiled from event_types
+@param event_file_indexes:  Cache of event file indexes, keyed by directory
+@param xml_serializer:  How streamed events are serialized. 'template' renders them from a per-type string template
+    (see `compileEventTemplate()`), 'etree' builds and serializes each one with ElementTree. Output is identical
+@param stk_tokenizer:  Read STK format files with the memory-mapped `StkTokenizer`, falling back to the generic CSV
+    reader for files it can't take. False to always read them the generic way
+@param cache_dir:  Directory of the parsed input cache (see `EventCache`). None to always read the CSVs
+@param compression_suffixes:  Filename suffixes of the compressed streams read and written directly (see `openEventFile()`)
+@param output_compression:  Compression suffix for XML products, like '.gz'. '' for plain XML, None to match the input file
+@param lite_max_bytes:  With lite=True (see `parseCSV()`), products up to this size are converted by the pandas-free lite
+    engine (see `convertLiteEventProduct()`), which starts far faster. 0 to always use the DataFrame path
+@param lite_na_values:  Field values pandas reads as missing. Rows with any of them are left to the DataFrame path
+@param lite_number_pattern:  Durations the lite engine reads itself, anything fancier is left to pandas
+@param month_numbers:  Month abbreviation -> number, for the lite engine's time parsing
+@param pipeline_chunksize:  Rows per chunk of a pipelined run (see `parseCSV()`) when no chunksize is given
+@param key_separator:  Joins the fields of a delta key (see `diffEventKeys()`), a character XML text can't hold
+@param non_ascii_bytes:  Matches byte strings ElementTree refuses to write, see `isPlainText()`
+@param product_event_pattern:  One <Event> of a product as `XMLEventWriter` writes it, see `indexEventProduct()`
+@param product_param_pattern:  One <Event_Parameter> of the same
+@param product_scan_bytes:  Bytes read at a time when scanning a product
+@param log:  Logger for progress and warnings. Stage timings and counters go through `Metrics`
 """
 pName = "UniqueID.pickle"
 ## For datetime package. Use http://strftime.org/ for reference
 xml_date_format = '%d-%b-%Y %H:%M:%S'
 typical_in_format = '%d %b %Y %H:%M:%S.%f'
+comm_date_format = '%Y/%m/%d_%H:%M:%S.%f'
+time_parsers = {}
+event_types = {
+    "COMM":     {'columns': None, 'time_format': comm_date_format, 'description': "COMM",
+                 'sat_column': 'Groups', 'duration_column': None, 'paired': False,
+                 'parameters': [{'name': 'COMM_SET_DL_RATE', 'value': 'DL'},
+                                {'name': 'COMM_SET_UL_RATE', 'value': 'UL'}],
+                 'column_types': {'Priority': 'int64', 'Status': 'category', 'Groups': 'category', 'Resources': 'category'},
+                 'day_duration_column': 'Duration',
+                 'warning': "This is wrong? There is no specifier for NULL/UL/DL parameters"},
+    "ECLIPSE":  {'columns': ["Start","Stop","Duration"], 'time_format': typical_in_format, 'description': "ECLIPSE",
+                 'sat_column': 'Sat', 'duration_column': 'Duration', 'paired': True, 'parameters': []},
+    "MANEUVER": {'columns': ["Target","Start","Stop","Duration"], 'time_format': typical_in_format, 'description': "MANEUVER",
+                 'sat_column': 'Sat', 'duration_column': 'Duration', 'paired': True,
+                 'parameters': [{'name': 'ACS_POINT', 'column': 'Target'}]},
+    "MEMORY":   {'columns': ["Start","Stop","Duration"], 'time_format': typical_in_format, 'description': "MEMORY",
+                 'sat_column': 'Sat', 'duration_column': 'Duration', 'paired': True, 'parameters': []},
+    "PHOTO":    {'columns': ["Start","Stop","Duration"], 'time_format': typical_in_format, 'description': "PHOTO",
+                 'sat_column': 'Sat', 'duration_column': 'Duration', 'paired': True, 'parameters': []},
+    }
+event_emitters = {}
+event_file_indexes = {}
+xml_serializer = 'template'
+stk_tokenizer = True
+cache_dir = None
+compression_suffixes = ['.gz', '.bz2', '.xz']
+output_compression = None
+pipeline_chunksize = 100000
+key_separator = '\x00'
+non_ascii_bytes = re.compile(r'[\x80-\xff]')
+product_param_pattern = re.compile(r'<Event_Parameter>\s*(?:<Event_Par_Name>([^<]*)</Event_Par_Name>|<Event_Par_Name />)'
+                                   r'\s*(?:<Event_Par_Value>([^<]*)</Event_Par_Value>|<Event_Par_Value />)\s*</Event_Parameter>')
+product_event_pattern = re.compile(r'\s*<Event>\s*(?:<UTC_Start_Time>([^<]*)</UTC_Start_Time>|<UTC_Start_Time />)'
+                                   r'\s*(?:<Duration>([^<]*)</Duration>|<Duration />)\s*<Unique_Id>(\d+)</Unique_Id>'
+                                   r'\s*(?:<Event_Description>([^<]*)</Event_Description>|<Event_Description />)'
+                                   r'\s*(?:<Sat>([^<]*)</Sat>|<Sat />)\s*(?:<Entity>[^<]*</Entity>|<Entity />)'
+                                   r'\s*(?:<List_of_Event_Parameters>((?:\s*%s)*)\s*</List_of_Event_Parameters>'
+                                   r'|<List_of_Event_Parameters />)\s*</Event>' %
+                                   product_param_pattern.pattern.replace('([^<]*)', '[^<]*'))
+product_scan_bytes = 1 << 22
+lite_max_bytes = 256*1024
+lite_na_values = frozenset(['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                            'N/A', 'NA', 'NULL', 'NaN', 'n/a', 'nan', 'null'])
+lite_number_pattern = re.compile(r'^[+-]?(\d+\.?\d*|\.\d+)$')
+month_numbers = dict((month, k+1) for k,month in enumerate(["Jan","Feb","Mar","Apr","May","Jun",
+                                                             "Jul","Aug","Sep","Oct","Nov","Dec"]))
+log = logging.getLogger("ParseEvents")
 
 
 def getNextUniqueID():
-    """Fetch the next unique ID to use in event creation. Opens a pickle, gets value,
-    increments, and saves the pickle. 
+    """Fetch the next unique ID to use in event creation. Does a single locked increment of the pickle.
+    Parsers lease whole blocks with `UniqueIDs.leaseUniqueIDs()` instead of calling this per event.
     
     Returns:
         uid:   New unique ID
@@ -63,239 +159,2228 @@ def getNextUniqueID():
     """
     ###### Get last used Unique ID and increment
     global pName
-    f = open(pName, 'r')
-    uid = pickle.load(f) + 1
-    f.close()
-    f = open(pName, 'w')
-    pickle.dump(uid,f)
-    f.close()
-    return uid
+    return UniqueIDs.reserveUniqueIDs(1, pName)
+
+
+def convertTimeFormat(timestamp, input_format=typical_in_format, output_format=xml_date_format, to_string=True, from_string=False):
+    """Converts time format to be Flexplan-compliant
+
+    Args:
+        timestamp:  String input time
+
+    Kwargs:
+        input_format:   Input format string. See http://strftime.org
+        output_format:  Output format string. See http://strftime.org
+        to_string:      Boolean, return string or datetime object
+        from_string:    Boolean, input is already a datetime object. Returns formatted string
+    
+    Returns:
+        timestamp:  Reformatted time string
+
+    Examples:
+        datestr = ParseEvents.convertTimeFormat(dataframe.StartTime.iloc[0])
+        datestr_local = ParseEvents.convertTimeFormat(dataframe.StartTime.iloc[0],output_format='%c')
+        dateval = ParseEvents.convertTimeFormat(dataframe.StartTime.iloc[0],to_string=False)
+    """
+    if from_string is True:
+        return datetime.strftime(timestamp,output_format)
+
+    if to_string is True:
+        return datetime.strftime(datetime.strptime(timestamp,input_format),output_format)
+    else:
+        return datetime.strptime(timestamp,input_format)
+
+def getTimeParser(input_format=typical_in_format):
+    """Returns a vectorized parser for a date format. Parsers are compiled once per format and cached
+    in `time_parsers`, so `typical_in_format` and `comm_date_format` are only ever set up once.
+
+    Kwargs:
+        input_format:   Input format string. See http://strftime.org
+    
+    Returns:
+        parser:     Function taking an array of strings, returning a datetime64 array (NaT for nulls)
+
+    Examples:
+        parser = ParseEvents.getTimeParser(ParseEvents.comm_date_format)
+        times = parser(df.Start.values)
+    """
+    if input_format not in time_parsers:
+        if input_format == comm_date_format:
+            ## The '_' between date and time is all that keeps pandas off its fast C ISO 8601 parser
+            def parser(values):
+                values = pd.Series(values).str.replace('_', 'T', regex=False).values
+                return pd.to_datetime(values, format='%Y/%m/%dT%H:%M:%S.%f', exact=True).values
+        else:
+            def parser(values):
+                return pd.to_datetime(values, format=input_format, exact=True).values
+        time_parsers[input_format] = parser
+    return time_parsers[input_format]
+
+
+def parseEventTimes(dataframe, input_format=typical_in_format):
+    """Parses the 'Start' and 'Stop' columns of a dataframe in one vectorized pass each. Adds 'StartTime' and 
+    'StopTime' datetime64 columns that all later stages reuse, so no timestamp is parsed twice.
+
+    Args:
+        dataframe:  dataframe containing event info. Assumes 'Start' and 'Stop' column
+
+    Kwargs:
+        input_format:   Specify input datestring format instead of using default
+    
+    Returns:
+        dataframe:  Same dataframe, modified in place with 'StartTime' and 'StopTime' columns
+
+    Examples:
+        df = ParseEvents.parseEventTimes(df, input_format=ParseEvents.comm_date_format)
+        durations_ms = (df.StopTime - df.StartTime) / np.timedelta64(1,'ms')
+    """
+    parser = getTimeParser(input_format)
+    with Metrics.stage("times", rows=len(dataframe)):
+        dataframe['StartTime'] = parser(dataframe.Start.values)
+        dataframe['StopTime'] = parser(dataframe.Stop.values)
+    return dataframe
+
+
+def formatTimes(times, output_format=xml_date_format):
+    """Formats a whole datetime64 array as strings at once, instead of a strftime per row. Times are formatted to 
+    the second, so each distinct second is only formatted once. For `xml_date_format` it goes further, formatting 
+    each distinct day and each distinct time of day once and joining the two, so even a year of unique
+    timestamps only costs a few hundred day strings and at most 86400 time strings.
+
+    Args:
+        times:  datetime64 array, like df.StartTime.values. No NaT
+
+    Kwargs:
+        output_format:  Output format string. See http://strftime.org
+    
+    Returns:
+        strings:    List of formatted strings, same as `convertTimeFormat(t, from_string=True)` for each t
+
+    Examples:
+        utcStarts = ParseEvents.formatTimes(df.StartTime.values)
+    """
+    if pd.isnull(times).any():
+        raise ValueError("Can't format NaT times")
+    seconds = times.astype('datetime64[s]').astype(np.int64)
+    if output_format != xml_date_format:
+        uniq,inverse = np.unique(seconds, return_inverse=True)
+        strings = np.array([datetime.strftime(t, output_format) for t in uniq.astype('datetime64[s]').astype(datetime)])
+        return strings[inverse].tolist()
+
+    ###### Days and times of day separately, then glue them together
+    days,day_inverse = np.unique(seconds // 86400, return_inverse=True)
+    tods,tod_inverse = np.unique(seconds % 86400, return_inverse=True)
+    day_strings = np.array([datetime.strftime(t, '%d-%b-%Y ') for t in (days*86400).astype('datetime64[s]').astype(datetime)])
+    tod_strings = np.array(['%02d:%02d:%02d' % (tod // 3600, tod // 60 % 60, tod % 60) for tod in tods.tolist()])
+    return np.char.add(day_strings[day_inverse], tod_strings[tod_inverse]).tolist()
+
+
+def formatDurations(seconds):
+    """Formats durations in seconds as millisecond strings, all at once. Same text as str(duration*1e3) per row.
+
+    Args:
+        seconds:    Array of durations in seconds
+
+    Returns:
+        strings:    List of millisecond strings
+
+    Examples:
+        durations = ParseEvents.formatDurations(df.Duration.values)
+    """
+    return map(str, (np.asarray(seconds) * 1e3).tolist())
+
+
+def formatEventRecords(records, lo=0, hi=None):
+    """Formats the output strings of a block of event records, each column at once
+
+    Args:
+        records:    `EventRecords.EventRecords`
+
+    Kwargs:
+        lo,hi:      Row range to format, all of them by default
+
+    Returns:
+        utcStarts:      List of start time strings
+        durations:      List of millisecond duration strings
+        uids:           List of Unique_Id strings
+        sats:           List of satellites
+        param_rows:     List of parameter value tuples, one per row
+
+    Examples:
+        rows = itertools.izip(*ParseEvents.formatEventRecords(records, 0, 10000))
+    """
+    rows = records.rows[lo:hi]
+    utcStarts = formatTimes(rows['start'].astype('datetime64[s]'))
+    durations = map(str, rows['duration'].tolist())
+    uids = map(str, rows['uid'].tolist())
+    param_columns = records.paramValues(lo, hi)
+    param_rows = zip(*param_columns) if len(param_columns) else [()] * len(rows)
+    return utcStarts,durations,uids,records.satValues(lo, hi),param_rows
+
+
+def parseDayDurations(values):
+    """Parses COMM style day count durations, I.E. '0_day(s)_00:08:00.000', in one vectorized pass
+
+    Args:
+        values:     Array of duration strings
+
+    Returns:
+        seconds:    float64 array of durations in seconds, NaN where the text doesn't match
+
+    Examples:
+        seconds = ParseEvents.parseDayDurations(df.Duration.values)
+    """
+    parts = pd.Series(values).str.extract(r'^(\d+)_day\(s\)_(\d+):(\d+):(\d+(?:\.\d*)?)$', expand=True).astype(float)
+    return (parts[0]*86400 + parts[1]*3600 + parts[2]*60 + parts[3]).values
+
+
+def prepareEventColumns(dataframe, spec):
+    """Gets a loaded dataframe ready for conversion, per its `event_types` entry: times parsed, columns carried 
+    as their `column_types`, and day count durations parsed and cross-checked against Stop - Start in bulk. 
+    Rows whose duration is off by more than a millisecond are logged, the output still uses Stop - Start.
+
+    Args:
+        dataframe:  Loaded event dataframe, nulls already dropped
+        spec:       `event_types` entry
+
+    Returns:
+        dataframe:  Same dataframe, modified in place
+
+    Examples:
+        df = ParseEvents.prepareEventColumns(df, ParseEvents.event_types["COMM"])
+    """
+    if 'StartTime' not in dataframe:
+        parseEventTimes(dataframe, input_format=spec['time_format'])
+    if len(dataframe) == 0:
+        return dataframe
+    for name,dtype in spec.get('column_types', {}).items():
+        dataframe[name] = dataframe[name].astype(dtype)
+
+    duration_column = spec.get('day_duration_column')
+    if duration_column is not None:
+        dataframe['DurationSec'] = parseDayDurations(dataframe[duration_column].values)
+        expected = (dataframe.StopTime - dataframe.StartTime).values / np.timedelta64(1,'s')
+        bad = ~(np.abs(dataframe.DurationSec.values - expected) <= 1e-3)
+        if bad.any():
+            Metrics.count("duration_mismatches", int(bad.sum()))
+            log.warning("%d rows have a %s that doesn't match Stop - Start, first: %s", bad.sum(), duration_column,
+                        dataframe[duration_column].values[bad][0])
+    return dataframe
+
+
+#http://norwied.wordpress.com/2013/08/27/307/
+# DONT REALLY UNDERSTAND THIS. IT MUST BE CALLED IN YOUR MODULE TO WORK...
+def indent(elem, level=0):
+    """ Makes ElementTree XML object pretty for printing
+
+    Args:
+        elem:  object to prettify
+
+    Kwargs:
+        level: Internally used
+
+    Examples:
+        root = ET.ElementTree("SomeFile.xml")
+        XML_Utils.indent(root)
+    """
+    i = "\n" + level*"    "
+    if len(elem):
+        if not elem.text or not elem.text.strip():
+            elem.text = i + "    "
+        if not elem.tail or not elem.tail.strip():
+            elem.tail = i
+        for elem in elem:
+            indent(elem, level+1)
+        if not elem.tail or not elem.tail.strip():
+            elem.tail = i
+    else:
+        if level and (not elem.tail or not elem.tail.strip()):
+            elem.tail = i
+
+def serializeElement(elem, level=1):
+    """Serializes one element exactly as it would appear inside an indented tree written by ElementTree.
+    Output starts with the newline and indentation that precedes the element, and leaves off the tail.
+
+    Args:
+        elem:   Etree element to serialize (modified in place by `indent()`)
+
+    Kwargs:
+        level:  Nesting depth of the element in the full document
+
+    Returns:
+        xml_str:    Serialized element string
+
+    Examples:
+        fh.write(ParseEvents.serializeElement(event_elem))
+    """
+    indent(elem, level)
+    elem.tail = None
+    return "\n" + level*"    " + ET.tostring(elem)
+
+
+def escapeXMLText(text):
+    """Escapes element text the way ElementTree does when writing a us-ascii document: &, < and > become 
+    entities, and non-ascii unicode characters become character references.
+
+    Args:
+        text:   Element text string
+
+    Returns:
+        xml_str:    Escaped text, ready to write
+
+    Examples:
+        ParseEvents.escapeXMLText("R&D <1>")   # -> 'R&amp;D &lt;1&gt;'
+    """
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    if isinstance(text, unicode):
+        text = text.encode("us-ascii", "xmlcharrefreplace")
+    return text
+
+
+def paramText(value):
+    """Element text of an event parameter value. Strings are used as they are, anything else is formatted as 
+    unicode, so non-ascii values reach `escapeXMLText()` (or ElementTree) intact instead of failing in `str()`
+
+    Args:
+        value:  Parameter value, as read from the event file
+
+    Returns:
+        text:   str or unicode text of the value
+
+    Examples:
+        ParseEvents.paramText(1.5)          # -> u'1.5'
+        ParseEvents.paramText("NADIR")      # -> 'NADIR'
+    """
+    if isinstance(value, basestring):
+        return value
+    return unicode(value)
+
+
+def isPlainText(text):
+    """Checks whether element text can be written by `escapeXMLText()` exactly as ElementTree writes it. Empty
+    text serializes as <Tag />, and byte strings with non-ascii bytes are left to ElementTree to reject
+
+    Args:
+        text:   Element text, as returned by `paramText()`
+
+    Returns:
+        plain:  True if the text is non-empty unicode, or a non-empty ascii byte string
+
+    Examples:
+        ParseEvents.isPlainText(u"Caf\xe9")   # -> True
+        ParseEvents.isPlainText("")           # -> False
+    """
+    if not text:
+        return False
+    return isinstance(text, unicode) or non_ascii_bytes.search(text) is None
+
+
+def compileEventTemplate(makeEvent, n_params):
+    """Precompiles the serialized layout of an <Event> into a string template. The template comes from serializing
+    a sample event (indentation, constant description and parameter names included), with markers standing in for
+    the per-row values, so rendering from it gives exactly what `serializeElement()` gives for the same event.
+
+    Args:
+        makeEvent:  Function makeEvent(utcStart, duration, uid, sat, param_values) building the <Event> element
+        n_params:   Number of event parameters
+
+    Returns:
+        render:     Function render(utcStart, duration, uid, sat, param_values) returning the serialized event. 
+                    utcStart, duration and uid are formatted by the parser and written as they are, sat and 
+                    the parameter values are escaped. Falls back to ElementTree for values that aren't plain 
+                    text (see `isPlainText()`)
+
+    Examples:
+        render = ParseEvents.compileEventTemplate(makeEvent, 1)
+        writer.writeFragment(render("04-Jul-2014 01:42:00", "60000.0", "1", "SAT1", ["NADIR"]))
+    """
+    markers = ["@@%d@@" % k for k in range(4 + n_params)]
+    template = serializeElement(makeEvent(markers[0], markers[1], markers[2], markers[3], markers[4:]))
+    template = template.replace("%", "%%")
+    for marker in markers:
+        template = template.replace(marker, "%s", 1)
+
+    def render(utcStart, duration, uid, sat, param_values):
+        fields = [sat] + [paramText(value) for value in param_values]
+        for field in fields:
+            if not isPlainText(field):
+                return serializeElement(makeEvent(utcStart, duration, uid, sat, param_values))
+        return template % tuple([utcStart, duration, uid] + [escapeXMLText(field) for field in fields])
+
+    return render
+
+
+def splitCompression(filename):
+    """Splits the compression suffix off a filename
+
+    Args:
+        filename:   Filename, compressed or not
+
+    Returns:
+        base:       Filename without the compression suffix
+        suffix:     One of `compression_suffixes`, '' if it isn't compressed
+
+    Examples:
+        ParseEvents.splitCompression("Input/PHOTO_SAT1_..._V1.csv.gz")   # -> ("Input/PHOTO_SAT1_..._V1.csv", ".gz")
+    """
+    for suffix in compression_suffixes:
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)],suffix
+    return filename,''
+
+
+def getOutputCompression(filename):
+    """Compression suffix for the XML product of an input file, per `output_compression`
+
+    Args:
+        filename:   Input event filename
+
+    Returns:
+        suffix:     Compression suffix, '' for plain XML
+    """
+    if output_compression is None:
+        return splitCompression(filename)[1]
+    return output_compression
+
+
+def openEventFile(filename, mode='rb', buffering=-1):
+    """Opens an event file or XML product, through the stdlib codec its suffix calls for (gzip, bz2 or xz),
+    so compressed files are streamed without ever being decompressed to disk
+
+    Args:
+        filename:   File to open
+
+    Kwargs:
+        mode:       'rb' or 'wb'
+        buffering:  Buffer size for plain files, as for `open()`
+
+    Returns:
+        fh:     File-like object. Only plain files can seek backwards while writing
+
+    Examples:
+        df = pd.read_csv(ParseEvents.openEventFile("Input/ECLIPSE_SAT1_..._V1.csv.xz"))
+    """
+    suffix = splitCompression(filename)[1]
+    if suffix == '.gz':
+        return gzip.GzipFile(filename, mode, 6)
+    elif suffix == '.bz2':
+        return bz2.BZ2File(filename, mode)
+    elif suffix == '.xz':
+        if lzma is None:
+            raise ImportError("Can't open %s, xz needs the backports.lzma package on Python 2" % filename)
+        return lzma.LZMAFile(filename, mode)
+    return open(filename, mode, buffering)
+
+
+class XMLEventWriter(object):
+    """Streams an FDF_to_FP XML product to a buffered file one element at a time, so memory stays constant
+    no matter how many events are written. Output is byte-for-byte what `indent()` plus `ElementTree.write()`
+    produce for the same tree.
+
+    The product is written under a temporary '.part_' name in the same directory and only renamed to its own
+    name by `close()`, so nothing downstream ever sees half a product. After a failure, `abort()` deletes it.
+
+    Examples:
+        writer = ParseEvents.XMLEventWriter()
+        try:
+            writer.writeHeader(ParseEvents.generateXMLHeader(startTime,stopTime,filename))
+            writer.writeEvent(event_elem)
+        except:
+            writer.abort()
+            raise
+        writer.close()
+    """
+    def __init__(self, out_dir='Output', out_filename=None, buffering=1<<20, fh=None, compression=''):
+        """
+        Kwargs:
+            out_dir:        Directory to write to. Filename is taken from the header FILENAME element
+            out_filename:   Override the full output filename
+            buffering:      File buffer size in bytes
+            fh:             Already open file-like object to write events to (a StringIO for rendering fragments)
+            compression:    Compression suffix ('.gz', '.bz2', '.xz') added to the filename, '' for plain XML.
+                            Compressed output can't be seeked back into, see `patchHeader()`
+        """
+        self.out_dir = out_dir
+        self.out_filename = out_filename
+        self.buffering = buffering
+        self.fh = fh
+        self.compression = compression
+        self.part_filename = None
+        self.root_tag = None
+        self.header_offsets = {}
+
+    def writeHeader(self, root):
+        """Opens the output file and writes the root tag and header elements
+
+        Args:
+            root:   Header root from `generateXMLHeader()`, without any events
+        """
+        if self.out_filename is None:
+            self.out_filename = self.out_dir + '/' + root.find("FILENAME").text + self.compression
+        ## Prefixed rather than suffixed, the suffix still says which codec to write with
+        self.part_filename = os.path.join(os.path.dirname(self.out_filename), '.part_' + os.path.basename(self.out_filename))
+        self.fh = openEventFile(self.part_filename, 'wb', self.buffering)
+        self.root_tag = root.tag
+        self.fh.write('<' + root.tag + '>')
+        for elem in root:
+            xml_str = serializeElement(elem)
+            ## Remember where header text lives, so it can be patched later
+            self.header_offsets[elem.tag] = (self.fh.tell() + xml_str.index('>') + 1, elem.text)
+            self.fh.write(xml_str)
+
+    def writeTree(self, root):
+        """Writes a whole in-memory product, as built by `parseEventFile()` without a writer. Same output as
+        `writeHeader()` with its header elements followed by `writeEvent()` for each event
+
+        Args:
+            root:   Etree XML root with the header elements followed by all of the <Event> elements
+        """
+        header = ET.Element(root.tag)
+        header.extend([elem for elem in root if elem.tag != "Event"])
+        self.writeHeader(header)
+        for event in root.iterfind("Event"):
+            self.writeEvent(event)
+
+    def patchHeader(self, startTime, stopTime):
+        """Overwrites the START and END header text in place. New text must be the same length as what was
+        written by `writeHeader()`, which holds for times in `xml_date_format`. Not possible for compressed output,
+        the header times have to be known up front there (see `scanEventTimes()`).
+
+        Args:
+            startTime:  New START text
+            stopTime:   New END text
+        """
+        for tag,text in [("START",startTime),("END",stopTime)]:
+            offset,old_text = self.header_offsets[tag]
+            if len(text) != len(old_text):
+                raise ValueError("Can't patch header %s, '%s' is not the same length as '%s'" % (tag,text,old_text))
+            self.fh.seek(offset)
+            self.fh.write(text)
+        self.fh.seek(0, os.SEEK_END)
+
+    def writeEvent(self, event):
+        """Serializes a single <Event> element and writes it out
+
+        Args:
+            event:  Etree Event element, as made by `createEventElement(None,...)`
+        """
+        self.fh.write(serializeElement(event))
+
+    def writeFragment(self, xml_str):
+        """Writes already serialized events, as rendered by another writer's `fh`
+
+        Args:
+            xml_str:    Serialized events string
+        """
+        self.fh.write(xml_str)
+
+    def close(self):
+        """Closes the root element and the file, then moves the finished product to its own name"""
+        if self.fh is not None and not self.fh.closed:
+            with Metrics.stage("write"):
+                self.fh.write('\n</' + self.root_tag + '>\n')
+                Metrics.count("bytes_written", self.fh.tell())
+                self.fh.close()
+                if self.part_filename is not None:
+                    os.rename(self.part_filename, self.out_filename)
+
+    def abort(self):
+        """Gives up on the product after a failure: closes the file without the root end tag and deletes it, so
+        no truncated product is left behind. Safe to call at any point, more than once"""
+        if self.fh is not None and not self.fh.closed:
+            try:
+                self.fh.close()
+            except Exception:
+                pass
+        if self.part_filename is not None and os.path.exists(self.part_filename):
+            os.remove(self.part_filename)
+
+
+def generateXMLHeader(startTime,stopTime,filename):
+    """Generates an XML handle with header information filled in
+
+    Args:
+        startTime:  UTC starttime marking the start of events
+        stopTime:   UTC stoptime marking the end of events
+        filename:   Filename of the input event file
+    
+    Returns:
+        root:   Etree XML root object. Manipulate later. 
+
+    Examples:
+        df = pd.read_csv("filename.csv")
+        root = ParseEvents.generateXMLHeader(df, "foobar.csv")
+    """
+    ###### Create the XML root object
+    root = ET.Element("FDF_to_FP")
+
+    ###### Create all of the header elements
+    fname_elem = ET.SubElement(root,"FILENAME")
+    fname_elem.text = string.replace(splitCompression(filename)[0], "csv", "xml").split('/')[-1]
+    date_elem = ET.SubElement(root,"CREATION_DATE")
+    date_elem.text = datetime.strftime(datetime.utcnow(),xml_date_format)
+    ## Start time is the first start time in the file
+    start_elem = ET.SubElement(root,"START")
+    start_elem.text = startTime
+    ## End time is the last stop time in the file
+    end_elem = ET.SubElement(root,"END")
+    end_elem.text = stopTime
+    ## Some unused/Empty elements 
+    sve_element = ET.SubElement(root,"STATE_VECTOR_EPOCH")
+    sv_element = ET.SubElement(root,"STATE_VECTOR")
+    return root
+
+
+def getStartStopTimes(dataframe, as_string=True, input_format=typical_in_format):
+    """Finds the erliest start time and latest stop time in a dataframe
+
+    Args:
+        dataframe:  dataframe containing event info. Assumes 'Start' and 'Stop' column. Reuses the
+                    'StartTime' and 'StopTime' columns from `parseEventTimes()` if they are there already
+
+    Kwargs:
+        as_string:      Return the times in a formatted string (xml format for now)
+        input_format:   Specify input datestring format instead of using default
+    
+    Returns:
+        startTime:   Earliest event start time
+        stopTime:    Latest event stop time
+
+    Examples:
+        df = pd.read_csv("filename.csv", names = ['Start','Stop',...])
+        t1,t2 = ParseEvents.getStartStopTimes(df)
+    """
+    if 'StartTime' not in dataframe or 'StopTime' not in dataframe:
+        parseEventTimes(dataframe, input_format=input_format)
+    ## NaT is skipped by the reductions, same as the null filtering before
+    with Metrics.stage("start_stop", rows=len(dataframe)):
+        startTime = pd.Timestamp(dataframe.StartTime.min()).to_pydatetime()
+        stopTime = pd.Timestamp(dataframe.StopTime.max()).to_pydatetime()
+    if as_string is True:
+        ## Format datetime objects as strings
+        startTime = convertTimeFormat(startTime,from_string=True)
+        stopTime = convertTimeFormat(stopTime,from_string=True)
+    return startTime,stopTime
+
+
+def parseEventFilename(filename):
+    """Splits an event filename into its fields. Handles per-satellite files and files without a satellite:
+        PHOTO_SAT1_STARTTIME_STOPTIME_CREATIONTIME_V1.csv
+        COMM_STARTTIME_STOPTIME_CREATIONTIME_V1.csv
+    Extensions are ignored, compressed files (.csv.gz...) split the same way.
+
+    Args:
+        filename:   Event filename, with or without a directory
+    
+    Returns:
+        fields:     Dict with 'type', 'sat' (None if there is none), 'start', 'stop', 'created' and 'version'. 
+                    None if the name doesn't follow the convention
+
+    Examples:
+        fields = ParseEvents.parseEventFilename("Input/PHOTO_SAT1_20140704000000_20140711000000_20140604124500_V1.csv")
+        fields['sat']   # -> 'SAT1'
+    """
+    keys = filename.split('/')[-1].split('.')[0].split('_')
+    if len(keys) == 6:
+        event_type,sat,start,stop,created,version = keys
+    elif len(keys) == 5:
+        event_type,start,stop,created,version = keys
+        sat = None
+    else:
+        return None
+    return {'type':event_type, 'sat':sat, 'start':start, 'stop':stop, 'created':created, 'version':version}
+
+
+def buildEventFileIndex(in_dir, names=None):
+    """Indexes every event file in a directory by product, with a single directory listing. A product is 
+    everything sharing an (event type, start, stop, version) key, one file per satellite. Compressed csvs
+    (see `splitCompression()`) are indexed like plain ones.
+
+    Args:
+        in_dir:     Directory to index
+
+    Kwargs:
+        names:      Directory listing, if it was already taken
+    
+    Returns:
+        index:      Dict of (type, start, stop, version) -> list of (sat, filename) sorted by sat
+
+    Examples:
+        index = ParseEvents.buildEventFileIndex("Input")
+        index[("PHOTO","20140704000000","20140711000000","V1")]
+    """
+    index = {}
+    for f in os.listdir(in_dir) if names is None else names:
+        fields = parseEventFilename(f)
+        if fields is None or not splitCompression(f)[0].endswith('.csv'):
+            continue
+        key = (fields['type'],fields['start'],fields['stop'],fields['version'])
+        index.setdefault(key,[]).append((fields['sat'], in_dir + '/' + f))
+    for members in index.values():
+        members.sort()
+    return index
+
+
+def getEventFileIndex(in_dir):
+    """Returns the cached `buildEventFileIndex()` for a directory, rebuilding it only if the directory's listing
+    changed. The index only depends on the filenames, so the listing is an exact key where the directory's mtime
+    can miss files added within one tick of it.
+
+    Args:
+        in_dir:     Directory to index
+    
+    Returns:
+        index:      See `buildEventFileIndex()`
+
+    Examples:
+        index = ParseEvents.getEventFileIndex("Input")
+    """
+    names = sorted(os.listdir(in_dir))
+    if in_dir not in event_file_indexes or event_file_indexes[in_dir][0] != names:
+        event_file_indexes[in_dir] = (names, buildEventFileIndex(in_dir, names=names))
+    return event_file_indexes[in_dir][1]
+
+
+def findPairedEventFiles(filename):
+    """Finds all the files that make up a product with an event file (one for each satellite), without loading
+    anything. Files belong together when their event type, start, stop and version match, I.E.
+        PHOTO_SAT1_STARTTIME_STOPTIME_**_V1
+        is grouped with:
+        PHOTO_SAT2_STARTTIME_STOPTIME_**_V1
+        PHOTO_SAT3_STARTTIME_STOPTIME_**_V1 ...
+
+    Args:
+        filename:  Any filename of the group
+    
+    Returns:
+        members:    List of (filename, sat) tuples, the given file first, then the others by sat
+        combo_fn:   New filename with 'SAT*' removed. The original filename if there is no match or no Sat
+
+    Examples:
+        members,combo_fn = ParseEvents.findPairedEventFiles('Input/PHOTO_SAT1_..._V1.csv')
+    """
+    in_dir = os.path.dirname(filename) or '.'
+    fields = parseEventFilename(filename)
+    if fields['sat'] is None:
+        ## No Sat in the name (COMM), a product of its own. Files sharing its key only differ by creation time
+        return [(filename,None)],filename
+    key = (fields['type'],fields['start'],fields['stop'],fields['version'])
+
+    ###### Look the group up in the directory index
+    with Metrics.stage("pairing"):
+        matches = [(fname,sat) for sat,fname in getEventFileIndex(in_dir).get(key,[])
+                    if os.path.basename(fname) != os.path.basename(filename)]
+    
+    log.info("Orig filename: %s", filename)
+    log.info("match filename: %s", [fname for fname,sat in matches])
+
+    if len(matches) == 0:
+        log.warning("NO MATCHES FOUND FOR FILENAME: %s", filename)
+        return [(filename,fields['sat'])],filename
+
+    combo_fn = string.replace(filename.split('/')[-1], fields['sat'] + '_', '', 1)
+    return [(filename,fields['sat'])] + matches,combo_fn
+
+
+def loadEventFiles(members, cols=None, time_order=False, input_format=typical_in_format):
+    """Loads the member files of a product into a single dataframe, with a 'Sat' column added.
+
+    Args:
+        members:    List of (filename, sat) tuples, as from `findPairedEventFiles()`
+
+    Kwargs:
+        cols:           override column names as list
+        time_order:     Merge the members in start time order (see `mergeEventFrames()`) instead of one after another
+        input_format:   Input date format of the Start and Stop columns
+    
+    Returns:
+        df:         Combined dataframe, with times parsed
+
+    Examples:
+        members,combo_fn = ParseEvents.findPairedEventFiles('Input/PHOTO_SAT1_..._V1.csv')
+        df = ParseEvents.loadEventFiles(members, cols=["Start","Stop","Duration"])
+    """
+    frames = []
+    for fname,sat in members:
+        frames.append(readEventFile(fname, cols=cols, input_format=input_format))
+        frames[-1]['Sat'] = sat
+
+    if len(frames) == 1:
+        return frames[0]
+
+    if time_order is True:
+        return mergeEventFrames([frame.dropna() for frame in frames], input_format=input_format)
+
+    ###### Combine them all in one go, instead of copying with each append
+    return pd.concat(frames).dropna()
+
+
+def readEventFile(filename, cols=None, input_format=typical_in_format):
+    """Reads a single event file and parses its times (see `parseEventTimes()`). Goes through the parsed input
+    cache when `cache_dir` is set, so a file that was read before is memory-mapped back instead of re-parsed.
+
+    Args:
+        filename:   Event file to read
+
+    Kwargs:
+        cols:           override column names as list
+        input_format:   Input date format of the Start and Stop columns
+    
+    Returns:
+        df:     Dataframe of the file, nulls included, with 'StartTime' and 'StopTime' columns
+
+    Examples:
+        df = ParseEvents.readEventFile('Input/PHOTO_SAT1_..._V1.csv', cols=["Start","Stop","Duration"])
+    """
+    with Metrics.stage("load") as stage:
+        if cache_dir is not None:
+            df = EventCache.loadEventFile(filename, cols, input_format, cache_dir, _readEventFile)
+        else:
+            df = _readEventFile(filename, cols, input_format)
+        stage.addRows(len(df))
+    return df
+
+
+def tokenizedTypesFit(df, spec):
+    """Checks a `StkTokenizer` frame against the column types its event type needs, so a file the tokenizer types
+    differently from the generic reader is read again the generic way instead of failing further on
+
+    Args:
+        df:     Dataframe from `StkTokenizer.readStkEventFile()`
+        spec:   `event_types` entry of the file, None if it isn't a known type
+
+    Returns:
+        fits:   False if the duration column isn't numeric, or a column isn't of its `column_types` kind
+    """
+    if spec is None:
+        return True
+    duration = spec.get('duration_column')
+    if duration is not None and duration in df and not np.issubdtype(df[duration].dtype, np.number):
+        return False
+    for name,dtype in spec.get('column_types', {}).items():
+        if name in df and dtype != 'category' and df[name].dtype.kind != np.dtype(dtype).kind:
+            return False
+    return True
+
+
+def _readEventFile(filename, cols, input_format, byte_range=None):
+    """Reads and parses an event file, bypassing the cache. Plain STK files go through `StkTokenizer` first.
+    byte_range reads just the (start, stop) rows of a plain file, see `splitEventFile()`"""
+    start,stop = byte_range or (0, None)
+    if stk_tokenizer is True and input_format == typical_in_format and cols is not None and \
+            splitCompression(filename)[1] == '':
+        df = StkTokenizer.readStkEventFile(filename, cols, na_values=lite_na_values, start=start, stop=stop)
+        if df is not None and tokenizedTypesFit(df, event_types.get(filename.split('/')[-1].split('_')[0])):
+            return df
+        Metrics.count("tokenizer_fallbacks")
+    if byte_range is not None:
+        f = open(filename, 'rb')
+        try:
+            f.seek(start)
+            text = f.read(stop - start)
+        finally:
+            f.close()
+        ## A range has no header line, and may have nothing but blank lines
+        if not text.strip():
+            df = pd.DataFrame(dict((name, []) for name in cols), columns=cols)
+        else:
+            df = zsheet.import_csv(cStringIO.StringIO(text), header=None, names=cols)
+        return parseEventTimes(df, input_format=input_format)
+    f = openEventFile(filename)
+    try:
+        df = zsheet.import_csv(f, header=0, names=cols)
+    finally:
+        f.close()
+    return parseEventTimes(df, input_format=input_format)
+
+
+def getPairedEventFiles(filename, cols=None):
+    """Loads all the event files of a product (one for each satellite, etc) into a single dataframe. 
+    See `findPairedEventFiles()` for how the files are grouped.
+
+    Args:
+        filename:  Any filename of the group
+
+    Kwargs:
+        cols:  override column names as list
+    
+    Returns:
+        df:         Combined dataframe, with a 'Sat' column
+        combo_fn:   New filename with 'SAT*' removed. 
+
+    Examples:
+        df = ParseEvents.getPairedEventFiles('SAT1_Event.csv')
+    """
+    members,combo_fn = findPairedEventFiles(filename)
+    return loadEventFiles(members, cols=cols),combo_fn
+
+
+def iterEventChunks(members, chunksize, cols=None):
+    """Generator reading event files in fixed size row batches, so a file is never fully in memory.
+    Chunks come out in the same order, with the same 'Sat' column and null filtering, as the rows of
+    `getPairedEventFiles()`
+
+    Args:
+        members:    List of (filename, sat) tuples, as from `findPairedEventFiles()`. sat can be None
+        chunksize:  Number of rows per chunk
+
+    Kwargs:
+        cols:  override column names as list
+    
+    Returns:
+        chunk:  Yields dataframes of at most `chunksize` rows
+
+    Examples:
+        members,combo_fn = ParseEvents.findPairedEventFiles('Input/PHOTO_SAT1_..._V1.csv')
+        for chunk in ParseEvents.iterEventChunks(members, 10000, cols=["Start","Stop","Duration"]):
+            print len(chunk)
+    """
+    for fname,sat in members:
+        f = openEventFile(fname)
+        try:
+            reader = pd.read_csv(f, header=0, names=cols, chunksize=chunksize)
+            while True:
+                ## Time just the reading, not whatever the consumer does between chunks
+                with Metrics.stage("load") as stage:
+                    try:
+                        chunk = reader.next()
+                    except StopIteration:
+                        break
+                    stage.addRows(len(chunk))
+                if sat is not None:
+                    chunk['Sat'] = sat
+                yield chunk.dropna()
+        finally:
+            f.close()
+
+
+def _iterEventRows(chunks, k, input_format):
+    """Turns one satellite's chunks into (start, k, seq, row) tuples for `heapq.merge`. start is the parsed
+    StartTime as int64 nanoseconds, k and seq keep ties in stream then file order, so rows never get compared.
+    """
+    seq = itertools.count()
+    last = None
+    for chunk in chunks:
+        if 'StartTime' not in chunk:
+            parseEventTimes(chunk, input_format=input_format)
+        starts = chunk.StartTime.values.view('i8')
+        if len(starts) and ((last is not None and starts[0] < last) or (np.diff(starts) < 0).any()):
+            log.warning("Stream %d is not sorted by start time, merged output won't be either", k)
+        if len(starts):
+            last = starts[-1]
+        for start,row in itertools.izip(starts, chunk.itertuples(index=False)):
+            yield start,k,seq.next(),row
+
+
+def mergeEventChunks(streams, chunksize, input_format=typical_in_format):
+    """Heap-based k-way merge of per-satellite chunk streams into a single stream in global start time order.
+    Each stream must already be sorted by start time, which the per-satellite files are. Runs in O(n log k)
+    and only ever holds one chunk per stream plus the output chunk, so memory stays bounded.
+
+    Args:
+        streams:    List of chunk iterables, one per satellite (see `iterEventChunks()`)
+        chunksize:  Number of rows per merged output chunk
+
+    Kwargs:
+        input_format:   Input date format of the Start and Stop columns
+    
+    Returns:
+        chunk:  Yields time ordered dataframes of at most `chunksize` rows, with times already parsed
+
+    Examples:
+        streams = [ParseEvents.iterEventChunks([member], 10000, cols=cols) for member in members]
+        for chunk in ParseEvents.mergeEventChunks(streams, 10000):
+            print chunk.StartTime.iloc[0]
+    """
+    rows = []
+    columns = None
+    merged = heapq.merge(*[_iterEventRows(chunks, k, input_format) for k,chunks in enumerate(streams)])
+    for start,k,seq,row in merged:
+        if columns is None:
+            columns = list(row._fields)
+        rows.append(row)
+        if len(rows) == chunksize:
+            yield pd.DataFrame.from_records(rows, columns=columns)
+            rows = []
+    if len(rows):
+        yield pd.DataFrame.from_records(rows, columns=columns)
+
+
+def mergeEventFrames(frames, input_format=typical_in_format):
+    """Combines per-satellite dataframes in global start time order with a heap-based k-way merge, instead of 
+    concatenating them one after the other and sorting. Each frame must already be sorted by start time.
+
+    Args:
+        frames:     List of dataframes, one per satellite
+
+    Kwargs:
+        input_format:   Input date format of the Start and Stop columns
+    
+    Returns:
+        df:     Combined dataframe in start time order, with times parsed
+
+    Examples:
+        df = ParseEvents.mergeEventFrames([df_sat1, df_sat2])
+    """
+    for frame in frames:
+        if 'StartTime' not in frame:
+            parseEventTimes(frame, input_format=input_format)
+    offsets = np.cumsum([0] + [len(frame) for frame in frames])
+
+    ###### Merge just the start times, then pull the rows out in that order
+    keys = [itertools.izip(frame.StartTime.values.view('i8'), itertools.repeat(k), itertools.count(offsets[k]))
+                for k,frame in enumerate(frames)]
+    order = np.fromiter((pos for start,k,pos in heapq.merge(*keys)), dtype=np.int64, count=offsets[-1])
+    return pd.concat(frames).iloc[order]
+
+
+def convertEventChunks(chunks, filename, emitter, writer, input_format=typical_in_format, pipeline=False, times=None):
+    """Chunked conversion pipeline. Each chunk has its times parsed, IDs leased and events streamed out
+    before the next one is read. The header START and END need the global min and max times, so the header
+    is written with placeholders that are patched in place (`XMLEventWriter.patchHeader()`) at the end, unless
+    the times are already known (compressed output can't be patched, see `scanEventTimes()`).
+
+    Args:
+        chunks:         Iterable of event dataframes, see `iterEventChunks()`
+        filename:       Filename for the header (combined filename for paired events)
+        emitter:        Function emitting a dataframe's events, see `getEventEmitter()`
+        writer:         XMLEventWriter to stream to. Required, nothing is kept in memory
+
+    Kwargs:
+        input_format:   Input date format of the Start and Stop columns
+        pipeline:       Read the next chunk and write the previous one in their own threads while this one is
+                        converted (see `Pipeline.runPipeline()`). Output is identical
+        times:          (startTime, stopTime) datetimes for the header, from `scanEventTimes()`. None to patch them in
+    
+    Returns:
+        root:   Etree XML root object with the final header filled in, no events
+
+    Examples:
+        chunks = ParseEvents.iterEventChunks(members, 10000, cols=["Start","Stop","Duration"])
+        root = ParseEvents.convertEventChunks(chunks, combo_fn, ParseEvents.getEventEmitter("ECLIPSE"), writer)
+    """
+    ###### Header goes first, times usually aren't known yet
+    startTime,stopTime = _headerTimes(times)
+    root = generateXMLHeader(startTime,stopTime,filename)
+    writer.writeHeader(root)
+
+    ###### Run every chunk all the way through
+    bounds = []
+    if pipeline is True:
+        ## Events are rendered here, and written out by the pipeline's write thread
+        def transform(chunk):
+            xml_str = _renderEventChunk(chunk, root, emitter, bounds, input_format)
+            yield functools.partial(writer.writeFragment, xml_str)
+        Pipeline.runPipeline(chunks, transform)
+    else:
+        for chunk in chunks:
+            _convertEventChunk(chunk, root, emitter, writer, bounds, input_format)
+
+    if len(bounds) == 0:
+        log.warning("NO EVENTS FOUND FOR FILENAME: %s", filename)
+        return root
+    if times is not None:
+        return root
+
+    ###### Now patch in the real header times
+    startTime = convertTimeFormat(min(t1 for t1,t2 in bounds),from_string=True)
+    stopTime = convertTimeFormat(max(t2 for t1,t2 in bounds),from_string=True)
+    writer.patchHeader(startTime,stopTime)
+    root.find("START").text = startTime
+    root.find("END").text = stopTime
+    return root
+
+
+def _headerTimes(times):
+    """Header START and END strings for (startTime, stopTime) datetimes, placeholders if they aren't known"""
+    if times is None or times[0] is None:
+        placeholder = convertTimeFormat(datetime(1970,1,1),from_string=True)
+        return placeholder,placeholder
+    return convertTimeFormat(times[0],from_string=True),convertTimeFormat(times[1],from_string=True)
+
+
+def scanEventTimes(members, chunksize, cols=None, input_format=typical_in_format):
+    """First pass over a product's files for just its earliest start and latest stop, so the header of output
+    that can't be patched afterwards (compressed streams) can be written up front. Reads the input twice, but
+    memory stays at one chunk and nothing is decompressed to disk.
+
+    Args:
+        members:    List of (filename, sat) tuples, as from `findPairedEventFiles()`
+        chunksize:  Number of rows per chunk
+
+    Kwargs:
+        cols:           override column names as list
+        input_format:   Input date format of the Start and Stop columns
+
+    Returns:
+        startTime:  Earliest start time (datetime), None if there are no events
+        stopTime:   Latest stop time
+
+    Examples:
+        times = ParseEvents.scanEventTimes(members, 100000, cols=["Start","Stop","Duration"])
+    """
+    startTime = stopTime = None
+    for chunk in iterEventChunks(members, chunksize, cols=cols):
+        if len(chunk) == 0:
+            continue
+        t1,t2 = getStartStopTimes(chunk, as_string=False, input_format=input_format)
+        startTime = t1 if startTime is None else min(startTime,t1)
+        stopTime = t2 if stopTime is None else max(stopTime,t2)
+    return startTime,stopTime
+
+
+def _convertEventChunk(chunk, root, emitter, writer, bounds, input_format):
+    """Converts one chunk for `convertEventChunks()`, adding its (start, stop) times to bounds"""
+    if len(chunk) == 0:
+        return
+    if 'StartTime' not in chunk:
+        parseEventTimes(chunk, input_format=input_format)
+    bounds.append(getStartStopTimes(chunk, as_string=False))
+    emitter(root, chunk, writer=writer)
+
+
+def _renderEventChunk(chunk, root, emitter, bounds, input_format):
+    """Like `_convertEventChunk()`, but returns the serialized events instead of writing them"""
+    fragments = XMLEventWriter(fh=cStringIO.StringIO())
+    _convertEventChunk(chunk, root, emitter, fragments, bounds, input_format)
+    return fragments.fh.getvalue()
+
+
+class _LiteFallback(Exception):
+    """Raised by the lite engine on input it can't be sure to convert exactly like the DataFrame path"""
+
+
+def liteEngineSupports(spec):
+    """Whether the lite engine (see `convertLiteEventProduct()`) handles an event type at all. Types needing typed
+    columns or day count durations (COMM) always go through pandas.
+
+    Args:
+        spec:   `event_types` entry
+
+    Returns:
+        supported:  Boolean
+    """
+    return (spec['columns'] is not None and spec['time_format'] == typical_in_format and
+            not spec.get('column_types') and spec.get('day_duration_column') is None)
+
+
+def parseTimeString(text):
+    """Hand-rolled parser for one `typical_in_format` time string, for the lite engine. Strict, anything pandas
+    might read differently raises _LiteFallback.
+
+    Args:
+        text:   Time string, like '4 Jul 2014 01:42:00.000'
+
+    Returns:
+        time:   (datetime to the second, nanoseconds past the second) tuple, sorts like the time itself
+
+    Examples:
+        t,ns = ParseEvents.parseTimeString('4 Jul 2014 00:46:10.769')
+    """
+    try:
+        day,month,year,clock = text.split(' ')
+        hms,frac = clock.split('.')
+        hour,minute,second = hms.split(':')
+        for field,width in [(day,2),(year,4),(hour,2),(minute,2),(second,2),(frac,6)]:
+            if not field.isdigit() or len(field) > width:
+                raise ValueError(text)
+        ## strftime can't write the header times before 1900
+        if len(year) != 4 or year < '1900':
+            raise ValueError(text)
+        return datetime(int(year), month_numbers[month], int(day), int(hour), int(minute), int(second)),int(frac.ljust(9,'0'))
+    except (ValueError, KeyError):
+        raise _LiteFallback("Can't parse time '%s'" % text)
+
+
+def _checkLiteText(value):
+    """Text values pandas would give a type of their own (numbers, booleans) raise _LiteFallback"""
+    try:
+        float(value)
+    except ValueError:
+        if value.lower() not in ('true', 'false'):
+            return value
+    raise _LiteFallback("'%s' would be read as a number or boolean" % value)
+
+
+def _isAscii(text):
+    """Whether a byte string is plain ascii"""
+    try:
+        text.decode('ascii')
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def _totalSeconds(delta):
+    """Whole seconds of a timedelta, exactly"""
+    return delta.days*86400 + delta.seconds
+
+
+def readLiteEventRows(members, spec, time_order=False):
+    """Reads the member files of a product with the stdlib csv module, for the lite engine. Rows come out in the 
+    same order as the rows of `loadEventFiles()`.
+
+    Args:
+        members:    List of (filename, sat) tuples, as from `findPairedEventFiles()`
+        spec:       `event_types` entry, see `liteEngineSupports()`
+
+    Kwargs:
+        time_order: Merge the members in start time order, like `mergeEventFrames()`
+
+    Returns:
+        rows:   List of (start, stop, fields, sat) tuples. start and stop from `parseTimeString()`, fields the 
+                row's raw strings in `spec['columns']` order
+
+    Examples:
+        rows = ParseEvents.readLiteEventRows(members, ParseEvents.event_types["PHOTO"])
+    """
+    cols = spec['columns']
+    start_k,stop_k = cols.index('Start'),cols.index('Stop')
+    text_columns = [cols.index(param['column']) for param in spec['parameters'] if 'column' in param]
+    if spec['sat_column'] in cols:
+        text_columns.append(cols.index(spec['sat_column']))
+    duration_k = cols.index(spec['duration_column']) if spec['duration_column'] is not None else None
+
+    streams = []
+    for fname,sat in members:
+        rows = []
+        f = openEventFile(fname)
+        try:
+            lines = (fields for fields in csv.reader(f) if len(fields))
+            ## The header line is replaced by the registry's column names, same as the DataFrame path
+            next(lines, None)
+            for fields in lines:
+                if len(fields) != len(cols):
+                    raise _LiteFallback("%s has a row of %d fields" % (fname, len(fields)))
+                for field in fields:
+                    ## Rows the DataFrame path would drop, or read as anything but ascii text
+                    if field in lite_na_values or field.strip(' \t\r') != field or not _isAscii(field):
+                        raise _LiteFallback("%s has a field pandas reads differently: '%s'" % (fname, field))
+                for k in text_columns:
+                    _checkLiteText(fields[k])
+                if duration_k is not None and not lite_number_pattern.match(fields[duration_k]):
+                    raise _LiteFallback("Unusual duration '%s'" % fields[duration_k])
+                rows.append((parseTimeString(fields[start_k]), parseTimeString(fields[stop_k]), fields, sat))
+        finally:
+            f.close()
+        streams.append(rows)
+
+    if time_order is True and len(streams) > 1:
+        keyed = [[(row[0],k,pos,row) for pos,row in enumerate(rows)] for k,rows in enumerate(streams)]
+        return [row for start,k,pos,row in heapq.merge(*keyed)]
+    return [row for rows in streams for row in rows]
+
+
+def convertLiteEventProduct(spec, members, combo_filename, emitter, writer, time_order=False):
+    """Lite conversion engine for small products: stdlib csv and hand-rolled time parsing instead of pandas, 
+    so the run never imports pandas or NumPy. Rows are rendered with the same templates and IDs are leased
+    the same way as the DataFrame path, so output is byte-identical. Gives up (before writing anything) on
+    products over `lite_max_bytes` or input it isn't sure about, see `readLiteEventRows()`.
+
+    Args:
+        spec:               `event_types` entry, see `liteEngineSupports()`
+        members:            List of (filename, sat) tuples, as from `findPairedEventFiles()`
+        combo_filename:     Product filename for the header
+        emitter:            The type's emitter from `getEventEmitter()`, for its template renderer
+        writer:             XMLEventWriter to stream to
+
+    Kwargs:
+        time_order: Merge the members in start time order
+
+    Returns:
+        root:   Etree XML root object, header only. None if the DataFrame path has to do it
+
+    Examples:
+        root = ParseEvents.convertLiteEventProduct(spec, members, combo_fn, ParseEvents.getEventEmitter("PHOTO"), writer)
+    """
+    if sum(os.path.getsize(fname) for fname,sat in members) > lite_max_bytes:
+        return None
+    try:
+        with Metrics.stage("load") as stage:
+            rows = readLiteEventRows(members, spec, time_order=time_order)
+            stage.addRows(len(rows))
+        if len(rows) == 0:
+            raise _LiteFallback("No rows")
+    except _LiteFallback as e:
+        log.debug("Lite engine passing on %s: %s", combo_filename, e)
+        return None
+
+    ###### Same strings the DataFrame path formats a column at a time
+    cols = spec['columns']
+    with Metrics.stage("format", rows=len(rows)):
+        utcStarts = [convertTimeFormat(start[0],from_string=True) for start,stop,fields,sat in rows]
+        if spec['duration_column'] is None:
+            ## Whole nanoseconds divided once, like the timedelta64 division
+            durations = [str((_totalSeconds(stop[0] - start[0])*10**9 + stop[1] - start[1]) / 1e6)
+                            for start,stop,fields,sat in rows]
+        else:
+            k = cols.index(spec['duration_column'])
+            durations = [str(float(fields[k]) * 1e3) for start,stop,fields,sat in rows]
+        if spec['sat_column'] in cols:
+            k = cols.index(spec['sat_column'])
+            sats = [fields[k] for start,stop,fields,sat in rows]
+        else:
+            sats = [sat for start,stop,fields,sat in rows]
+        param_rows = [[fields[cols.index(param['column'])] if 'column' in param else param['value']
+                        for param in spec['parameters']] for start,stop,fields,sat in rows]
+
+    startTime = convertTimeFormat(min(start for start,stop,fields,sat in rows)[0],from_string=True)
+    stopTime = convertTimeFormat(max(stop for start,stop,fields,sat in rows)[0],from_string=True)
+    root = generateXMLHeader(startTime,stopTime,combo_filename)
+    writer.writeHeader(root)
+
+    with UniqueIDs.leaseUniqueIDs(len(rows), pName) as lease, Metrics.stage("emit", rows=len(rows)):
+        first_uid = lease.takeIDs(len(rows))
+        writer.writeFragment(''.join(itertools.starmap(emitter.render,
+            itertools.izip(utcStarts, durations, itertools.imap(str, xrange(first_uid, first_uid + len(rows))), sats,
+                           param_rows))))
+    if spec.get('warning') is not None:
+        log.warning(spec['warning'])
+    return root
+
+
+def shardEventRecords(records, shard_by, shard_size, render=None, overhead=0):
+    """Splits a product's records into shards, in output order
+
+    Args:
+        records:        `EventRecords.EventRecords` of the product, IDs assigned
+        shard_by:       'events' for at most shard_size events per shard, 'bytes' for at most shard_size bytes of XML
+                        per shard (before compression), 'window' for one shard per shard_size seconds of start times
+                        (windows line up with the epoch, so 86400 gives UTC days)
+        shard_size:     Events, bytes or seconds, see shard_by
+
+    Kwargs:
+        render:     Template renderer of the type (`getEventEmitter(...).render`), needed for 'bytes'
+        overhead:   Bytes of each shard's header and closing tag, for 'bytes'
+
+    Returns:
+        records:    Same records for 'events' and 'bytes'. For 'window' they are grouped by window (product order
+                    within each) and their IDs renumbered in that order, so each shard's IDs are contiguous
+        bounds:     List of (lo, hi) row ranges, one per shard
+
+    Examples:
+        records,bounds = ParseEvents.shardEventRecords(records, 'window', 86400)
+    """
+    n = len(records)
+    if shard_size <= 0:
+        raise ValueError("Shard size must be positive, got %r" % shard_size)
+    if n == 0:
+        return records,[]
+    if shard_by == 'events':
+        cuts = range(0, n, int(shard_size)) + [n]
+    elif shard_by == 'window':
+        key = records.rows['start'] // int(shard_size)
+        order = np.argsort(key, kind='mergesort')
+        first_uid = records.rows['uid'].min()
+        records = records.take(order)
+        records.rows['uid'] = np.arange(first_uid, first_uid + n)
+        cuts = [0] + (np.flatnonzero(np.diff(key[order])) + 1).tolist() + [n]
+    elif shard_by == 'bytes':
+        ###### Exact serialized size of every event, then greedy cuts. An event too big for any shard gets its own
+        sizes = eventSizes(records, render)
+        ends = np.cumsum(sizes)
+        cuts = [0]
+        while cuts[-1] < n:
+            done = ends[cuts[-1] - 1] if cuts[-1] else 0
+            cuts.append(max(int(np.searchsorted(ends, done + shard_size - overhead, side='right')), cuts[-1] + 1))
+    else:
+        raise ValueError("Unknown shard_by '%s', expected 'events', 'bytes' or 'window'" % shard_by)
+    return records,zip(cuts[:-1], cuts[1:])
+
+
+def eventSizes(records, render):
+    """Bytes each event serializes to, without serializing them. An event is its template's constant text plus
+    its fields, and sat and parameter values come from the records' small interned tables, so only durations and
+    IDs are measured per event. Tables with values the template can't render (see `compileEventTemplate()`)
+    are measured by rendering every event instead
+
+    Args:
+        records:    `EventRecords.EventRecords`, IDs assigned
+        render:     Template renderer of the type (`getEventEmitter(...).render`)
+
+    Returns:
+        sizes:  int64 array of bytes per event
+    """
+    tables = [records.sats] + [param['values'] for param in records.params if 'field' in param]
+    if not all(isPlainText(value) for value in records.sats) or \
+            not all(isPlainText(paramText(value)) for table in tables[1:] for value in table):
+        sizes = np.empty(len(records), dtype=np.int64)
+        for lo in xrange(0, len(records), 100000):
+            sizes[lo:lo + 100000] = [len(xml_str) for xml_str in
+                                      itertools.starmap(render, itertools.izip(*formatEventRecords(records, lo, lo + 100000)))]
+        return sizes
+
+    ###### Template text from one event, fields per table entry, then durations and IDs
+    fields = [row[0] for row in formatEventRecords(records, 0, 1)]
+    utcStart,duration,uid,sat,param_values = fields
+    param_text = [escapeXMLText(paramText(value)) for value in param_values]
+    fixed = len(render(*fields)) - len(utcStart) - len(duration) - len(uid) - len(escapeXMLText(sat)) - \
+            sum(len(text) for text in param_text)
+    rows = records.rows
+    sizes = fixed + len(utcStart) + np.array([len(escapeXMLText(value)) for value in records.sats])[rows['sat']]
+    for param,text in zip(records.params, param_text):
+        if 'field' in param:
+            sizes += np.array([len(escapeXMLText(paramText(value))) for value in param['values']])[rows[param['field']]]
+        else:
+            sizes += len(text)
+    sizes += np.fromiter(itertools.imap(len, itertools.imap(str, rows['duration'].tolist())), np.int64, len(rows))
+    sizes += np.fromiter(itertools.imap(len, itertools.imap(str, rows['uid'].tolist())), np.int64, len(rows))
+    return sizes
+
+
+def writeEventRecords(event_type, records, product_filename, out_dir='Output', compression=''):
+    """Writes records as a complete product of their own, header START and END taken from the records
+
+    Args:
+        event_type:         Key into `event_types`
+        records:            `EventRecords.EventRecords`, at least one
+        product_filename:   Header FILENAME, and the output filename in out_dir (plus the compression suffix)
+
+    Kwargs:
+        out_dir:        Directory to write to
+        compression:    Compression suffix, see `XMLEventWriter`
+
+    Returns:
+        entry:  Manifest dict of the file: filename, events, start, end, first_id, last_id and bytes (on disk)
+
+    Examples:
+        entry = ParseEvents.writeEventRecords("PHOTO", records.take(slice(0, 1000)), "PHOTO_..._V1_P0001.xml")
+    """
+    rows = records.rows
+    startTime,stopTime = formatTimes(np.array([rows['start'].min(), rows['stop'].max()]).astype('datetime64[s]'))
+    writer = XMLEventWriter(out_dir=out_dir, compression=compression)
+    try:
+        writer.writeHeader(generateXMLHeader(startTime, stopTime, product_filename))
+        getEventEmitter(event_type).serialize(None, records, writer=writer)
+    except:
+        writer.abort()
+        raise
+    writer.close()
+    return {'filename': writer.out_filename.split('/')[-1], 'events': len(records), 'start': startTime,
+            'end': stopTime, 'first_id': int(rows['uid'].min()), 'last_id': int(rows['uid'].max()),
+            'bytes': os.path.getsize(writer.out_filename)}
+
+
+def _writeShard(args):
+    """Pool worker for `writeShardedProduct()`, args is the `writeEventRecords()` arguments as a tuple"""
+    return writeEventRecords(*args)
+
+
+def writeShardedProduct(filename, shard_by, shard_size, time_order=False, out_dir='Output', compression='',
+                        workers=None):
+    """Converts a product into several smaller XML files (shards) instead of one, plus a JSON manifest listing
+    them. Every shard is a complete FDF_to_FP product with its own header FILENAME, START and END, so shards can
+    be ingested (and retried) independently and in parallel. Shards are named after the product with a _P0001...
+    suffix, the manifest with _MANIFEST.json, and the manifest is only written once every shard is on disk.
+
+    Args:
+        filename:       Any filename of the product
+        shard_by:       'events', 'bytes' or 'window', see `shardEventRecords()`
+        shard_size:     Events, bytes or seconds per shard
+
+    Kwargs:
+        time_order:     Merge the satellites' events in start time order
+        out_dir:        Directory to write shards and manifest to
+        compression:    Compression suffix of the shards, see `XMLEventWriter`
+        workers:        Shards written in this many processes at once. Defaults to the number of CPUs, 1 (or
+                        running inside a worker process already) writes them one after another
+
+    Returns:
+        root:       Etree XML header of the whole product (not written), header only
+        df:         Pandas Dataframe of the product
+        manifest:   Manifest dict, 'shards' holds one entry per shard with its filename, events, start, end,
+                    first_id, last_id and bytes
+
+    Examples:
+        root,df,manifest = ParseEvents.writeShardedProduct("Input/ECLIPSE_SAT1_..._V1.csv", 'events', 100000)
+        root,df,manifest = ParseEvents.writeShardedProduct("Input/PHOTO_SAT1_..._V1.csv", 'window', 86400)
+    """
+    event_type = filename.split('/')[-1].split('_')[0]
+    spec = event_types[event_type]
+    df,combo_filename = loadEventProduct(filename, event_type, time_order=time_order)
+    emitter = getEventEmitter(event_type)
+    with UniqueIDs.leaseUniqueIDs(len(df), pName) as lease, Metrics.stage("records", rows=len(df)):
+        records = EventRecords.EventRecords.fromFrame(df, spec, lease.takeIDs(len(df)))
+
+    ###### Names, and how much each shard spends on things other than events
+    product_name = string.replace(splitCompression(combo_filename)[0], "csv", "xml").split('/')[-1]
+    base = os.path.splitext(product_name)[0]
+    width = max(4, len(str(len(records))))
+    header = generateXMLHeader("01-Jan-2000 00:00:00", "01-Jan-2000 00:00:00", "%s_P%0*d.xml" % (base, width, 0))
+    overhead = len('<FDF_to_FP>' + ''.join(serializeElement(elem) for elem in header) + '\n</FDF_to_FP>\n')
+    records,bounds = shardEventRecords(records, shard_by, shard_size, render=emitter.render, overhead=overhead)
+    width = max(4, len(str(len(bounds))))
+    jobs = [(event_type, records.take(slice(lo, hi)), "%s_P%0*d.xml" % (base, width, k+1), out_dir, compression)
+                for k,(lo,hi) in enumerate(bounds)]
+
+    ###### Shards in parallel. Pool workers can't have pools of their own, they write theirs one at a time
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    pool = None
+    if workers > 1 and len(jobs) > 1 and not multiprocessing.current_process().daemon:
+        pool = multiprocessing.Pool(min(workers, len(jobs)))
+    try:
+        try:
+            with Metrics.stage("emit", rows=len(records)):
+                shards = pool.map(_writeShard, jobs) if pool is not None else map(_writeShard, jobs)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+    except:
+        ## Without the manifest the shards that did get written are an incomplete product
+        removeProducts([os.path.join(out_dir, shard_filename + compression) for e,r,shard_filename,d,c in jobs])
+        raise
+    if spec.get('warning') is not None:
+        log.warning(spec['warning'])
+
+    if len(records):
+        ## From the records, the shards' header strings don't sort in time order
+        startTime,stopTime = formatTimes(np.array([records.rows['start'].min(),
+                                                   records.rows['stop'].max()]).astype('datetime64[s]'))
+    else:
+        log.warning("NO EVENTS FOUND FOR FILENAME: %s", combo_filename)
+        startTime = stopTime = None
+    manifest = {'product': product_name, 'event_type': event_type, 'created': datetime.utcnow().isoformat(),
+                'shard_by': shard_by, 'shard_size': shard_size, 'events': len(records), 'shards': shards}
+    writeManifest(manifest, os.path.join(out_dir, base + "_MANIFEST.json"))
+    return generateXMLHeader(startTime, stopTime, product_name),df,manifest
+
+
+def removeProducts(filenames):
+    """Deletes the files of a product that couldn't be finished, the ones that exist
+
+    Args:
+        filenames:  Output filenames, compression suffix included
+    """
+    for filename in filenames:
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+def writeManifest(manifest, filename):
+    """Writes a shard or delta manifest as JSON, to a temp file renamed into place so readers never see half of one
+
+    Args:
+        manifest:   Dict from `writeShardedProduct()` or `writeDeltaProduct()`
+        filename:   JSON file to write
+    """
+    tmp_filename = filename + ".tmp"
+    f = open(tmp_filename, 'w')
+    json.dump(manifest, f, indent=1, sort_keys=True)
+    f.close()
+    os.rename(tmp_filename, filename)
+
+
+def findPreviousVersion(product_name, out_dir='Output'):
+    """Finds the most recent earlier version of a product among the XML products already in a directory. Products
+    are versions of each other when their event type, start and stop match (see `parseEventFilename()`). Shards
+    and delta files aren't whole products and are never picked.
+
+    Args:
+        product_name:   Filename of the new product, I.E. PHOTO_STARTTIME_STOPTIME_CREATIONTIME_V2.xml
+
+    Kwargs:
+        out_dir:        Directory holding the earlier products
+
+    Returns:
+        filename:   Path of the highest version below the new one (the latest created, if it was issued more than
+                    once). None if there isn't one
+
+    Examples:
+        previous = ParseEvents.findPreviousVersion("PHOTO_20140704000000_20140711000000_20140605090000_V2.xml")
+    """
+    fields = parseEventFilename(product_name)
+    if fields is None or not re.match(r'^V\d+$', fields['version']) or not os.path.isdir(out_dir):
+        return None
+    candidates = []
+    for f in os.listdir(out_dir):
+        other = parseEventFilename(f)
+        if (other is None or not splitCompression(f)[0].endswith('.xml') or other['sat'] is not None or
+                not re.match(r'^V\d+$', other['version'])):
+            continue
+        if (other['type'],other['start'],other['stop']) != (fields['type'],fields['start'],fields['stop']):
+            continue
+        if int(other['version'][1:]) < int(fields['version'][1:]):
+            candidates.append((int(other['version'][1:]), other['created'], os.path.join(out_dir, f)))
+    return max(candidates)[2] if len(candidates) else None
+
+
+def checkPreviousVersion(product_name, previous):
+    """Makes sure a previous version given for a delta (see `writeDeltaProduct()`) really is an earlier version
+    of the product, the way `findPreviousVersion()` would have picked it. Matching against another product would
+    report all of its events removed and every new one added.
+
+    Args:
+        product_name:   Filename of the new product
+        previous:       Path of the previous version's XML product
+
+    Raises:
+        ValueError:     If previous isn't a whole product of the same type, start and stop, with a lower version
+
+    Examples:
+        ParseEvents.checkPreviousVersion("PHOTO_..._V2.xml", "Output/PHOTO_..._V1.xml")
+    """
+    fields = parseEventFilename(product_name)
+    other = parseEventFilename(previous)
+    if (fields is None or other is None or other['sat'] is not None or
+            not splitCompression(previous)[0].endswith('.xml') or
+            (other['type'],other['start'],other['stop']) != (fields['type'],fields['start'],fields['stop'])):
+        raise ValueError("%s is not a version of %s" % (previous, product_name))
+    if (not re.match(r'^V\d+$', fields['version']) or not re.match(r'^V\d+$', other['version']) or
+            int(other['version'][1:]) >= int(fields['version'][1:])):
+        raise ValueError("%s is not an earlier version of %s" % (previous, product_name))
 
 
-def convertTimeFormat(timestamp, input_format=typical_in_format, output_format=xml_date_format, to_string=True, from_string=False):
-    """Converts time format to be Flexplan-compliant
+def unescapeXMLText(xml_str):
+    """Undoes `escapeXMLText()`, giving the text ElementTree would parse out of it
 
     Args:
-        timestamp:  String input time
+        xml_str:    Element text as written
 
-    Kwargs:
-        input_format:   Input format string. See http://strftime.org
-        output_format:  Output format string. See http://strftime.org
-        to_string:      Boolean, return string or datetime object
-        from_string:    Boolean, input is already a datetime object. Returns formatted string
-    
     Returns:
-        timestamp:  Reformatted time string
+        text:   Text string, unicode if it held character references
 
     Examples:
-        datestr = ParseEvents.convertTimeFormat(dataframe.StartTime.iloc[0])
-        datestr_local = ParseEvents.convertTimeFormat(dataframe.StartTime.iloc[0],output_format='%c')
-        dateval = ParseEvents.convertTimeFormat(dataframe.StartTime.iloc[0],to_string=False)
+        ParseEvents.unescapeXMLText('R&amp;D &lt;1&gt;')   # -> 'R&D <1>'
     """
-    if from_string is True:
-        return datetime.strftime(timestamp,output_format)
+    if "&#" in xml_str:
+        xml_str = re.sub(r'&#(\d+);', lambda m: unichr(int(m.group(1))), xml_str)
+    return xml_str.replace("&lt;", "<").replace("&gt;", ">").replace("&amp;", "&")
+
+
+def _scanEventProduct(fh):
+    """Reads the events of a product in the layout `XMLEventWriter` writes, one `product_event_pattern` match per
+    event, without an XML parser. None if anything doesn't fit the layout"""
+    events = []
+    buf = ''
+    at_events = False
+    while True:
+        block = fh.read(product_scan_bytes)
+        buf += block
+        if not at_events:
+            ## Header skipped, none of it goes into the keys
+            start = buf.find('<Event>')
+            if start < 0:
+                if block:
+                    continue
+                return None
+            buf = buf[start:]
+            at_events = True
+        ## Only events ending in this buffer are matched, the rest waits for the next block
+        end = buf.rfind('</Event>')
+        end = end + len('</Event>') if end >= 0 else 0
+        if not block:
+            end = len(buf)
+        pos = 0
+        m = product_event_pattern.match(buf, pos)
+        while m is not None and m.end() <= end:
+            utcStart,duration,uid,descr,sat = [text if text is None or "&" not in text else unescapeXMLText(text)
+                                               for text in m.groups()[:5]]
+            params = m.group(6)
+            identity = key_separator.join((descr or '', sat or '', utcStart or ''))
+            content = [duration or '']
+            if params:
+                content += [text if "&" not in text else unescapeXMLText(text)
+                            for pair in product_param_pattern.findall(params) for text in pair]
+            events.append((int(uid), identity, key_separator.join(content)))
+            pos = m.end()
+            m = product_event_pattern.match(buf, pos)
+        if not block:
+            return events if buf[pos:].strip() == '</FDF_to_FP>' else None
+        ## Complete events left over didn't match
+        if buf[pos:end].strip():
+            return None
+        buf = buf[pos:]
+
+
+def _parseEventProduct(fh):
+    """Reads the events of any well formed product with ElementTree, see `indexEventProduct()`"""
+    events = []
+    fields = {}
+    params = []
+    context = ET.iterparse(fh, events=('start', 'end'))
+    action,root = next(context)
+    for action,elem in context:
+        if action == 'start':
+            continue
+        if elem.tag == 'Event':
+            identity = key_separator.join((fields.get('Event_Description', ''), fields.get('Sat', ''),
+                                           fields.get('UTC_Start_Time', '')))
+            content = key_separator.join([fields.get('Duration', '')] + params)
+            events.append((int(fields['Unique_Id']), identity, content))
+            fields = {}
+            params = []
+            root.clear()
+        elif elem.tag == 'Event_Par_Name' or elem.tag == 'Event_Par_Value':
+            params.append(elem.text or '')
+        else:
+            fields[elem.tag] = elem.text or ''
+    return events
 
-    if to_string is True:
-        return datetime.strftime(datetime.strptime(timestamp,input_format),output_format)
-    else:
-        return datetime.strptime(timestamp,input_format)
 
-#http://norwied.wordpress.com/2013/08/27/307/
-# DONT REALLY UNDERSTAND THIS. IT MUST BE CALLED IN YOUR MODULE TO WORK...
-def indent(elem, level=0):
-    """ Makes ElementTree XML object pretty for printing
+def indexEventProduct(filename):
+    """Reads the events of an XML product (compressed or not) into the keys `diffEventKeys()` matches on. Only
+    the keys are held. Products laid out the way this module writes them are scanned with a regular expression,
+    several times faster than parsing the XML, anything else goes through ElementTree.
 
     Args:
-        elem:  object to prettify
+        filename:   XML product to read
 
-    Kwargs:
-        level: Internally used
+    Returns:
+        events:     List of (uid, identity, content) tuples in file order. identity is Event_Description, Sat and
+                    UTC_Start_Time, content the Duration and each Event_Par_Name and Event_Par_Value, each joined
+                    into one string by `key_separator`
 
     Examples:
-        root = ET.ElementTree("SomeFile.xml")
-        XML_Utils.indent(root)
+        events = ParseEvents.indexEventProduct("Output/PHOTO_20140704000000_20140711000000_20140604124500_V1.xml")
     """
-    i = "\n" + level*"    "
-    if len(elem):
-        if not elem.text or not elem.text.strip():
-            elem.text = i + "    "
-        if not elem.tail or not elem.tail.strip():
-            elem.tail = i
-        for elem in elem:
-            indent(elem, level+1)
-        if not elem.tail or not elem.tail.strip():
-            elem.tail = i
+    fh = openEventFile(filename)
+    try:
+        events = _scanEventProduct(fh)
+    finally:
+        fh.close()
+    if events is None:
+        Metrics.count("delta_parse_fallbacks")
+        fh = openEventFile(filename)
+        try:
+            events = _parseEventProduct(fh)
+        finally:
+            fh.close()
+    return events
+
+
+def recordKeys(records):
+    """Keys of each event record, the same as `indexEventProduct()` reads back from its XML
+
+    Args:
+        records:    `EventRecords.EventRecords`
+
+    Returns:
+        keys:   List of (identity, content) tuples in row order
+    """
+    names = records.paramNames()
+    utcStarts,durations,uids,sats,param_rows = formatEventRecords(records)
+    prefix = records.description + key_separator
+    identities = [key_separator.join((prefix + ('' if sat is None else '%s' % sat), utcStart))
+                  for sat,utcStart in itertools.izip(sats, utcStarts)]
+    if len(names):
+        contents = [key_separator.join([duration] + [text for pair in zip(names, map(str, param_values)) for text in pair])
+                    for duration,param_values in itertools.izip(durations, param_rows)]
     else:
-        if level and (not elem.tail or not elem.tail.strip()):
-            elem.tail = i
+        contents = durations
+    return zip(identities, contents)
 
-def generateXMLHeader(startTime,stopTime,filename):
-    """Generates an XML handle with header information filled in
+
+def diffEventKeys(keys, previous):
+    """Matches events against the events of a previous version, through hash indexes of the previous ones: by
+    everything (unchanged events), then by identity alone (modified events, same description, Sat and start
+    but a new duration or parameters). Exact matches are all taken first, so an unchanged event is never
+    claimed as the modification of another. Repeats match up in file order.
 
     Args:
-        startTime:  UTC starttime marking the start of events
-        stopTime:   UTC stoptime marking the end of events
-        filename:   Filename of the input event file
-    
+        keys:       (identity, content) of each new event, see `recordKeys()`
+        previous:   (uid, identity, content) of each previous event, see `indexEventProduct()`
+
     Returns:
-        root:   Etree XML root object. Manipulate later. 
+        uids:       Previous Unique_Id of each new event, None for added events
+        modified:   Boolean list, which new events changed
+        removed:    Unique_Ids of previous events with no match, in file order
 
     Examples:
-        df = pd.read_csv("filename.csv")
-        root = ParseEvents.generateXMLHeader(df, "foobar.csv")
+        uids,modified,removed = ParseEvents.diffEventKeys(ParseEvents.recordKeys(records), previous)
     """
-    ###### Create the XML root object
-    root = ET.Element("FDF_to_FP")
+    ###### Unchanged events. Repeats of a key wait (reversed, to pop in file order) until the one before is taken
+    index = {}
+    repeats = {}
+    for k,(uid,identity,content) in enumerate(previous):
+        key = (identity, content)
+        if key in index:
+            repeats.setdefault(key, []).append(k)
+        else:
+            index[key] = k
+    for positions in repeats.itervalues():
+        positions.reverse()
+    taken = [False] * len(previous)
+    matches = [None] * len(keys)
+    for i,key in enumerate(keys):
+        k = index.pop(key, None)
+        if k is not None:
+            matches[i] = k
+            taken[k] = True
+            if key in repeats and len(repeats[key]):
+                index[key] = repeats[key].pop()
+
+    ###### Modified events, same identity as a previous event nothing matched. Only the leftovers are indexed
+    leftovers = [k for k in xrange(len(previous)) if not taken[k]]
+    by_identity = {}
+    for k in reversed(leftovers):
+        by_identity.setdefault(previous[k][1], []).append(k)
+    modified = [False] * len(keys)
+    if len(by_identity):
+        for i in [i for i,k in enumerate(matches) if k is None]:
+            positions = by_identity.get(keys[i][0])
+            if positions:
+                matches[i] = positions.pop()
+                taken[matches[i]] = True
+                modified[i] = True
+
+    uids = [None if k is None else previous[k][0] for k in matches]
+    removed = [previous[k][0] for k in leftovers if not taken[k]]
+    return uids,modified,removed
+
+
+def writeDeltaProduct(filename, previous=None, time_order=False, out_dir='Output', compression=''):
+    """Converts a reissued product (V2, V3...) against the previous version of it. Events that didn't change
+    keep the Unique_Ids they were ingested with, modified ones (same description, Sat and start) keep theirs
+    too, and only added events get new IDs, so reissues barely touch the ID counter. Writes:
+        <product>.xml               The whole new version with those IDs, the baseline for the next reissue
+        <product>_DELTA.xml         Only the added and modified events, a complete product of its own (not
+                                    written if nothing was added or modified)
+        <product>_DELTA.json        What changed: counts, added/modified/removed Unique_Ids, the files
+    Without a previous version every event is added, and the product is exactly what a normal conversion writes.
 
-    ###### Create all of the header elements
-    fname_elem = ET.SubElement(root,"FILENAME")
-    fname_elem.text = string.replace(filename, "csv", "xml").split('/')[-1]
-    date_elem = ET.SubElement(root,"CREATION_DATE")
-    date_elem.text = datetime.strftime(datetime.utcnow(),xml_date_format)
-    ## Start time is the first start time in the file
-    start_elem = ET.SubElement(root,"START")
-    start_elem.text = startTime
-    ## End time is the last stop time in the file
-    end_elem = ET.SubElement(root,"END")
-    end_elem.text = stopTime
-    ## Some unused/Empty elements 
-    sve_element = ET.SubElement(root,"STATE_VECTOR_EPOCH")
-    sv_element = ET.SubElement(root,"STATE_VECTOR")
-    return root
+    Args:
+        filename:       Any filename of the product
 
+    Kwargs:
+        previous:       XML product of the previous version. Looked for in out_dir by default, see
+                        `findPreviousVersion()`. Must be an earlier version of this product (see
+                        `checkPreviousVersion()`)
+        time_order:     Merge the satellites' events in start time order
+        out_dir:        Directory to write to
+        compression:    Compression suffix of the XML files, see `XMLEventWriter`
 
-def getStartStopTimes(dataframe, as_string=True, input_format=typical_in_format):
-    """Finds the erliest start time and latest stop time in a dataframe
+    Returns:
+        root:       Etree XML header of the whole new product (not written), header only
+        df:         Pandas Dataframe of the product
+        manifest:   Delta manifest dict, as written to the JSON file
+
+    Examples:
+        root,df,manifest = ParseEvents.writeDeltaProduct("Input/PHOTO_SAT1_..._V2.csv")
+        manifest['removed']     # -> Unique_Ids downstream should delete
+    """
+    event_type = filename.split('/')[-1].split('_')[0]
+    spec = event_types[event_type]
+    members,combo_filename = _findProductMembers(filename, spec)
+    product_name = string.replace(splitCompression(combo_filename)[0], "csv", "xml").split('/')[-1]
+    base = os.path.splitext(product_name)[0]
+    if previous is None:
+        previous = findPreviousVersion(product_name, out_dir)
+    else:
+        checkPreviousVersion(product_name, previous)
+    df = _loadEventProduct(filename, spec, members, time_order)
+
+    ###### Match against the previous version, IDs leased only for what's new
+    with Metrics.stage("records", rows=len(df)):
+        records = EventRecords.EventRecords.fromFrame(df, spec, 0)
+    with Metrics.stage("delta", rows=len(df)):
+        if previous is None:
+            log.warning("NO PREVIOUS VERSION FOUND FOR: %s, every event is added", product_name)
+            uids,modified,removed = [None] * len(records),[False] * len(records),[]
+        else:
+            log.info("Delta against: %s", previous)
+            uids,modified,removed = diffEventKeys(recordKeys(records), indexEventProduct(previous))
+        added = np.array([uid is None for uid in uids], dtype=bool)
+        modified = np.array(modified, dtype=bool)
+    if added.any():
+        with UniqueIDs.leaseUniqueIDs(int(added.sum()), pName) as lease:
+            first_uid = lease.takeIDs(int(added.sum()))
+        records.rows['uid'][added] = np.arange(first_uid, first_uid + added.sum(), dtype=np.int64)
+    if not added.all():
+        records.rows['uid'][~added] = [uid for uid in uids if uid is not None]
+    Metrics.count("delta_unchanged", int(len(records) - added.sum() - modified.sum()))
+
+    ###### Whole product, then the changes. All three files or none of them
+    changed = added | modified
+    try:
+        if len(records):
+            product = writeEventRecords(event_type, records, product_name, out_dir=out_dir, compression=compression)
+            startTime,stopTime = product['start'],product['end']
+        else:
+            log.warning("NO EVENTS FOUND FOR FILENAME: %s", combo_filename)
+            startTime = stopTime = None
+            writer = XMLEventWriter(out_dir=out_dir, compression=compression)
+            writer.writeHeader(generateXMLHeader(startTime, stopTime, product_name))
+            writer.close()
+            product = {'filename': writer.out_filename.split('/')[-1], 'events': 0}
+        delta = None
+        if changed.any():
+            delta = writeEventRecords(event_type, records.take(changed), base + "_DELTA.xml", out_dir=out_dir,
+                                      compression=compression)
+        added_uids = records.rows['uid'][added].tolist()
+        manifest = {'product': product['filename'], 'event_type': event_type,
+                    'created': datetime.utcnow().isoformat(),
+                    'previous': None if previous is None else os.path.basename(previous), 'events': len(records),
+                    'unchanged': int(len(records) - changed.sum()), 'delta': delta,
+                    'added': {'count': len(added_uids), 'first_id': min(added_uids) if len(added_uids) else None,
+                              'last_id': max(added_uids) if len(added_uids) else None},
+                    'modified': records.rows['uid'][modified].tolist(), 'removed': removed}
+        writeManifest(manifest, os.path.join(out_dir, base + "_DELTA.json"))
+    except:
+        removeProducts([os.path.join(out_dir, name + compression) for name in [product_name, base + "_DELTA.xml"]])
+        raise
+    if spec.get('warning') is not None:
+        log.warning(spec['warning'])
+    return generateXMLHeader(startTime, stopTime, product_name),df,manifest
+
+
+def parseCSV(filename, stream=False, chunksize=None, workers=None, time_order=False, pipeline=False, shard_by=None,
+             shard_size=None, delta=False, delta_from=None, lite=False):
+    """Parses a CSV Event File
 
     Args:
-        dataframe:  dataframe containing event info. Assumes 'Start' and 'Stop' column
+        filename:   Filename of the input event file
 
     Kwargs:
-        as_string:      Return the times in a formatted string (xml format for now)
-        input_format:   Specify input datestring format instead of using default
+        stream:     Write events straight to disk from their compact records (see `EventRecords`) instead of
+                    building the whole ElementTree first. Output is identical, memory stays flat, root is header only
+        chunksize:  Read the input in batches of this many rows and run each batch all the way through to
+                    the output before reading the next. df is returned as None
+        workers:    Split the rows into this many contiguous ranges, read and rendered concurrently in worker 
+                    processes (see `convertEventRanges()`). Output is identical to a serial run. df is returned as None
+        time_order: Merge the satellites' events in start time order instead of one satellite after another
+        pipeline:   Read, convert and write chunks in overlapping threads (see `convertEventChunks()`). Implies
+                    chunksize, `pipeline_chunksize` rows if none is given
+        shard_by:   Write the product as shards plus a manifest instead of one file, 'events', 'bytes' or 'window'
+                    (see `writeShardedProduct()`). Shards are written by `workers` processes, chunksize and
+                    pipeline don't apply
+        shard_size: Events, bytes or seconds per shard
+        delta:      Convert against the previous version of the product already in Output, keeping the Unique_Ids
+                    of events that carry over and writing a _DELTA product and manifest of what changed (see
+                    `writeDeltaProduct()`). chunksize, workers and pipeline don't apply
+        delta_from: Previous version's XML product to convert against, instead of looking for it. Implies delta.
+                    Must be an earlier version of this product
+        lite:       Conversion only, for callers that just want the product. Files up to `lite_max_bytes` go
+                    through the pandas-free lite engine and df is returned as None whichever engine ran
+    
+    chunksize, workers, pipeline, shard_by, delta and lite always stream.
     
     Returns:
-        startTime:   Earliest event start time
-        stopTime:    Latest event stop time
-
+        root:   Etree XML root object. The full tree by default, header only when streamed
+        df:     Pandas Dataframe of the Data. None with a chunksize, workers or lite
     Examples:
-        df = pd.read_csv("filename.csv", names = ['Start','Stop',...])
-        t1,t2 = ParseEvents.getStartStopTimes(df)
+        root,df = ParseEvents.parseCSV("filename.csv")
+        root,df = ParseEvents.parseCSV("filename.csv", stream=True)
+        root,df = ParseEvents.parseCSV("filename.csv", chunksize=100000)
+        root,df = ParseEvents.parseCSV("filename.csv", workers=8)
+        root,df = ParseEvents.parseCSV("filename.csv", pipeline=True)
+        root,df = ParseEvents.parseCSV("filename.csv", shard_by='window', shard_size=86400)
+        root,df = ParseEvents.parseCSV("PHOTO_SAT1_..._V2.csv", delta=True)
+        root,df = ParseEvents.parseCSV("filename.csv", lite=True)
     """
-    startTime = min([convertTimeFormat(xx,to_string=False,input_format=input_format)
-                        for xx in dataframe.Start.loc[~dataframe.Start.isnull()].tolist()])    
-    stopTime = max([convertTimeFormat(xx,to_string=False,input_format=input_format) 
-                        for xx in dataframe.Stop.loc[~dataframe.Stop.isnull()].tolist()])    
-    if as_string is True:
-        ## Format datetime objects as strings
-        startTime = convertTimeFormat(startTime,from_string=True)
-        stopTime = convertTimeFormat(stopTime,from_string=True)
-    return startTime,stopTime
+    platform = filename.split('/')[-1].split('_')[0]
+    if pipeline is True and chunksize is None:
+        chunksize = pipeline_chunksize
+
+    compression = getOutputCompression(filename)
+
+    if delta is True or delta_from is not None:
+        if shard_by is not None:
+            raise ValueError("Delta products can't be sharded")
+        root,df,manifest = writeDeltaProduct(filename, previous=delta_from, time_order=time_order,
+                                             compression=compression)
+        return root,df
+
+    if shard_by is not None:
+        root,df,manifest = writeShardedProduct(filename, shard_by, shard_size, time_order=time_order,
+                                               compression=compression, workers=workers)
+        return root,df
+
+    ###### Whole tree in memory, handed back along with the data
+    if stream is not True and lite is not True and chunksize is None and workers is None:
+        root,csv_filename,df = parseEventFile(filename, platform, time_order=time_order)
+        writer = XMLEventWriter(compression=compression)
+        try:
+            writer.writeTree(root)
+        except:
+            writer.abort()
+            raise
+        writer.close()
+        return root,df
+
+    ## Small files go through the pandas-free lite engine, unless it finds something it can't match exactly
+    use_lite = (lite is True and chunksize is None and workers is None and platform in event_types and
+                liteEngineSupports(event_types[platform]) and os.path.getsize(filename) <= lite_max_bytes)
+
+    ###### Events are streamed out from their compact records, never built into one big tree
+    writer = XMLEventWriter(compression=compression)
+    try:
+        root,csv_filename,df = parseEventFile(filename, platform, writer=writer, chunksize=chunksize, workers=workers,
+                                              time_order=time_order, pipeline=pipeline, lite=use_lite)
+    except:
+        writer.abort()
+        raise
+    writer.close()
+    ## Same return whichever engine ran, not down to the file's size
+    if lite is True:
+        df = None
+    return root,df
 
 
-def getPairedEventFiles(filename, cols=None):
-    """Loads event files that come in pairs (for each satellite, etc) into a single dataframe. 
-    Assumes the Start Times and Stop times will match up. I.E.
-        PHOTO_SAT1_STARTTIME_STOPTIME_**
-        is paired with:
-        PHOTO_SAT2_STARTTIME_STOPTIME_**
+def discoverEventFiles(in_dir):
+    """Finds every convertible event file in a directory and groups the ones that belong in the same 
+    product (one per satellite, see `buildEventFileIndex()`). Returns one file per product, the one 
+    `parseCSV()` should be called with.
 
     Args:
-        filename:  First filename. Assumes 'SAT1' and 'SAT2' are interchangeable in file naming convention
-        Will work on either filename
-
-    Kwargs:
-        cols:  override column names as list
+        in_dir:     Directory to look through
     
     Returns:
-        df:         Combined dataframe
-        combo_fn:   New filename with 'SAT*' removed. 
+        fnames:     Sorted list of filenames, one per output product
 
     Examples:
-        df = ParseEvents.getPairedEventFiles('SAT1_Event.csv')
-
-    Todo:
-        Rewrite. Logic is kinda lame, not flexible. Just had to do it quickly
+        fnames = ParseEvents.discoverEventFiles("Input")
     """
-    ###### Load this file no matter what
-    df1 = zsheet.import_csv(filename, header=0, names=cols)
-    in_dir = filename.split('/')[0]
-    in_file = filename.split('/')[1]
-    first_sat = filename.split("/")[-1].split("_")[1]
-    df1['Sat'] = first_sat
-
-    ###### Try to find a matching file for the other platform
-    swapper={'SAT1':'SAT2','SAT2':'SAT1'}
-    swapsat=swapper[first_sat]
-    ## Look through files
-    files = os.listdir(in_dir)
+    fnames = []
+    for key,members in getEventFileIndex(in_dir).items():
+        if key[0] not in event_types:
+            continue
+        if event_types[key[0]]['paired'] is True:
+            fnames.append(members[0][1])
+        else:
+            ## Every file is its own product
+            fnames.extend(fname for sat,fname in members)
+    return sorted(fnames)
 
-    ###### Extract just the [Event,Platform, Start, Stop] from filename. (More flexible for the future, can just get specific elements)
-    file_keys = [list(operator.itemgetter(0,1,2,3)(f.split('_'))) for f in os.listdir(in_dir)]
 
-    ###### See if the expected file exists
-    expected_keys = list(operator.itemgetter(0,1,2,3)(in_file.split('_')))
-    expected_keys[1] = swapsat
+def _convertFile(args):
+    """Pool worker for `convertDirectory()`. Converts one file and reports how it went, never raises.
 
-    ## Switch to numpy arrays for logical indexing, return list of matching files
-    swapfiles = list(np.array(files)[np.array([keys==expected_keys for keys in file_keys])])
-    swapfilenames = [in_dir + '/' + f for f in swapfiles]
+    Args:
+        args:   (filename, kwargs for parseCSV) tuple, a single argument so it works with Pool.imap
+    
+    Returns:
+        filename:   Filename that was converted
+        ok:         Boolean success
+        message:    Output filename on success, error and traceback on failure
+        metrics:    `Metrics.snapshot()` of just this file, so worker process metrics make it back
+    """
+    filename,kwargs = args
+    Metrics.reset()
+    try:
+        root,df = parseCSV(filename, **kwargs)
+        return filename,True,root.find("FILENAME").text,Metrics.snapshot()
+    except Exception as e:
+        return filename,False,"%s: %s\n%s" % (type(e).__name__, e, traceback.format_exc()),Metrics.snapshot()
 
-    print "Orig filename: ", filename
-    print "match filename: ", swapfilenames
 
-    if len(swapfilenames) == 0:
-        print 'NO MATCHES FOUND FOR FILENAME:',filename
-        return df1,filename
+def convertDirectory(in_dir, workers=None, **kwargs):
+    """Converts every event product in a directory, spread across a pool of worker processes. Workers lease
+    their Unique IDs from the shared, locked counter file (see `UniqueIDs`), so IDs are never duplicated
+    across workers.
 
-    ## Probably want to eventually loop over all matches, not for now since that shouldn't happen
-    df2 = zsheet.import_csv(swapfilenames[0], header=0, names=cols)
+    Args:
+        in_dir:     Directory holding the event files
 
-    ###### Append the two dataframes, with a satellite column added
+    Kwargs:
+        workers:    Number of worker processes. Defaults to the number of CPUs. 1 runs in this process
+        kwargs:     Passed on to `parseCSV()` (stream, chunksize...)
     
-    ## Switch sats
-    df2['Sat'] = swapsat
-
-    df = df1.append(df2).dropna()
-
-    combo_fn=string.replace(string.replace(filename,'SAT1_',''),'SAT2_','').split('/')[-1]
+    Returns:
+        results:    List of (filename, ok, message) tuples, see `_convertFile()`
 
-    return df,combo_fn
+    Examples:
+        results = ParseEvents.convertDirectory("Input", workers=8, stream=True)
+        failed = [fname for fname,ok,msg in results if not ok]
+    """
+    return convertFiles(discoverEventFiles(in_dir), workers=workers, **kwargs)
 
 
-def parseCSV(filename):
-    """Parses a CSV Event File
+def convertFiles(fnames, workers=None, pool=None, **kwargs):
+    """Converts a list of event files, one product each, spread across a pool of worker processes.
+    See `convertDirectory()`
 
     Args:
-        filename:   Filename of the input event file
+        fnames:     Filenames to call `parseCSV()` with, as from `discoverEventFiles()`
+
+    Kwargs:
+        workers:    Number of worker processes. Defaults to the number of CPUs. 1 runs in this process
+        pool:       Already running multiprocessing.Pool to convert in, instead of starting one for these files
+                    (workers is ignored). Left running for the next batch
+        kwargs:     Passed on to `parseCSV()` (chunksize...), stream and lite default to True. With pipeline=True
+                    and a single worker, the files all go through one pipeline (see `pipelineFiles()`)
     
     Returns:
-        root:   Etree XML root object. Manipulate later. 
-        df:     Pandas Dataframe of the Data
+        results:    List of (filename, ok, message) tuples, see `_convertFile()`
+
     Examples:
-        root,df = ParseEvents.parseCSV("filename.csv")
+        results = ParseEvents.convertFiles(["Input/PHOTO_SAT1_..._V1.csv"], workers=1)
+        results = ParseEvents.convertFiles(fnames, pool=pool)
     """
-    ###### Define Dynamic Parsers Function Caller
-    # Cool way to do it all functionally! 
-    # You can also call with     eval(parsers[PLATFORM])(arg)
-    # Just not as pretty I don't think... but more dynamic! Then your parsers struct can contain string function calls,
-    #   which is nice if you don't have the function handles defined yet.
-    # parsers = dict((platform,func) for (platform,func) in [(platform,"parse"+platform) for platform in platforms])
-    platforms = ["COMM","ECLIPSE","MANEUVER","MEMORY","PHOTO"]
-    parseFuncs = [parseCOMM, parseECLIPSE, parseMANEUVER, parseMEMORY, parsePHOTO]
-    parsers = dict(zip(platforms,parseFuncs))
+    if kwargs.get('delta_from') is not None:
+        raise ValueError("delta_from is the previous version of one product, convert that product with parseCSV()")
+    ## Only the filenames come back, so there's no point building the trees or keeping the data
+    kwargs.setdefault('stream', True)
+    kwargs.setdefault('lite', True)
+    jobs = [(fname,kwargs) for fname in fnames]
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    ###### Convert, reporting each file as it finishes
+    own_pool = None
+    if (pool is None and kwargs.get('pipeline') is True and kwargs.get('shard_by') is None and
+            not kwargs.get('delta') and workers == 1 and len(jobs) > 1):
+        ## Runs right here, so its metrics are already in the totals
+        result_iter = [(filename,ok,message,None) for filename,ok,message in
+                        pipelineFiles(fnames, chunksize=kwargs.get('chunksize'), time_order=kwargs.get('time_order', False))]
+    elif pool is not None:
+        result_iter = pool.imap_unordered(_convertFile, jobs)
+    elif workers == 1 or len(jobs) <= 1:
+        result_iter = (_convertFile(job) for job in jobs)
+    else:
+        own_pool = multiprocessing.Pool(min(workers,len(jobs)))
+        result_iter = own_pool.imap_unordered(_convertFile, jobs)
+    results = []
+    totals = Metrics.snapshot()
+    snaps = []
+    try:
+        for filename,ok,message,snap in result_iter:
+            if ok:
+                log.info("Converted %s -> %s", filename, message)
+            else:
+                log.error("FAILED %s: %s", filename, message)
+            results.append((filename,ok,message))
+            snaps.append(snap)
+    finally:
+        if own_pool is not None:
+            own_pool.close()
+            own_pool.join()
+
+    ###### Add up what every file recorded, wherever it ran
+    Metrics.reset()
+    for snap in [totals] + snaps:
+        if snap is not None:
+            Metrics.merge(snap)
+
+    log.info("%d of %d products converted", sum(ok for f,ok,m in results), len(results))
+    return results
+
+
+class _PipelinedProduct(object):
+    """One product going through `pipelineFiles()`: its writer, the times seen so far and how it went. After
+    anything fails, whatever is left of the product is skipped."""
+    def __init__(self, filename):
+        self.filename = filename
+        self.event_type = filename.split('/')[-1].split('_')[0]
+        self.writer = XMLEventWriter(compression=getOutputCompression(filename))
+        self.root = None
+        self.times = None
+        self.bounds = []
+        self.error = None
+
+    def fail(self):
+        """Records the exception being handled, the first one wins"""
+        if self.error is None:
+            e = sys.exc_info()[1]
+            self.error = "%s: %s\n%s" % (type(e).__name__, e, traceback.format_exc())
+
+    def run(self, func, *args):
+        """Write action, runs func(*args) unless the product already failed"""
+        if self.error is None:
+            try:
+                func(*args)
+            except Exception:
+                self.fail()
+
+    def finish(self, startTime, stopTime):
+        """Last write action, patches in the header times (None if there were no events) and closes the file.
+        A product that failed anywhere along the way is deleted instead"""
+        if startTime is not None:
+            self.run(self.writer.patchHeader, startTime, stopTime)
+        if self.error is None:
+            self.run(self.writer.close)
+        if self.error is not None:
+            self.writer.abort()
+
+
+def _iterPipelinedProducts(products, chunksize, time_order):
+    """Read stage of `pipelineFiles()`. Yields (product, 'start', combined filename), then (product, 'chunk', df)
+    for each chunk, then (product, 'end', None), for one product after another. Header times of compressed
+    output are scanned for here (see `scanEventTimes()`), before the start"""
+    for product in products:
+        try:
+            spec = event_types[product.event_type]
+            members,combo_filename = _findProductMembers(product.filename, spec)
+            if product.writer.compression:
+                product.times = scanEventTimes(members, chunksize, cols=spec['columns'], input_format=spec['time_format'])
+            yield product,'start',combo_filename
+            for chunk in _iterProductChunks(spec, members, chunksize, time_order):
+                yield product,'chunk',chunk
+        except Exception:
+            product.fail()
+        yield product,'end',None
+
+
+def pipelineFiles(fnames, chunksize=None, time_order=False, depth=Pipeline.default_depth):
+    """Converts event files one after another through a single pipeline (see `Pipeline`), so the next file is 
+    already being read while this one is converted and the last one is still being written. Files are streamed
+    in chunks, output (compressed or not) is identical to `parseCSV()` with a chunksize. A failed file doesn't stop
+    the others.
 
-    platform = filename.split('/')[-1].split('_')[0]
+    Args:
+        fnames:     Filenames to convert, one per product (see `discoverEventFiles()`)
 
-    ## Dynamically call function from dictionary
-    root,csv_filename,df = parsers[platform](filename)
+    Kwargs:
+        chunksize:  Rows per chunk, `pipeline_chunksize` if not given
+        time_order: Merge the satellites' events in start time order instead of one satellite after another
+        depth:      Bound of the pipeline queues, in chunks
 
-    ###### Write the output XML
-    indent(root)
-    xml_tree = ET.ElementTree(root)
-    out_filename = 'Output/' + string.replace(csv_filename,'csv','xml')
-    xml_tree.write(out_filename, xml_declaration=True, method="xml")
-    return root,df
+    Returns:
+        results:    List of (filename, ok, message) tuples, see `_convertFile()`
+
+    Examples:
+        results = ParseEvents.pipelineFiles(ParseEvents.discoverEventFiles("Input"), chunksize=50000)
+    """
+    if chunksize is None:
+        chunksize = pipeline_chunksize
+    products = [_PipelinedProduct(fname) for fname in fnames]
+
+    def transform(item):
+        product,kind,value = item
+        if kind == 'end':
+            ## Always sent, so the file is closed whatever happened
+            startTime = stopTime = None
+            if product.error is None and len(product.bounds) and product.times is None:
+                startTime = convertTimeFormat(min(t1 for t1,t2 in product.bounds),from_string=True)
+                stopTime = convertTimeFormat(max(t2 for t1,t2 in product.bounds),from_string=True)
+                product.root.find("START").text = startTime
+                product.root.find("END").text = stopTime
+            elif product.error is None and len(product.bounds) == 0:
+                log.warning("NO EVENTS FOUND FOR FILENAME: %s", product.filename)
+            yield functools.partial(product.finish, startTime, stopTime)
+            return
+        if product.error is not None:
+            return
+        try:
+            if kind == 'start':
+                log.info("Now Parsing %s file", product.event_type)
+                startTime,stopTime = _headerTimes(product.times)
+                product.root = generateXMLHeader(startTime,stopTime,value)
+                action = functools.partial(product.run, product.writer.writeHeader, product.root)
+            else:
+                xml_str = _renderEventChunk(value, product.root, getEventEmitter(product.event_type), product.bounds,
+                                            event_types[product.event_type]['time_format'])
+                action = functools.partial(product.run, product.writer.writeFragment, xml_str)
+        except Exception:
+            product.fail()
+            return
+        yield action
+
+    try:
+        Pipeline.runPipeline(_iterPipelinedProducts(products, chunksize, time_order), transform, depth=depth)
+    except:
+        ## Products the pipeline never got to finish
+        for product in products:
+            product.writer.abort()
+        raise
+    return [(product.filename, product.error is None,
+             product.root.find("FILENAME").text if product.error is None else product.error) for product in products]
 
 
 def createEventElement(xmlroot,entities,subname='Event', override_keys=None):
@@ -305,7 +2390,8 @@ def createEventElement(xmlroot,entities,subname='Event', override_keys=None):
     xml forms yet.
 
     Args:
-        xmlroot:    Etree root element uder which to append xml sub-elements. 
+        xmlroot:    Etree root element uder which to append xml sub-elements. If None, a standalone
+                    `subname` element is made and returned instead (for streaming)
         entities:   Dictionary of key-value entities. 
 
     Kwargs:
@@ -315,7 +2401,7 @@ def createEventElement(xmlroot,entities,subname='Event', override_keys=None):
         a seemingly random order. 
     
     Returns:
-        No returns, modifies the Etree object in place
+        xmlroot:    Modifies the Etree object in place and returns it. Returns the new element if xmlroot is None
 
     Examples:
         root = ET.Element('EXAMPLE')
@@ -326,7 +2412,10 @@ def createEventElement(xmlroot,entities,subname='Event', override_keys=None):
         root = createEventElement(root,entities,override_keys=entity_names)
         # now print or write the root element to a file...
     """
-    subEl = ET.SubElement(xmlroot,subname)
+    if xmlroot is None:
+        subEl = xmlroot = ET.Element(subname)
+    else:
+        subEl = ET.SubElement(xmlroot,subname)
 
     ######Can loop by keys since I made the input dictionary keys match XML fields!
     if override_keys is None:
@@ -404,266 +2493,463 @@ def createEventElement(xmlroot,entities,subname='Event', override_keys=None):
     return xmlroot
 
 
-def parseCOMM(filename):
-    """Converts COMM csv into an xml file for Flexplan ingestion
-    Intent is for this menthod to be dynamically called from `parseCSV()`
+def compileEventEmitter(event_type):
+    """Compiles an `event_types` registry entry into a specialized row emitter. Everything that is the same 
+    for every row (description, parameter names, where each value comes from) is worked out once here. Rows are
+    first turned into compact `EventRecords`, and the per-row loop only pulls formatted values out of those and
+    builds the <Event> element directly. Events streamed to a writer are rendered from a precompiled string
+    template instead (see `compileEventTemplate()`).
 
     Args:
-        filename:   Filename of the input event file
+        event_type:     Key into `event_types`
     
     Returns:
-        root:           Etree XML root object. Manipulate later.
-        csv_filename:   Output Filename to rename xml file as
-        df:             Pandas Dataframe of the COMM Data
+        emitter:    Function emitter(root, df, writer=None, first_uid=None) adding one event per dataframe row, 
+                    returns root. Dataframe must have times parsed by `parseEventTimes()`. IDs are leased unless
+                    first_uid gives the start of an already reserved range. The type's template renderer (see
+                    `compileEventTemplate()`) is kept as emitter.render, for rows that never were a dataframe, and
+                    serialize(root, records, writer=None) as emitter.serialize, for records built elsewhere
+
     Examples:
-        root,df = ParseEvents.parseCOMM("COMM_filename.csv")
+        emitter = ParseEvents.compileEventEmitter("MANEUVER")
+        root = emitter(root, df)
     """
-    print "\nNow Parsing COMM file"
-    comm_date = '%Y/%m/%d_%H:%M:%S.%f'
-    ###### Load The dataframe
-    df = zsheet.import_csv(filename, header=0).dropna()
-
-
-    ###### Find Start and Stop Times
-    startTime,stopTime = getStartStopTimes(df,input_format=comm_date)
-
-    ###### Generate Header 
-    root = generateXMLHeader(startTime,stopTime,filename)
-
-    ###### Parse dataframe to add individual events
-    csv_filename = filename.split('/')[-1]
+    spec = event_types[event_type]
+    descr = spec['description']
+    warning = spec.get('warning')
+
+    ###### Each parameter is either a constant or pulled from a column
+    param_names = [param['name'] for param in spec['parameters']]
+
+    def makeEvent(utcStart, duration, uid, sat, param_values):
+        ## Same layout createEventElement() makes from the entities dict
+        event = ET.Element('Event')
+        ET.SubElement(event,'UTC_Start_Time').text = utcStart
+        ET.SubElement(event,'Duration').text = duration
+        ET.SubElement(event,'Unique_Id').text = uid
+        ET.SubElement(event,'Event_Description').text = descr
+        ET.SubElement(event,'Sat').text = sat
+        ET.SubElement(event,'Entity')
+        params_elem = ET.SubElement(event,'List_of_Event_Parameters')
+        for name,value in zip(param_names, param_values):
+            param_elem = ET.SubElement(params_elem,'Event_Parameter')
+            ET.SubElement(param_elem,'Event_Par_Name').text = name
+            ET.SubElement(param_elem,'Event_Par_Value').text = paramText(value)
+        return event
+
+    ###### Streamed events skip ElementTree altogether
+    render = compileEventTemplate(makeEvent, len(param_names))
+
+    def serialize(root, records, writer=None):
+        ###### Strings are made a block of records at a time, the row loop only puts them together
+        for lo in xrange(0, len(records), 100000):
+            rows = itertools.izip(*formatEventRecords(records, lo, lo + 100000))
+            if writer is None:
+                for utcStart,duration,uid,sat,param_values in rows:
+                    root.append(makeEvent(utcStart, duration, uid, sat, param_values))
+            elif xml_serializer == 'template':
+                ## Joined in batches, so big products don't build one giant string
+                while True:
+                    xml_str = ''.join(itertools.starmap(render, itertools.islice(rows, 10000)))
+                    if not xml_str:
+                        break
+                    writer.writeFragment(xml_str)
+            else:
+                for utcStart,duration,uid,sat,param_values in rows:
+                    writer.writeEvent(makeEvent(utcStart, duration, uid, sat, param_values))
+        return root
+
+    def emitter(root, df, writer=None, first_uid=None):
+        ###### Lease one block of IDs for the whole dataframe, unless the caller already reserved them
+        lease = None
+        if first_uid is None:
+            lease = UniqueIDs.leaseUniqueIDs(len(df), pName)
+            first_uid = lease.takeIDs(len(df))
+        try:
+            with Metrics.stage("records", rows=len(df)):
+                records = EventRecords.EventRecords.fromFrame(df, spec, first_uid)
+            with Metrics.stage("emit", rows=len(df)):
+                serialize(root, records, writer=writer)
+        finally:
+            if lease is not None:
+                lease.release()
+        if warning is not None:
+            log.warning(warning)
+        return root
+
+    emitter.render = render
+    emitter.serialize = serialize
+    return emitter
+
+
+def getEventEmitter(event_type):
+    """Returns the compiled row emitter for an event type, compiling it the first time it is asked for.
 
-    ###### Iterate over COMM dataframe (each row of events)
-    for idx,row in df.iterrows():
-        utcStart =convertTimeFormat(row.Start,input_format=comm_date)
-        duration = str((convertTimeFormat(row.Stop,to_string=False,input_format=comm_date) - 
-                    convertTimeFormat(row.Start,to_string=False,input_format=comm_date)).total_seconds()*1e3)
-        uid = str(getNextUniqueID())
-        descr = "COMM"
-        sat = row.Groups
-        param_names = ['COMM_SET_DL_RATE','COMM_SET_UL_RATE']
-        param_values = ['DL','UL']
+    Args:
+        event_type:     Key into `event_types`
+    
+    Returns:
+        emitter:    See `compileEventEmitter()`
 
-        entity_names = ['UTC_Start_Time','Duration','Unique_Id','Event_Description','Sat',
-                            'Entity','List_of_Event_Parameters']
+    Examples:
+        root = ParseEvents.getEventEmitter("ECLIPSE")(root, df)
+    """
+    if event_type not in event_emitters:
+        event_emitters[event_type] = compileEventEmitter(event_type)
+    return event_emitters[event_type]
 
-        # param_dict = dict(zip(['Event_Par_Name','Event_Par_Value'],[param_names,param_values]))
-        # event_params = {'Event_Parameter':param_dict}
-        event_params = {'Event_Parameter':[{'Event_Par_Name':param_names[i],'Event_Par_Value':param_values[i]} for i in np.arange(len(param_names))]}
 
-        xml_entity = None
-        entity_values = [utcStart,duration,uid,descr,sat,xml_entity,event_params]
+def _renderEventRange(args):
+    """Pool worker for `compileParallelEmitter()` and `convertEventRanges()`. Renders a contiguous range of rows
+    into serialized events. The type's warning is left to the caller, to be logged once
 
-        entities = dict(zip(entity_names,entity_values))
-        root = createEventElement(root,entities,override_keys=entity_names) # Override to preserve order in xml
-        print "This is wrong? There is no specifier for NULL/UL/DL parameters"
+    Args:
+        args:   (event_type, rows, first_uid) tuple. rows is a dataframe of the range, or its `EventRecords`
+                numbered from 0, first_uid the ID of its first row
+    
+    Returns:
+        xml_str:    The range's serialized <Event> elements, in row order
+    """
+    event_type,rows,first_uid = args
+    if isinstance(rows, EventRecords.EventRecords):
+        rows.rows['uid'] += first_uid
+        records = rows
+    else:
+        records = EventRecords.EventRecords.fromFrame(rows, event_types[event_type], first_uid)
+    writer = XMLEventWriter(fh=cStringIO.StringIO())
+    getEventEmitter(event_type).serialize(None, records, writer=writer)
+    return writer.fh.getvalue()
 
-    csv_filename = filename.split('/')[-1]
 
-    return root, csv_filename, df
-        
-        
-def parseECLIPSE(filename):
-    """Converts ECLIPSE csv into an xml file for Flexplan ingestion
-    Intent is for this menthod to be dynamically called from `parseCSV()`
+def compileParallelEmitter(event_type, pool, workers):
+    """Makes an emitter that splits a dataframe into contiguous row ranges and renders them concurrently in a
+    process pool. IDs for all rows are leased up front and each range starts at its row offset into that block,
+    and fragments are written back in range order, so output (Unique_Id order included) is identical to the 
+    serial emitter's. Only works with a writer, events are never kept in root. The dataframe is still read in
+    this process, see `convertEventRanges()` for reading in the workers too.
 
     Args:
-        filename:   Filename of the input event file
+        event_type:     Key into `event_types`
+        pool:           multiprocessing.Pool to render in
+        workers:        Number of row ranges to split each dataframe into
     
     Returns:
-        root:           Etree XML root object. Manipulate later.
-        csv_filename:   Output Filename to rename xml file as (combines the paired event files)
-        df:             Pandas Dataframe of the ECLIPSE Data
+        emitter:    Function emitter(root, df, writer) like the ones from `compileEventEmitter()`
+
     Examples:
-        root,df = ParseEvents.parseCOMM("ECLIPSE_filename.csv")
+        pool = multiprocessing.Pool(8)
+        root = ParseEvents.compileParallelEmitter("ECLIPSE", pool, 8)(root, df, writer)
     """
-    print "\nNow Parsing ECLIPSE file"
-    ###### Load The dataframe
-    df,combo_filename = getPairedEventFiles(filename,cols=["Start","Stop","Duration"])
+    warning = event_types[event_type].get('warning')
 
-    ###### Find Start and Stop Times
-    startTime,stopTime = getStartStopTimes(df)
+    def emitter(root, df, writer=None):
+        with UniqueIDs.leaseUniqueIDs(len(df), pName) as lease, Metrics.stage("emit", rows=len(df)):
+            first_uid = lease.takeIDs(len(df))
+            bounds = np.linspace(0, len(df), workers+1).astype(int)
+            jobs = [(event_type, df.iloc[a:b], first_uid + a) for a,b in zip(bounds[:-1],bounds[1:]) if b > a]
+            for xml_str in pool.imap(_renderEventRange, jobs):
+                writer.writeFragment(xml_str)
+        if warning is not None:
+            log.warning(warning)
+        return root
 
-    root = generateXMLHeader(startTime,stopTime,combo_filename)
+    return emitter
 
-    ###### Iterate over COMM dataframe (each row of events)
-    for idx,row in df.iterrows():
-        utcStart =convertTimeFormat(row.Start)
-        duration = str((convertTimeFormat(row.Stop,to_string=False) - 
-                    convertTimeFormat(row.Start,to_string=False)).total_seconds()*1e3)
-        duration = str(row.Duration*1e3)
-        uid = str(getNextUniqueID())
-        descr = "ECLIPSE"
-        sat = row.Sat
-        param_names = None
-        param_values = None
-
-        entity_names = ['UTC_Start_Time','Duration','Unique_Id','Event_Description','Sat',
-                            'Entity','List_of_Event_Parameters']
-        event_params = None #{'Event_Parameter':[{'Event_Par_Name':param_names[i],'Event_Par_Value':param_values[i]} for i in np.arange(len(param_names))]}
 
-        xml_entity = None
+def splitEventFile(filename, parts):
+    """Splits the rows of a plain (uncompressed) event file into contiguous byte ranges on line boundaries,
+    without parsing anything, so each range can be read on its own
 
-        entity_values = [utcStart,duration,uid,descr,sat,xml_entity,event_params]
+    Args:
+        filename:   Event file, with a header line
+        parts:      Number of ranges to split it into
 
-        entities = dict(zip(entity_names,entity_values))
-        root = createEventElement(root,entities,override_keys=entity_names) # Override to preserve order in xml
-        
-    # csv_filename = string.replace(string.replace(filename.split('/')[-1],'SAT1_',''),'SAT2_','')
-    return root,combo_filename,df
+    Returns:
+        ranges:     List of (start, stop) byte offsets, header excluded. Fewer than parts for very short files
+
+    Examples:
+        ranges = ParseEvents.splitEventFile('Input/ECLIPSE_SAT1_..._V1.csv', 8)
+    """
+    size = os.path.getsize(filename)
+    f = open(filename, 'rb')
+    try:
+        f.readline()
+        offsets = [f.tell()]
+        for target in np.linspace(offsets[0], size, parts+1)[1:-1].astype(int):
+            ## Move each split up to the start of the next line
+            f.seek(max(target - 1, offsets[-1]))
+            f.readline()
+            offsets.append(f.tell())
+    finally:
+        f.close()
+    offsets.append(size)
+    return [(lo,hi) for lo,hi in zip(offsets[:-1], offsets[1:]) if hi > lo]
+
+
+def _loadEventRange(args):
+    """Pool worker for `convertEventRanges()`. Reads, parses and prepares one byte range of an event file the 
+    same way the whole file would be (see `loadEventFiles()`), and hands back its compact records
+
+    Args:
+        args:   (event_type, filename, sat, start, stop) tuple, see `splitEventFile()`
+    
+    Returns:
+        records:    `EventRecords` of the range, Unique_Ids numbered from 0. None if it has no rows
+        dtypes:     Column dtypes as read, before null filtering
+        startTime:  Earliest start time of the range
+        stopTime:   Latest stop time of the range
+    """
+    event_type,filename,sat,start,stop = args
+    spec = event_types[event_type]
+    df = _readEventFile(filename, spec['columns'], spec['time_format'], byte_range=(start,stop))
+    if len(df) == 0:
+        return None,None,None,None
+    dtypes = tuple(str(df[name].dtype) for name in spec['columns'])
+    if sat is not None:
+        df['Sat'] = sat
+    df = prepareEventColumns(df.dropna(), spec)
+    if len(df) == 0:
+        return None,dtypes,None,None
+    records = EventRecords.EventRecords.fromFrame(df, spec, 0)
+    return records,dtypes,df.StartTime.min(),df.StopTime.max()
+
+
+def convertEventRanges(event_type, members, combo_filename, pool, workers, writer):
+    """Parallel conversion of a whole product, reading included. Each member file is split into `workers` byte
+    ranges (see `splitEventFile()`) that the pool reads, parses and turns into compact records on its own, so
+    only records ever cross between processes. Once every range's row count is in, IDs for the product are 
+    leased and each range is rendered in the pool starting at its row offset into that block, then written in
+    range order. Output is identical to the serial path's.
+
+    Plain files of types with fixed `columns` only, one after another (no time_order merge). Gives up before writing anything, returning None,
+    if the ranges were read as different column types, where reading the files whole could type them otherwise.
+
+    Args:
+        event_type:     Key into `event_types`
+        members:        List of (filename, sat) tuples, as from `findPairedEventFiles()`
+        combo_filename: Product filename
+        pool:           multiprocessing.Pool to read and render in
+        workers:        Number of ranges to split each member file into
+        writer:         XMLEventWriter to stream to
+    
+    Returns:
+        root:   Etree XML root object, header only. None if the ranges didn't agree or there are no events
+
+    Examples:
+        members,combo_fn = ParseEvents.findPairedEventFiles("Input/ECLIPSE_SAT1_..._V1.csv")
+        root = ParseEvents.convertEventRanges("ECLIPSE", members, combo_fn, pool, 8, writer)
+    """
+    jobs = [(event_type, fname, sat, start, stop) for fname,sat in members for start,stop in splitEventFile(fname, workers)]
+    with Metrics.stage("load") as stage:
+        ranges = [loaded for loaded in pool.map(_loadEventRange, jobs) if loaded[1] is not None]
+        counts = [len(records) if records is not None else 0 for records,dtypes,startTime,stopTime in ranges]
+        stage.addRows(sum(counts))
+    if len(set(dtypes for records,dtypes,startTime,stopTime in ranges)) > 1 or sum(counts) == 0:
+        log.debug("Reading %s whole, its ranges don't agree on column types or are empty", combo_filename)
+        return None
+    ranges = [loaded for loaded in ranges if loaded[0] is not None]
+
+    times = pd.DataFrame({'StartTime':[startTime for records,dtypes,startTime,stopTime in ranges],
+                          'StopTime':[stopTime for records,dtypes,startTime,stopTime in ranges]})
+    startTime,stopTime = getStartStopTimes(times)
+    root = generateXMLHeader(startTime,stopTime,combo_filename)
+    writer.writeHeader(root)
+
+    ###### Each range's IDs start where the ranges before it left off
+    total = sum(counts)
+    with UniqueIDs.leaseUniqueIDs(total, pName) as lease, Metrics.stage("emit", rows=total):
+        first_uid = lease.takeIDs(total)
+        offsets = np.cumsum([0] + [len(records) for records,dtypes,startTime,stopTime in ranges])
+        jobs = [(event_type, loaded[0], first_uid + offset) for loaded,offset in zip(ranges, offsets)]
+        for xml_str in pool.imap(_renderEventRange, jobs):
+            writer.writeFragment(xml_str)
+    if event_types[event_type].get('warning') is not None:
+        log.warning(event_types[event_type]['warning'])
+    return root
 
 
-def parseMANEUVER(filename):
-    """Converts MANEUVER csv into an xml file for Flexplan ingestion
+def parseEventFile(filename, event_type, writer=None, chunksize=None, workers=None, time_order=False, pipeline=False,
+                   lite=False):
+    """Converts an event csv of any registered type into an xml file for Flexplan ingestion. How the file is 
+    read and what each event looks like comes entirely from its `event_types` entry.
     Intent is for this menthod to be dynamically called from `parseCSV()`
 
     Args:
-        filename:   Filename of the input event file
+        filename:       Filename of the input event file
+        event_type:     Key into `event_types`, like "ECLIPSE"
+
+    Kwargs:
+        writer:     XMLEventWriter to stream events to, instead of adding them to root
+        chunksize:  Read and convert the file in chunks of this many rows. Requires a writer, df is returned as None
+        workers:    Read and render events in this many processes (see `convertEventRanges()`). Requires a
+                    writer, df is returned as None
+        time_order: Merge the satellites' events in start time order instead of one satellite after another
+        pipeline:   Overlap reading, converting and writing chunks, see `convertEventChunks()`. Needs a chunksize
+        lite:       Try the pandas-free lite engine first (see `convertLiteEventProduct()`). Needs a writer
     
     Returns:
         root:           Etree XML root object. Manipulate later.
         csv_filename:   Output Filename to rename xml file as (combines the paired event files)
-        df:             Pandas Dataframe of the MANEUVER Data
+        df:             Pandas Dataframe of the event Data
     Examples:
-        root,df = ParseEvents.parseCOMM("MANEUVER_filename.csv")
+        root,csv_filename,df = ParseEvents.parseEventFile("Input/ECLIPSE_SAT1_..._V1.csv", "ECLIPSE")
     """
-    print "\nNow Parsing MANEUVER file"
-    ###### Load The dataframe
-    df,combo_filename = getPairedEventFiles(filename,cols=["Target","Start","Stop","Duration"])
-
-    ###### Find Start and Stop Times
+    spec = event_types[event_type]
+    log.info("Now Parsing %s file", event_type)
+
+    ###### Split rows across processes, or do it all here
+    pool = None
+    if workers is not None and workers > 1:
+        pool = multiprocessing.Pool(workers)
+        emitter = compileParallelEmitter(event_type, pool, workers)
+    else:
+        emitter = getEventEmitter(event_type)
+    try:
+        ###### Workers read their own ranges of plain files, everything else is read here and handed out
+        if pool is not None and writer is not None and chunksize is None and cache_dir is None and \
+                spec['columns'] is not None:
+            members,combo_filename = _findProductMembers(filename, spec)
+            if all(splitCompression(fname)[1] == '' for fname,sat in members) and \
+                    not (time_order is True and len(members) > 1):
+                root = convertEventRanges(event_type, members, combo_filename, pool, workers, writer)
+                if root is not None:
+                    return root,combo_filename,None
+        return _parseEventFile(filename, spec, emitter, writer, chunksize, time_order, pipeline, lite)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def _parseEventFile(filename, spec, emitter, writer, chunksize, time_order, pipeline=False, lite=False):
+    """Does the work for `parseEventFile()` once the emitter is picked"""
+    ###### Find the files making up this product
+    members,combo_filename = _findProductMembers(filename, spec)
+
+    if lite is True and writer is not None:
+        root = convertLiteEventProduct(spec, members, combo_filename, emitter, writer, time_order=time_order)
+        if root is not None:
+            return root,combo_filename,None
+
+    ###### Stream fixed size chunks through the whole pipeline instead of loading the file
+    if chunksize is not None:
+        times = None
+        if writer.compression:
+            times = scanEventTimes(members, chunksize, cols=spec['columns'], input_format=spec['time_format'])
+        chunks = _iterProductChunks(spec, members, chunksize, time_order)
+        root = convertEventChunks(chunks, combo_filename, emitter, writer, input_format=spec['time_format'],
+                                  pipeline=pipeline, times=times)
+        return root,combo_filename,None
+
+    ###### Load The dataframe, times are parsed once on load
+    df = _loadEventProduct(filename, spec, members, time_order)
     startTime,stopTime = getStartStopTimes(df)
 
     root = generateXMLHeader(startTime,stopTime,combo_filename)
+    if writer is not None:
+        writer.writeHeader(root)
 
-    ###### Iterate over COMM dataframe (each row of events)
-    for idx,row in df.iterrows():
-        utcStart =convertTimeFormat(row.Start)
-        duration = str((convertTimeFormat(row.Stop,to_string=False) - 
-                    convertTimeFormat(row.Start,to_string=False)).total_seconds()*1e3)
-        duration = str(row.Duration*1e3)
-        uid = str(getNextUniqueID())
-        descr = "MANEUVER"
-        sat = row.Sat
-        param_names = ["ACS_POINT"]
-        param_values = [row.Target]
-
-        entity_names = ['UTC_Start_Time','Duration','Unique_Id','Event_Description','Sat',
-                            'Entity','List_of_Event_Parameters']
-        event_params = {'Event_Parameter':[{'Event_Par_Name':param_names[i],'Event_Par_Value':param_values[i]} for i in np.arange(len(param_names))]}
+    root = emitter(root, df, writer=writer)
 
-        xml_entity = None
+    return root,combo_filename,df
 
-        entity_values = [utcStart,duration,uid,descr,sat,xml_entity,event_params]
 
-        entities = dict(zip(entity_names,entity_values))
-        root = createEventElement(root,entities,override_keys=entity_names) # Override to preserve order in xml
-        
-    # csv_filename = string.replace(string.replace(filename.split('/')[-1],'SAT1_',''),'SAT2_','')
-    return root,combo_filename,df
+def _findProductMembers(filename, spec):
+    """Member files and combined filename of the product an event file belongs to, see `findPairedEventFiles()`"""
+    if spec['paired'] is True:
+        return findPairedEventFiles(filename)
+    return [(filename,None)],filename.split('/')[-1]
 
 
-def parseMEMORY(filename):
-    """Converts MEMORY csv into an xml file for Flexplan ingestion
-    Intent is for this menthod to be dynamically called from `parseCSV()`
+def _iterProductChunks(spec, members, chunksize, time_order):
+    """Chunks of a product's member files, columns prepared (see `prepareEventColumns()`)"""
+    cols = spec['columns']
+    if time_order is True and len(members) > 1:
+        streams = [iterEventChunks([member], chunksize, cols=cols) for member in members]
+        chunks = mergeEventChunks(streams, chunksize, input_format=spec['time_format'])
+    else:
+        chunks = iterEventChunks(members, chunksize, cols=cols)
+    return (prepareEventColumns(chunk, spec) for chunk in chunks)
+
+
+def loadEventProduct(filename, event_type=None, time_order=False):
+    """Loads the whole product an event file belongs to (every satellite's file for paired types) into a single 
+    dataframe, ready for conversion: times parsed and columns prepared (see `prepareEventColumns()`). This is the
+    dataframe `parseEventFile()` converts.
 
     Args:
-        filename:   Filename of the input event file
+        filename:   Any filename of the product
+
+    Kwargs:
+        event_type: Key into `event_types`. Taken from the filename if not given
+        time_order: Merge the satellites' events in start time order instead of one satellite after another
     
     Returns:
-        root:           Etree XML root object. Manipulate later.
-        csv_filename:   Output Filename to rename xml file as (combines the paired event files)
-        df:             Pandas Dataframe of the MEMORY Data
+        df:             Dataframe of the product's events
+        combo_filename: Product filename (combines the paired event files)
+
     Examples:
-        root,df = ParseEvents.parseCOMM("MEMORY_filename.csv")
+        df,combo_fn = ParseEvents.loadEventProduct("Input/ECLIPSE_SAT1_..._V1.csv")
     """
-    print "\nNow Parsing MEMORY file"
-    ###### Load The dataframe
-    df,combo_filename = getPairedEventFiles(filename,cols=["Start","Stop","Duration"])
+    if event_type is None:
+        event_type = filename.split('/')[-1].split('_')[0]
+    spec = event_types[event_type]
+    members,combo_filename = _findProductMembers(filename, spec)
+    return _loadEventProduct(filename, spec, members, time_order),combo_filename
 
-    ###### Find Start and Stop Times
-    startTime,stopTime = getStartStopTimes(df)
 
-    root = generateXMLHeader(startTime,stopTime,combo_filename)
+def _loadEventProduct(filename, spec, members, time_order):
+    """Does the work for `loadEventProduct()` once the members are found"""
+    if spec['paired'] is True:
+        df = loadEventFiles(members, cols=spec['columns'], time_order=time_order, input_format=spec['time_format'])
+    else:
+        df = readEventFile(filename, cols=spec['columns'], input_format=spec['time_format']).dropna()
+    return prepareEventColumns(df, spec)
 
-    ###### Iterate over COMM dataframe (each row of events)
-    for idx,row in df.iterrows():
-        utcStart =convertTimeFormat(row.Start)
-        duration = str((convertTimeFormat(row.Stop,to_string=False) - 
-                    convertTimeFormat(row.Start,to_string=False)).total_seconds()*1e3)
-        duration = str(row.Duration*1e3)
-        uid = str(getNextUniqueID())
-        descr = "MEMORY"
-        sat = row.Sat
-        param_names = None
-        param_values = None
-
-        entity_names = ['UTC_Start_Time','Duration','Unique_Id','Event_Description','Sat',
-                            'Entity','List_of_Event_Parameters']
-        event_params = None 
 
-        xml_entity = None
+def parseCOMM(filename, writer=None, chunksize=None):
+    """Converts COMM csv into an xml file for Flexplan ingestion. See `parseEventFile()`
 
-        entity_values = [utcStart,duration,uid,descr,sat,xml_entity,event_params]
+    Examples:
+        root,csv_filename,df = ParseEvents.parseCOMM("COMM_filename.csv")
+    """
+    return parseEventFile(filename, "COMM", writer=writer, chunksize=chunksize)
 
-        entities = dict(zip(entity_names,entity_values))
-        root = createEventElement(root,entities,override_keys=entity_names) # Override to preserve order in xml
-        
-    # csv_filename = string.replace(string.replace(filename.split('/')[-1],'SAT1_',''),'SAT2_','')
-    return root,combo_filename,df
 
+def parseECLIPSE(filename, writer=None, chunksize=None):
+    """Converts ECLIPSE csv into an xml file for Flexplan ingestion. See `parseEventFile()`
 
-def parsePHOTO(filename):
-    """Converts PHOTO csv into an xml file for Flexplan ingestion
-    Intent is for this menthod to be dynamically called from `parseCSV()`
+    Examples:
+        root,csv_filename,df = ParseEvents.parseECLIPSE("ECLIPSE_filename.csv")
+    """
+    return parseEventFile(filename, "ECLIPSE", writer=writer, chunksize=chunksize)
 
-    Args:
-        filename:   Filename of the input event file
-    
-    Returns:
-        A pluthera of things! 
 
-        root:           Etree XML root object. Manipulate later.
-        csv_filename:   Output Filename to rename xml file as (combines the paired event files)
-        df:             Pandas Dataframe of the PHOTO Data
+def parseMANEUVER(filename, writer=None, chunksize=None):
+    """Converts MANEUVER csv into an xml file for Flexplan ingestion. See `parseEventFile()`
 
     Examples:
-        root,df = ParseEvents.parseCOMM("PHOTO_filename.csv")
+        root,csv_filename,df = ParseEvents.parseMANEUVER("MANEUVER_filename.csv")
     """
-    print "\nNow Parsing PHOTO file"
-    ###### Load The dataframe
-    df,combo_filename = getPairedEventFiles(filename,cols=["Start","Stop","Duration"])
+    return parseEventFile(filename, "MANEUVER", writer=writer, chunksize=chunksize)
 
-    ###### Find Start and Stop Times
-    startTime,stopTime = getStartStopTimes(df)
 
-    root = generateXMLHeader(startTime,stopTime,combo_filename)
+def parseMEMORY(filename, writer=None, chunksize=None):
+    """Converts MEMORY csv into an xml file for Flexplan ingestion. See `parseEventFile()`
 
-    ###### Iterate over COMM dataframe (each row of events)
-    for idx,row in df.iterrows():
-        utcStart =convertTimeFormat(row.Start)
-        duration = str((convertTimeFormat(row.Stop,to_string=False) - 
-                    convertTimeFormat(row.Start,to_string=False)).total_seconds()*1e3)
-        duration = str(row.Duration*1e3)
-        uid = str(getNextUniqueID())
-        descr = "PHOTO"
-        sat = row.Sat
-        param_names = None
-        param_values = None
-
-        entity_names = ['UTC_Start_Time','Duration','Unique_Id','Event_Description','Sat',
-                            'Entity','List_of_Event_Parameters']
-        event_params = None 
+    Examples:
+        root,csv_filename,df = ParseEvents.parseMEMORY("MEMORY_filename.csv")
+    """
+    return parseEventFile(filename, "MEMORY", writer=writer, chunksize=chunksize)
 
-        xml_entity = None
 
-        entity_values = [utcStart,duration,uid,descr,sat,xml_entity,event_params]
+def parsePHOTO(filename, writer=None, chunksize=None):
+    """Converts PHOTO csv into an xml file for Flexplan ingestion. See `parseEventFile()`
 
-        entities = dict(zip(entity_names,entity_values))
-        root = createEventElement(root,entities,override_keys=entity_names) # Override to preserve order in xml
-        
-    # csv_filename = string.replace(string.replace(filename.split('/')[-1],'SAT1_',''),'SAT2_','')
-    return root,combo_filename,df
+    Examples:
+        root,csv_filename,df = ParseEvents.parsePHOTO("PHOTO_filename.csv")
+    """
+    return parseEventFile(filename, "PHOTO", writer=writer, chunksize=chunksize)
 
 
 if __name__ == "__main__":
@@ -672,8 +2958,64 @@ if __name__ == "__main__":
 
     See help documentation automatically generated with doxygen in the doc subfolder.
     """
+    import argparse
+    argparser = argparse.ArgumentParser(description="Convert event files into Flexplan-compliant XML")
+    argparser.add_argument("filename", nargs='?', help="Event file to convert. Converts the Input folder samples if omitted")
+    argparser.add_argument("--batch", metavar="DIR", default=None, help="Convert every event file in a directory")
+    argparser.add_argument("--workers", type=int, default=None, 
+                            help="Worker processes. Files in parallel with --batch (default: number of CPUs), else row ranges of each file")
+    argparser.add_argument("--stream", action="store_true", help="No effect, events are always streamed (kept for old scripts)")
+    argparser.add_argument("--chunksize", type=int, default=None, help="Read and convert inputs in batches of this many rows")
+    argparser.add_argument("--time-order", action="store_true", help="Merge satellites' events in start time order")
+    argparser.add_argument("--pipeline", action="store_true",
+                            help="Read, convert and write chunks in overlapping threads (implies --chunksize)")
+    argparser.add_argument("--shard-by", choices=["events","bytes","window"], default=None,
+                            help="Split each product into shards plus a manifest, by event count, XML bytes or time window")
+    argparser.add_argument("--shard-size", type=int, default=None, help="Events, bytes or seconds per shard")
+    argparser.add_argument("--delta", action="store_true",
+                            help="Convert against the previous version in Output, keep unchanged events' IDs and write a _DELTA product")
+    argparser.add_argument("--delta-from", metavar="FILE", default=None,
+                            help="Previous version's XML product to convert against (implies --delta, one filename only)")
+    argparser.add_argument("--serializer", choices=["template","etree"], default="template",
+                            help="How streamed events are serialized. Output is identical")
+    argparser.add_argument("--no-tokenizer", action="store_true",
+                            help="Read STK files with the generic CSV reader instead of the memory-mapped tokenizer")
+    argparser.add_argument("--cache", metavar="DIR", default=None, help="Cache parsed inputs in DIR, reruns skip the CSV parsing")
+    argparser.add_argument("--compress", choices=["gz","bz2","xz","none"], default=None,
+                            help="Compress the XML products (default: same as each input file)")
+    argparser.add_argument("--metrics", metavar="FILE", default=None, 
+                            help="Write stage timings and counters to FILE. '.prom' for a Prometheus textfile, else JSON")
+    argparser.add_argument("--lite-max-bytes", type=int, default=lite_max_bytes,
+                            help="Convert inputs up to this size without pandas (0 to always use pandas)")
+    argparser.add_argument("--profile", metavar="FILE", default=None, help="Run under cProfile and dump stats to FILE")
+    argparser.add_argument("--log-level", default="INFO", help="Logging level (DEBUG, INFO, WARNING...)")
+    args = argparser.parse_args()
+    if (args.shard_by is None) != (args.shard_size is None):
+        argparser.error("--shard-by and --shard-size go together")
+    if args.shard_by is not None and (args.delta or args.delta_from is not None):
+        argparser.error("--delta products can't be sharded")
+    if args.delta_from is not None and (args.batch is not None or args.filename is None):
+        argparser.error("--delta-from is the previous version of one product, give just that product's filename")
+
+    logging.basicConfig(level=getattr(logging, args.log_level.upper()), format="%(message)s")
+    if args.metrics is not None or args.profile is not None:
+        Metrics.enable(profile=args.profile is not None)
+    cache_dir = args.cache
+    xml_serializer = args.serializer
+    stk_tokenizer = not args.no_tokenizer
+    lite_max_bytes = args.lite_max_bytes
+    if args.compress is not None:
+        output_compression = '' if args.compress == "none" else '.' + args.compress
+
+    ###### Whole directory in parallel
+    if args.batch is not None:
+        results = convertDirectory(args.batch, workers=args.workers, stream=True, chunksize=args.chunksize,
+                                   time_order=args.time_order, pipeline=args.pipeline, shard_by=args.shard_by,
+                                   shard_size=args.shard_size, delta=args.delta, delta_from=args.delta_from)
+        fnames = []
+
     # If no arguments
-    if len( sys.argv ) < 2:
+    elif args.filename is None:
         fnames = ['Input/COMM_20120717000000_20120719000000_20140604114400_V1.csv',
                   'Input/ECLIPSE_SAT1_20140704000000_20140711000000_20140604123800_V1.csv',
                   'Input/MANEUVER_SAT1_20140704000000_20140711000000_20140604124700_V1.csv',
@@ -681,20 +3023,15 @@ if __name__ == "__main__":
                   'Input/PHOTO_SAT1_20140704000000_20140711000000_20140604124500_V1.csv'
                   ]
     else:
-        fnames = [sys.argv[1]]
-
-    [parseCSV(fname) for fname in fnames] 
-
-    
-
-
-
-
-
-
-
-
-
-
-
-
+        fnames = [args.filename]
+
+    [parseCSV(fname, stream=True, lite=True, chunksize=args.chunksize, workers=args.workers, time_order=args.time_order,
+              pipeline=args.pipeline, shard_by=args.shard_by, shard_size=args.shard_size, delta=args.delta,
+              delta_from=args.delta_from) for fname in fnames]
+
+    if args.profile is not None:
+        Metrics.writeProfile(args.profile)
+    if args.metrics is not None:
+        Metrics.writeMetrics(args.metrics)
+    if args.batch is not None:
+        sys.exit(0 if all(ok for f,ok,m in results) else 1)
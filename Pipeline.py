@@ -0,0 +1,137 @@
+##! /usr/bin/python
+__author__ = 'Zach Dischner'
+__copyright__ = "NA"
+__credits__ = ["NA"]
+__license__ = "NA"
+__version__ = "1.0.0"
+__maintainer__ = "Zach Dischner"
+__email__ = "zach.dischner@gmail.com"
+__status__ = "Dev"
+
+"""
+File name: Pipeline.py
+Authors: Zach Dischner
+Created: 7/2/2014
+Modified:
+
+Three stage read -> transform -> write pipeline, so disk (or network mount) latency on either end overlaps the
+CPU work in the middle instead of adding to it:
+    read        A thread pulls items (input chunks) off an iterator
+    transform   The calling thread turns each item into write actions (no argument callables)
+    write       A thread runs the write actions, in order
+Stages are connected by bounded queues, so a fast reader blocks once it is `depth` items ahead, and a slow
+disk blocks the transform once `depth` writes are waiting. Memory stays at about 2 * depth items.
+
+The transform runs in the calling thread, so anything it does (ID leases, emitters...) sees the same state it
+would in a serial run. An exception in any stage stops the other two and is raised from `runPipeline()`.
+
+Examples:
+    def transform(chunk):
+        xml_str = render(chunk)
+        yield functools.partial(writer.writeFragment, xml_str)
+    Pipeline.runPipeline(iterEventChunks(members, 10000), transform, depth=4)
+"""
+
+# -------------------------
+# --- IMPORT AND GLOBAL ---
+# -------------------------
+import sys, threading, Queue
+
+"""
+Global Variables
+@param default_depth:   Items each queue holds before the stage feeding it blocks
+@param poll_interval:   Seconds a blocked reader waits between checks that the pipeline is still running
+"""
+default_depth = 4
+poll_interval = 0.1
+
+
+class _Failure(object):
+    """Exception raised in the read stage, passed down the queue to be raised in the calling thread"""
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+_end = object()
+
+
+def _put(q, item, stop):
+    """Puts on a bounded queue, giving up if the pipeline is stopped while waiting for room
+
+    Returns:
+        put:    Whether the item went on the queue
+    """
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=poll_interval)
+            return True
+        except Queue.Full:
+            continue
+    return False
+
+
+def _readStage(items, read_q, stop):
+    """Read thread. Iterates the items onto the queue, then the end marker (or the failure)"""
+    try:
+        for item in items:
+            if not _put(read_q, item, stop):
+                return
+    except Exception:
+        _put(read_q, _Failure(sys.exc_info()), stop)
+        return
+    _put(read_q, _end, stop)
+
+
+def _writeStage(write_q, failures):
+    """Write thread. Runs write actions until the end marker. After a failure the rest are only drained, so the
+    transform never blocks on a full queue"""
+    while True:
+        action = write_q.get()
+        if action is _end:
+            return
+        if len(failures):
+            continue
+        try:
+            action()
+        except Exception:
+            failures.append(sys.exc_info())
+
+
+def runPipeline(items, transform, depth=default_depth):
+    """Runs items through the read, transform and write stages (see module docs) until the items run out
+
+    Args:
+        items:      Iterable of inputs, iterated in the read thread (a chunk generator, say)
+        transform:  Function transform(item) returning an iterable of write actions, called in this thread
+
+    Kwargs:
+        depth:      Bound of both queues
+
+    Examples:
+        Pipeline.runPipeline(chunks, lambda chunk: [functools.partial(fh.write, render(chunk))])
+    """
+    stop = threading.Event()
+    read_q = Queue.Queue(depth)
+    write_q = Queue.Queue(depth)
+    failures = []
+    reader = threading.Thread(target=_readStage, args=(items, read_q, stop), name="PipelineRead")
+    writer = threading.Thread(target=_writeStage, args=(write_q, failures), name="PipelineWrite")
+    reader.daemon = writer.daemon = True
+    reader.start()
+    writer.start()
+    try:
+        while len(failures) == 0:
+            item = read_q.get()
+            if item is _end:
+                break
+            if isinstance(item, _Failure):
+                raise item.exc_info[0], item.exc_info[1], item.exc_info[2]
+            for action in transform(item):
+                write_q.put(action)
+    finally:
+        ###### Let the writer finish what is queued, and the reader give up on whatever it was putting
+        stop.set()
+        write_q.put(_end)
+        writer.join()
+        reader.join()
+    if len(failures):
+        raise failures[0][0], failures[0][1], failures[0][2]
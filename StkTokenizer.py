@@ -0,0 +1,306 @@
+##! /usr/bin/python
+__author__ = 'Zach Dischner'
+__copyright__ = "NA"
+__credits__ = ["NA"]
+__license__ = "NA"
+__version__ = "1.0.0"
+__maintainer__ = "Zach Dischner"
+__email__ = "zach.dischner@gmail.com"
+__status__ = "Dev"
+
+"""
+File name: StkTokenizer.py
+Authors: Zach Dischner
+Created: 7/5/2014
+Modified:
+
+Fast reader for STK report CSVs (ECLIPSE, MEMORY, PHOTO, MANEUVER). They are rigid: a header line, then rows like
+    4 Jul 2014 00:58:19.332,4 Jul 2014 00:58:27.893,8.561
+so instead of a generic CSV parse plus strptime, the file is memory-mapped and handled as one byte array:
+    lines       Newline positions from one comparison over the whole buffer
+    fields      Comma positions, which must number exactly (columns - 1) on every line
+    times       Right aligned 'D[D] Mon YYYY HH:MM:SS.fff', so every digit sits at a fixed offset back from the
+                field end. Digits are pulled out for all rows at once and combined into datetime64
+    numbers     Fields gathered into a fixed width byte array, viewed as numpy strings and cast to float or int
+Anything that doesn't fit (quotes, a ragged row, two digit fractions like '01:31:00.00', numbers padded with
+blanks or signed, values pandas would read as missing...) makes `readStkEventFile()` return None, and the caller reads the file the
+generic way. When it does return, the dataframe is what the generic path would have made.
+
+Examples:
+    df = StkTokenizer.readStkEventFile("Input/ECLIPSE_SAT1_..._V1.csv", ["Start","Stop","Duration"])
+    if df is None:
+        df = ...    # Generic CSV read and time parsing
+"""
+
+# -------------------------
+# --- IMPORT AND GLOBAL ---
+# -------------------------
+import os, mmap, logging
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+"""
+Global Variables
+@param time_columns:    Columns holding STK times, parsed into 'StartTime' and 'StopTime'
+@param month_codes:     Month abbreviation bytes packed into one int, -> month index
+@param bool_strings:    Text pandas reads as booleans, left to the generic reader
+@param log:             Logger, says why a file was passed on at DEBUG
+"""
+time_columns = OrderedDict([("Start", "StartTime"), ("Stop", "StopTime")])
+month_codes = dict((ord(month[0])<<16 | ord(month[1])<<8 | ord(month[2]), k) for k,month in
+                   enumerate(["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"]))
+bool_strings = frozenset(['True', 'False', 'TRUE', 'FALSE', 'true', 'false'])
+log = logging.getLogger("StkTokenizer")
+
+
+class _Mismatch(Exception):
+    """The file isn't exactly the STK layout, the generic reader has to do it"""
+    pass
+
+
+def readStkEventFile(filename, cols, na_values=(), start=0, stop=None):
+    """Reads an STK report CSV through the tokenizer (see module docs)
+
+    Args:
+        filename:   Plain (uncompressed) event file
+        cols:       Column names, one per field. 'Start' and 'Stop' are STK times
+
+    Kwargs:
+        na_values:  Field text the generic reader takes as missing, files with any are passed on
+        start,stop: Byte range of the file to read, the whole file by default. A range starting past 0 has no
+                    header line, it must start and end on line boundaries
+
+    Returns:
+        df:     Dataframe of the columns plus 'StartTime' and 'StopTime' (datetime64), like a generic read with
+                times parsed. None if the file has to be read the generic way
+
+    Examples:
+        df = StkTokenizer.readStkEventFile(fname, ["Target","Start","Stop","Duration"], na_values=["NA",""])
+    """
+    if len(cols) < 2 or not all(name in cols for name in time_columns) or os.path.getsize(filename) == 0:
+        return None
+    f = open(filename, 'rb')
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        f.close()
+    try:
+        ## Everything returned is a copy, nothing may point into the map once it is closed
+        return _tokenize(np.frombuffer(mm, dtype=np.uint8)[start:stop], cols, frozenset(na_values), header=start == 0)
+    except _Mismatch as e:
+        log.debug("Generic read for %s: %s", filename, e)
+        return None
+    finally:
+        mm.close()
+
+
+def findFields(buf, n_cols, header=True):
+    """Finds the byte range of every field of every data line
+
+    Args:
+        buf:        uint8 array of the whole file
+        n_cols:     Fields per line
+
+    Kwargs:
+        header:     Whether the first line is the header
+
+    Returns:
+        starts:     (rows, n_cols) array of field start offsets
+        ends:       (rows, n_cols) array of field end offsets (exclusive)
+    """
+    if np.count_nonzero(buf == 0):
+        raise _Mismatch("NUL bytes")
+    ends = np.flatnonzero(buf == ord('\n'))
+    if len(ends) == 0 or ends[-1] != len(buf) - 1:
+        ## Last line without a newline
+        ends = np.append(ends, len(buf))
+    starts = np.concatenate([[0], ends[:-1] + 1])
+
+    ###### Windows line ends are fine, a carriage return anywhere else isn't
+    crlf = (ends > starts) & (buf[np.maximum(ends - 1, 0)] == ord('\r'))
+    if np.count_nonzero(buf == ord('\r')) != np.count_nonzero(crlf):
+        raise _Mismatch("Stray carriage returns")
+    ends = ends - crlf
+
+    ## Empty lines are skipped, like the generic reader does
+    if header and ends[0] == starts[0]:
+        raise _Mismatch("Blank header")
+    keep = ends > starts
+    starts,ends = starts[keep],ends[keep]
+    skip = 1 if header else 0
+    if len(starts) < skip + 1:
+        raise _Mismatch("No rows")
+    if np.count_nonzero(buf[ends[0] if header else 0:] == ord('"')):
+        raise _Mismatch("Quoted fields")
+
+    ###### Exactly n_cols - 1 commas per line, header included, so they can be reshaped into one row per line
+    commas = np.flatnonzero(buf == ord(','))
+    per_line = np.searchsorted(commas, ends) - np.searchsorted(commas, starts)
+    if (per_line != n_cols - 1).any() or len(commas) != (n_cols - 1) * len(starts):
+        raise _Mismatch("Ragged rows")
+    commas = commas[(n_cols - 1) * skip:].reshape(-1, n_cols - 1)
+    return np.column_stack([starts[skip:], commas + 1]),np.column_stack([commas, ends[skip:]])
+
+
+def gatherFields(buf, starts, ends):
+    """Copies variable length fields into a fixed width, NUL padded byte matrix
+
+    Args:
+        buf:        uint8 array of the whole file
+        starts:     Field start offsets
+        ends:       Field end offsets (exclusive)
+
+    Returns:
+        chars:  (rows, width) uint8 array, C ordered, so it can be viewed as numpy strings
+    """
+    lengths = ends - starts
+    width = max(int(lengths.max()), 1)
+    offsets = np.arange(width)
+    inside = offsets < lengths[:, None]
+    chars = buf[np.minimum(starts[:, None] + offsets, len(buf) - 1)]
+    chars[~inside] = 0
+    return np.ascontiguousarray(chars)
+
+
+def asStrings(chars):
+    """Views a byte matrix from `gatherFields()` as one numpy string per row"""
+    return chars.view('S%d' % chars.shape[1]).ravel()
+
+
+def decodeStkTimes(buf, ends, lengths):
+    """Decodes STK times ('4 Jul 2014 00:58:19.332') into datetime64, straight from the bytes
+
+    Args:
+        buf:        uint8 array of the whole file
+        ends:       Field end offsets (exclusive)
+        lengths:    Field lengths, 23 for one digit days and 24 for two
+
+    Returns:
+        times:  datetime64[ns] array
+    """
+    if not ((lengths == 23) | (lengths == 24)).all():
+        raise _Mismatch("Time field widths")
+    ## Last 23 bytes of each field: D Mon YYYY HH:MM:SS.fff
+    t = buf[ends[:, None] - np.arange(23, 0, -1)].astype(np.int64)
+    if not ((t[:, [1,5,10]] == ord(' ')).all() and (t[:, [13,16]] == ord(':')).all() and (t[:, 19] == ord('.')).all()):
+        raise _Mismatch("Time separators")
+    d = t - ord('0')
+    digits = d[:, [0,6,7,8,9,11,12,14,15,17,18,20,21,22]]
+    tens = np.where(lengths == 24, buf[ends - 24].astype(np.int64) - ord('0'), 0)
+    if not (((digits >= 0) & (digits <= 9)).all() and ((tens >= 0) & (tens <= 9)).all()):
+        raise _Mismatch("Time digits")
+
+    ###### Month from its three letters, packed into one int
+    packed = t[:, 2]<<16 | t[:, 3]<<8 | t[:, 4]
+    codes = np.array(sorted(month_codes))
+    k = np.minimum(np.searchsorted(codes, packed), len(codes) - 1)
+    if not (codes[k] == packed).all():
+        raise _Mismatch("Month names")
+    month = np.array([month_codes[code] for code in codes])[k]
+
+    day = tens*10 + d[:, 0]
+    year = d[:, 6]*1000 + d[:, 7]*100 + d[:, 8]*10 + d[:, 9]
+    hour = d[:, 11]*10 + d[:, 12]
+    minute = d[:, 14]*10 + d[:, 15]
+    second = d[:, 17]*10 + d[:, 18]
+    ms = d[:, 20]*100 + d[:, 21]*10 + d[:, 22]
+    ## Only what fits in datetime64[ns] and strptime would take
+    if not ((year > 1677) & (year < 2262) & (day >= 1) & (hour < 24) & (minute < 60) & (second < 60)).all():
+        raise _Mismatch("Time ranges")
+
+    months = np.datetime64('1970-01', 'M') + ((year - 1970)*12 + month).astype('timedelta64[M]')
+    days = months.astype('datetime64[D]') + (day - 1).astype('timedelta64[D]')
+    if not (days.astype('datetime64[M]') == months).all():
+        raise _Mismatch("Day past the end of its month")
+    return days.astype('datetime64[ns]') + (((hour*60 + minute)*60 + second)*10**9 + ms*10**6).astype('timedelta64[ns]')
+
+
+def decodeColumn(chars, na_values):
+    """Decodes a non-time column the way the generic reader types it: int64 if every field is an integer, float64
+    if every field is a plain decimal, str if no field is a number at all. Numbers written any other way (padded
+    with blanks, signed, with an exponent...) and columns mixing numbers and text are left to the generic reader
+
+    Args:
+        chars:      Byte matrix of the column, from `gatherFields()`
+        na_values:  Text the generic reader takes as missing
+
+    Returns:
+        values:     int64, float64 or object array
+    """
+    used = chars != 0
+    digit = (chars >= ord('0')) & (chars <= ord('9'))
+    dot = chars == ord('.')
+    ## [+-]?(\d+\.?\d*|\.\d+) without the sign, leading signs are rare enough to leave to pandas
+    number = ((digit | dot | ~used).all(axis=1) & (dot.sum(axis=1) <= 1) & digit.any(axis=1))
+    strings = asStrings(chars)
+    if number.all():
+        if not dot.any() and chars.shape[1] < 19:
+            return strings.astype(np.int64)
+        return decodeDecimals(chars, digit, dot)
+    if number.any():
+        raise _Mismatch("Mixed numeric and text column")
+    values = strings.astype(object)
+    distinct = set(values)
+    if any(isNumberText(value) for value in distinct):
+        raise _Mismatch("Numbers the tokenizer doesn't decode")
+    stripped = set(value.strip() for value in distinct)
+    if not na_values.isdisjoint(distinct | stripped) or not bool_strings.isdisjoint(distinct | stripped):
+        raise _Mismatch("Missing or boolean values")
+    return values
+
+
+def isNumberText(text):
+    """Whether a field could be read as a number by the generic reader (' 60.5', '-1', '1e3', 'inf'...)"""
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return True
+
+
+def decodeDecimals(chars, digit, dot):
+    """Decodes plain decimals ('8.561') to float64 the way pandas' default C parser does, so values are equal to
+    the last bit: the digits as one integer, then divided by 10, 100, 10000... for each set bit of the number of
+    fraction digits. (Python's float() rounds correctly, and differs from pandas in about one value in ten)
+
+    Args:
+        chars:  Byte matrix of the column, from `gatherFields()`
+        digit:  Mask of its digit bytes
+        dot:    Mask of its decimal point bytes
+
+    Returns:
+        values:     float64 array
+    """
+    n_digits = digit.sum(axis=1)
+    if (n_digits > 15).any():
+        raise _Mismatch("Too many digits to decode exactly")
+    ## Place value of each digit, counting only digits to its right
+    right = digit[:, ::-1].cumsum(axis=1)[:, ::-1] - digit
+    mantissa = np.where(digit, (chars.astype(np.int64) - ord('0')) * 10**right, 0).sum(axis=1)
+    exponent = (digit & (dot.cumsum(axis=1) > 0)).sum(axis=1)
+    values = mantissa.astype(np.float64)
+    p10 = 10.0
+    while exponent.any():
+        odd = (exponent & 1).astype(bool)
+        values[odd] /= p10
+        exponent >>= 1
+        p10 *= p10
+    return values
+
+
+def _tokenize(buf, cols, na_values, header=True):
+    """Does the work for `readStkEventFile()`"""
+    starts,ends = findFields(buf, len(cols), header=header)
+    columns = OrderedDict()
+    times = {}
+    for k,name in enumerate(cols):
+        chars = gatherFields(buf, starts[:, k], ends[:, k])
+        if name in time_columns:
+            times[time_columns[name]] = decodeStkTimes(buf, ends[:, k], ends[:, k] - starts[:, k])
+            columns[name] = asStrings(chars).astype(object)
+        else:
+            columns[name] = decodeColumn(chars, na_values)
+    for name in time_columns.values():
+        columns[name] = times[name]
+    return pd.DataFrame(columns, columns=list(columns))
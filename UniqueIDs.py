@@ -0,0 +1,282 @@
+##! /usr/bin/python
+__author__ = 'Zach Dischner'
+__copyright__ = "NA"
+__credits__ = ["NA"]
+__license__ = "NA"
+__version__ = "1.0.0"
+__maintainer__ = "Zach Dischner"
+__email__ = "zach.dischner@gmail.com"
+__status__ = "Dev"
+
+"""
+File name: UniqueIDs.py
+Authors: Zach Dischner
+Created: 6/20/2014
+Modified:
+
+Block-leased allocator for the Unique_Id counter stored in `UniqueID.pickle`.
+
+Instead of opening and rewriting the pickle for every event, a parser leases a contiguous block of IDs
+in a single locked read-modify-write and then hands them out from memory. The pickle keeps its original
+format (a protocol 0 pickled int holding the last used ID), so older tools still read it.
+
+Every lease is recorded in a journal next to the counter file (`UniqueID.leases` for `UniqueID.pickle`):
+    LEASE  first last pid time      Written when the block is taken
+    USED   first last pid time      IDs actually handed out from the block
+    RETURN first last pid time      Unused tail given back to the counter (nobody leased after us)
+    GAP    first last pid time      Unused tail that could not be given back, these IDs are never used
+A LEASE without a matching USED line means the process died mid-file; the whole block should be treated as a gap.
+LEASE, RETURN and GAP lines are written while the counter is still locked, so they are in counter order and a block
+is never taken without its line. Once the journal passes `journal_max_bytes` it is rotated to `UniqueID.leases.1`,
+replacing the previous one, so at most two generations are kept. A lease open across a rotation has its LEASE
+line in the old journal and its USED line in the new one, read both together.
+
+Locking is done with fcntl.flock on a lock file next to the counter (`UniqueID.pickle.lock`), so any number of
+ParseEvents processes can share one counter file. On platforms without fcntl the allocator still works, but only
+for a single process at a time. The counter is never rewritten in place: the new value goes to a temp file that is
+synced and renamed over it, so a crash or a full disk leaves either the old value or the new one, never an empty
+file.
+"""
+
+# -------------------------
+# --- IMPORT AND GLOBAL ---
+# -------------------------
+import os, pickle, time
+import Metrics
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+"""
+Global Variables
+@param journal_max_bytes:   Size past which the lease journal is rotated (see module docs)
+"""
+journal_max_bytes = 16 << 20
+
+
+def getJournalName(pname):
+    """Name of the lease journal belonging to a counter file
+
+    Args:
+        pname:  Pickle filename storing unique ID incrementor
+
+    Returns:
+        jname:  Journal filename
+
+    Examples:
+        UniqueIDs.getJournalName("UniqueID.pickle")  # -> "UniqueID.leases"
+    """
+    return os.path.splitext(pname)[0] + '.leases'
+
+
+def _updateCounter(pname, update, journal=None):
+    """Locked read-modify-write of the counter pickle.
+
+    Args:
+        pname:   Pickle filename storing unique ID incrementor
+        update:  Function called with the last used ID, returns the new last used ID (or None to leave untouched)
+
+    Kwargs:
+        journal: Function called with (old, new), returns the (action, first, last) journal lines recording the
+                 update. They are written before the lock is released
+
+    Returns:
+        old:    Last used ID before the update
+        new:    Last used ID after the update
+    """
+    with Metrics.stage("id_counter"):
+        return _lockedUpdate(pname, update, journal)
+
+
+def _lockedUpdate(pname, update, journal=None):
+    """Does the work of `_updateCounter()`, which just times it"""
+    lock = open(pname + '.lock', 'a')
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        f = open(pname, 'r')
+        try:
+            old = pickle.load(f)
+        finally:
+            f.close()
+        new = update(old)
+        if new is not None and new != old:
+            _replaceCounter(pname, new)
+        else:
+            new = old
+        if journal is not None:
+            _rotateJournal(pname)
+            for action,first,last in journal(old, new):
+                _journal(pname, action, first, last)
+        return old,new
+    finally:
+        ## Closing the lock file releases the flock
+        lock.close()
+
+
+def _replaceCounter(pname, value):
+    """Writes a new counter value to a temp file in the same directory, syncs it and renames it over the counter.
+    Only called with the counter locked, so one temp name does"""
+    tmp_name = pname + '.tmp'
+    f = open(tmp_name, 'w')
+    try:
+        pickle.dump(value, f)
+        f.flush()
+        os.fsync(f.fileno())
+    finally:
+        f.close()
+    os.rename(tmp_name, pname)
+    ## The rename itself lasts once the directory is synced
+    if os.name == 'posix':
+        dir_fd = os.open(os.path.dirname(os.path.abspath(pname)), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def _rotateJournal(pname):
+    """Moves the journal aside to <journal>.1 once it is past `journal_max_bytes`. Only called with the counter
+    locked, so no two processes rotate at once"""
+    jname = getJournalName(pname)
+    if os.path.exists(jname) and os.path.getsize(jname) > journal_max_bytes:
+        os.rename(jname, jname + '.1')
+
+
+def _journal(pname, action, first, last):
+    """Append a line to the lease journal. Single small appends, so concurrent writers don't interleave."""
+    f = open(getJournalName(pname), 'a')
+    f.write("%s %d %d %d %.3f\n" % (action, first, last, os.getpid(), time.time()))
+    f.close()
+
+
+def reserveUniqueIDs(count, pname="UniqueID.pickle"):
+    """Reserve `count` contiguous IDs in one locked update, without any journaling.
+
+    Args:
+        count:  Number of IDs to reserve
+
+    Kwargs:
+        pname:  Pickle filename storing unique ID incrementor
+
+    Returns:
+        first:  First ID of the reserved block. The block is [first, first+count)
+
+    Examples:
+        uid = UniqueIDs.reserveUniqueIDs(1)
+    """
+    old,new = _updateCounter(pname, lambda last: last + count)
+    return old + 1
+
+
+def _leaseBlock(count, pname):
+    """`reserveUniqueIDs()` with the block's LEASE line journaled under the same lock. Returns its first ID"""
+    old,new = _updateCounter(pname, lambda last: last + count, journal=lambda old,new: [('LEASE', old + 1, new)])
+    return old + 1
+
+
+class IDLease(object):
+    """A contiguous block of Unique IDs leased from the counter file. Hand IDs out with `nextID()` and
+    `release()` when done (or use it as a context manager).
+
+    Examples:
+        with UniqueIDs.leaseUniqueIDs(len(df)) as lease:
+            for idx,row in df.iterrows():
+                uid = str(lease.nextID())
+    """
+    def __init__(self, first, last, pname, block=None):
+        self.first = first      # First ID of the current block
+        self.last = last        # Last ID of the current block (inclusive)
+        self.pname = pname
+        self.block = block      # Size of extra blocks to lease if this one runs out
+        self._next = first
+        self.released = False
+
+    def remaining(self):
+        """Number of IDs still available in the current block"""
+        return self.last - self._next + 1
+
+    def nextID(self):
+        """Hand out the next ID from memory. Leases another block if this one is used up.
+
+        Returns:
+            uid:    Next unique ID
+        """
+        if self._next > self.last:
+            self._extend(self.block or 1)
+        uid = self._next
+        self._next += 1
+        return uid
+
+    def takeIDs(self, count):
+        """Hand out `count` contiguous IDs at once
+
+        Args:
+            count:  Number of IDs needed
+
+        Returns:
+            first:  First ID of the contiguous range [first, first+count)
+        """
+        if count > self.remaining():
+            self._extend(max(count, self.block or 0))
+        first = self._next
+        self._next += count
+        return first
+
+    def _extend(self, count):
+        """Close out the current block and lease a new one. New block is not guaranteed to be contiguous."""
+        self._close()
+        self.first = _leaseBlock(count, self.pname)
+        self.last = self.first + count - 1
+        self._next = self.first
+
+    def _close(self):
+        """Record what was used from the current block, give back or record the rest."""
+        if self._next > self.first:
+            _journal(self.pname, 'USED', self.first, self._next - 1)
+        else:
+            ## Nothing was used, make that explicit so the LEASE line is matched
+            _journal(self.pname, 'USED', self.first, self.first - 1)
+        if self._next > self.last:
+            return
+        unused_first = self._next
+        ## Give the tail back only if the counter still ends at our block, i.e. nobody leased after us
+        _updateCounter(self.pname, lambda last: unused_first - 1 if last == self.last else None,
+                       journal=lambda old,new: [('RETURN' if new != old else 'GAP', unused_first, self.last)])
+        self._next = self.last + 1
+
+    def release(self):
+        """Finish with the lease. Safe to call more than once."""
+        if not self.released:
+            self._close()
+            self.released = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.release()
+        return False
+
+
+def leaseUniqueIDs(count, pname="UniqueID.pickle", block=None):
+    """Lease a contiguous block of Unique IDs in a single locked read-modify-write of the counter file.
+
+    Args:
+        count:  Number of IDs to lease (usually the number of rows in the file or chunk)
+
+    Kwargs:
+        pname:  Pickle filename storing unique ID incrementor
+        block:  Size of additional blocks leased if more than `count` IDs end up being needed
+
+    Returns:
+        lease:  IDLease handing out IDs from memory
+
+    Examples:
+        lease = UniqueIDs.leaseUniqueIDs(len(df))
+        uid = lease.nextID()
+        lease.release()
+    """
+    first = _leaseBlock(count, pname)
+    return IDLease(first, first + count - 1, pname, block=block)
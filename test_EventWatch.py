@@ -0,0 +1,105 @@
+##! /usr/bin/python
+__author__ = 'Zach Dischner'
+__copyright__ = "NA"
+__credits__ = ["NA"]
+__license__ = "NA"
+__version__ = "1.0.0"
+__maintainer__ = "Zach Dischner"
+__email__ = "zach.dischner@gmail.com"
+__status__ = "Dev"
+
+"""
+File name: test_EventWatch.py
+Authors: Zach Dischner
+Created: 7/7/2014
+Modified:
+
+Checks `EventWatch` batches. Runs in a temporary directory with its own Input, Output and ID counter.
+
+Examples:
+    python -m unittest test_EventWatch
+"""
+
+# -------------------------
+# --- IMPORT AND GLOBAL ---
+# -------------------------
+import os, pickle, shutil, tempfile, unittest, multiprocessing
+import EventWatch
+
+"""
+Global Variables
+@param photo_names:     Input file names of a PHOTO product, SAT1 then SAT2
+"""
+photo_names = ["PHOTO_SAT1_20140704000000_20140711000000_20140604124500_V1.csv",
+               "PHOTO_SAT2_20140704000000_20140711000000_20140604124500_V1.csv"]
+
+
+def _workerPid(args):
+    return os.getpid()
+
+
+class CountingPool(object):
+    """Pool handing batches to a real one and counting them"""
+    def __init__(self, processes):
+        self.pool = multiprocessing.Pool(processes)
+        self.batches = 0
+
+    def imap_unordered(self, func, jobs):
+        self.batches += 1
+        return self.pool.imap_unordered(func, jobs)
+
+    def pids(self):
+        return sorted(process.pid for process in self.pool._pool)
+
+
+class ConvertChangedTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.mkdtemp()
+        os.chdir(self.tmp_dir)
+        os.mkdir("Input")
+        os.mkdir("Output")
+        pickle.dump(0, open("UniqueID.pickle", 'w'))
+        self.pool_class = multiprocessing.Pool
+
+    def tearDown(self):
+        multiprocessing.Pool = self.pool_class
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp_dir)
+
+    def writeInput(self, name, events):
+        """Writes a PHOTO style input file with some events"""
+        f = open(os.path.join("Input", name), 'w')
+        f.write('"Start Time (UTCG)","Stop Time (UTCG)","Duration (sec)"\n')
+        for k in xrange(events):
+            f.write('4 Jul 2014 00:%02d:19.332,4 Jul 2014 00:%02d:27.893,8.561\n' % (k, k))
+        f.close()
+
+    def test_pool_reused(self):
+        pool = CountingPool(2)
+        pids = pool.pids()
+        ## Nothing may start a pool of its own
+        multiprocessing.Pool = None
+        try:
+            manifest = EventWatch.loadManifest("Output/EventWatch.json")
+            self.writeInput(photo_names[0], 2)
+            self.writeInput(photo_names[1], 2)
+            results = EventWatch.convertChanged("Input", manifest, pool=pool)
+            self.assertEqual([ok for fname,ok,message in results], [True])
+
+            self.writeInput(photo_names[1], 3)
+            results = EventWatch.convertChanged("Input", manifest, pool=pool)
+            self.assertEqual([ok for fname,ok,message in results], [True])
+            self.assertEqual(EventWatch.convertChanged("Input", manifest, pool=pool), [])
+
+            self.assertEqual(pool.batches, 2)
+            self.assertEqual(pool.pids(), pids)
+            self.assertTrue(set(pool.pool.map(_workerPid, range(20))) <= set(pids))
+        finally:
+            pool.pool.close()
+            pool.pool.join()
+        self.assertEqual(os.listdir("Output").count("PHOTO_20140704000000_20140711000000_20140604124500_V1.xml"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
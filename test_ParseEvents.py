@@ -0,0 +1,132 @@
+##! /usr/bin/python
+__author__ = 'Zach Dischner'
+__copyright__ = "NA"
+__credits__ = ["NA"]
+__license__ = "NA"
+__version__ = "1.0.0"
+__maintainer__ = "Zach Dischner"
+__email__ = "zach.dischner@gmail.com"
+__status__ = "Dev"
+
+"""
+File name: test_ParseEvents.py
+Authors: Zach Dischner
+Created: 7/7/2014
+Modified:
+
+Checks of `ParseEvents` that don't need a full conversion run.
+
+Examples:
+    python -m unittest test_ParseEvents
+"""
+
+# -------------------------
+# --- IMPORT AND GLOBAL ---
+# -------------------------
+import os, shutil, tempfile, unittest
+import xml.etree.cElementTree as ET
+import ParseEvents
+
+"""
+Global Variables
+@param maneuver_v2:     Reissued MANEUVER input file name
+@param maneuver_v1:     Its previous version's XML product name
+"""
+maneuver_v2 = "MANEUVER_SAT1_20140704000000_20140711000000_20140605090000_V2.csv"
+maneuver_v1 = "MANEUVER_20140704000000_20140711000000_20140604124700_V1.xml"
+
+
+class DeltaProductTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.in_dir = os.path.join(self.tmp_dir, "Input")
+        self.out_dir = os.path.join(self.tmp_dir, "Output")
+        os.mkdir(self.in_dir)
+        os.mkdir(self.out_dir)
+        self.filename = os.path.join(self.in_dir, maneuver_v2)
+        f = open(self.filename, 'w')
+        f.write('"Target","Start Time (UTCG)","Stop Time (UTCG)","Duration (sec)"\n')
+        f.write('NADIR,4 Jul 2014 00:58:19.332,4 Jul 2014 00:58:27.893,8.561\n')
+        f.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def writePrevious(self, name):
+        """Writes an empty XML product in the output directory, returns its path"""
+        previous = os.path.join(self.out_dir, name)
+        open(previous, 'w').write('<FDF_to_FP></FDF_to_FP>\n')
+        return previous
+
+    def test_mismatched_previous(self):
+        for name in ["ECLIPSE_20140704000000_20140711000000_20140604123800_V1.xml",
+                     "MANEUVER_20140704000000_20140712000000_20140604124700_V1.xml",
+                     "MANEUVER_20140704000000_20140711000000_20140606124700_V2.xml",
+                     "MANEUVER_20140704000000_20140711000000_20140606124700_V3.xml",
+                     "MANEUVER_20140704000000_20140711000000_20140604124700_V1_DELTA.json"]:
+            previous = self.writePrevious(name)
+            with self.assertRaises(ValueError):
+                ParseEvents.writeDeltaProduct(self.filename, previous=previous, out_dir=self.out_dir)
+            ## Nothing written, not even a manifest
+            self.assertEqual(os.listdir(self.out_dir), [name])
+            os.remove(previous)
+
+    def test_matching_previous(self):
+        ParseEvents.checkPreviousVersion(maneuver_v2.replace('_SAT1', '').replace('.csv', '.xml'),
+                                         os.path.join(self.out_dir, maneuver_v1))
+        ParseEvents.checkPreviousVersion(maneuver_v2.replace('_SAT1', '').replace('.csv', '.xml'),
+                                         os.path.join(self.out_dir, maneuver_v1 + '.gz'))
+
+    def test_batch_delta_from(self):
+        with self.assertRaises(ValueError):
+            ParseEvents.convertFiles([self.filename], workers=1, delta_from=self.writePrevious(maneuver_v1))
+
+
+class PairedEventFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.in_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.in_dir)
+
+    def test_comm_same_key(self):
+        ## Two COMM files, only their creation times differ
+        names = ["COMM_20120717000000_20120719000000_20140604114400_V1.csv",
+                 "COMM_20120717000000_20120719000000_20140604114500_V1.csv"]
+        for name in names:
+            open(os.path.join(self.in_dir, name), 'w').close()
+        for name in names:
+            filename = os.path.join(self.in_dir, name)
+            self.assertEqual(ParseEvents.findPairedEventFiles(filename), ([(filename, None)], filename))
+
+
+class EventTemplateTest(unittest.TestCase):
+    def makeEvent(self, utcStart, duration, uid, sat, param_values):
+        """One-parameter <Event>, the same layout `compileEventEmitter()` builds"""
+        event = ET.Element('Event')
+        ET.SubElement(event,'UTC_Start_Time').text = utcStart
+        ET.SubElement(event,'Duration').text = duration
+        ET.SubElement(event,'Unique_Id').text = uid
+        ET.SubElement(event,'Sat').text = sat
+        param_elem = ET.SubElement(event,'Event_Parameter')
+        ET.SubElement(param_elem,'Event_Par_Name').text = 'Target'
+        ET.SubElement(param_elem,'Event_Par_Value').text = ParseEvents.paramText(param_values[0])
+        return event
+
+    def test_param_values(self):
+        render = ParseEvents.compileEventTemplate(self.makeEvent, 1)
+        for value in ["NADIR", u"Caf\xe9 & <Sol>", 1.5, ""]:
+            fields = ("04-Jul-2014 01:42:00", "60000.0", "1", "SAT1", [value])
+            self.assertEqual(render(*fields), ParseEvents.serializeElement(self.makeEvent(*fields)))
+        self.assertIn("<Event_Par_Value>Caf&#233; &amp; &lt;Sol&gt;</Event_Par_Value>",
+                      render("04-Jul-2014 01:42:00", "60000.0", "1", "SAT1", [u"Caf\xe9 & <Sol>"]))
+
+    def test_plain_text(self):
+        self.assertTrue(ParseEvents.isPlainText(u"Caf\xe9"))
+        self.assertTrue(ParseEvents.isPlainText("NADIR"))
+        self.assertFalse(ParseEvents.isPlainText(""))
+        self.assertFalse(ParseEvents.isPlainText("Caf\xc3\xa9"))
+
+
+if __name__ == "__main__":
+    unittest.main()
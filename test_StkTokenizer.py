@@ -0,0 +1,151 @@
+##! /usr/bin/python
+__author__ = 'Zach Dischner'
+__copyright__ = "NA"
+__credits__ = ["NA"]
+__license__ = "NA"
+__version__ = "1.0.0"
+__maintainer__ = "Zach Dischner"
+__email__ = "zach.dischner@gmail.com"
+__status__ = "Dev"
+
+"""
+File name: test_StkTokenizer.py
+Authors: Zach Dischner
+Created: 7/6/2014
+Modified:
+
+Checks `StkTokenizer` against pandas. For every file, the tokenizer either hands it back to the generic reader
+(None) or returns exactly the frame `pd.read_csv()` plus time parsing makes, to the last bit of every float.
+
+Examples:
+    python -m unittest test_StkTokenizer
+"""
+
+# -------------------------
+# --- IMPORT AND GLOBAL ---
+# -------------------------
+import os, random, shutil, tempfile, unittest
+from cStringIO import StringIO
+import numpy as np
+import pandas as pd
+from pandas.util.testing import assert_frame_equal
+import StkTokenizer
+
+"""
+Global Variables
+@param header:      Header line of the test files
+@param cols:        Column names of the test files
+@param na_values:   Missing value text, as ParseEvents passes it
+@param time_format: strptime format of STK times
+"""
+header = '"Target","Start Time (UTCG)","Stop Time (UTCG)","Duration (sec)"'
+cols = ["Target", "Start", "Stop", "Duration"]
+na_values = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+             'N/A', 'NA', 'NULL', 'NaN', 'n/a', 'nan', 'null']
+time_format = '%d %b %Y %H:%M:%S.%f'
+
+
+class StkTokenizerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def writeFile(self, durations, targets=None):
+        """Writes a MANEUVER style file with one row per duration text, returns its filename"""
+        targets = targets or ['NADIR'] * len(durations)
+        filename = os.path.join(self.tmp_dir, "MANEUVER_SAT1_20140704000000_20140711000000_20140604124700_V1.csv")
+        f = open(filename, 'w')
+        f.write(header + '\n')
+        for k,(target,duration) in enumerate(zip(targets, durations)):
+            f.write('%s,4 Jul 2014 %02d:%02d:00.000,14 Jul 2014 01:43:00.500,%s\n' % (target, k//60 % 24, k % 60, duration))
+        f.close()
+        return filename
+
+    def genericFrame(self, filename):
+        """What the generic reader makes of a file"""
+        df = pd.read_csv(filename, header=0, names=cols)
+        df['StartTime'] = pd.to_datetime(df.Start, format=time_format)
+        df['StopTime'] = pd.to_datetime(df.Stop, format=time_format)
+        return df
+
+    def assertGenericOrEqual(self, filename):
+        """Tokenizer passes the file on or matches pandas exactly. Returns its frame"""
+        df = StkTokenizer.readStkEventFile(filename, cols, na_values=na_values)
+        if df is not None:
+            expected = self.genericFrame(filename)
+            assert_frame_equal(df, expected, check_exact=True)
+            if df.Duration.dtype == np.float64:
+                self.assertTrue((df.Duration.values.view(np.int64) == expected.Duration.values.view(np.int64)).all())
+        return df
+
+    def test_decimals(self):
+        random.seed(7)
+        durations = ['%d.%0*d' % (random.randint(0, 10**random.randint(0, 8)), n, random.randint(0, 10**n - 1))
+                     for n in [random.randint(1, 6) for k in xrange(5000)]]
+        durations += ['0.1', '0.3', '8.561', '1489.405', '.5', '5.', '123456789.123456']
+        df = self.assertGenericOrEqual(self.writeFile(durations))
+        self.assertIsNotNone(df)
+        self.assertEqual(df.Duration.dtype, np.float64)
+
+    def test_integers(self):
+        df = self.assertGenericOrEqual(self.writeFile(['60', '600', '0', '86400']))
+        self.assertIsNotNone(df)
+        self.assertEqual(df.Duration.dtype, np.int64)
+
+    def test_text(self):
+        df = self.assertGenericOrEqual(self.writeFile(['60', '600'], targets=['NADIR', 'SUN']))
+        self.assertIsNotNone(df)
+        self.assertEqual(list(df.Target), ['NADIR', 'SUN'])
+
+    def test_padded_numbers(self):
+        for durations in [[' 60.5', ' 600'], ['60.5 ', '600'], ['\t60', '600'], [' 60', ' 600']]:
+            self.assertIsNone(self.assertGenericOrEqual(self.writeFile(durations)), durations)
+
+    def test_signs(self):
+        for durations in [['-1.5', '2'], ['+2', '3'], ['-7', '-8']]:
+            self.assertIsNone(self.assertGenericOrEqual(self.writeFile(durations)), durations)
+
+    def test_exponents(self):
+        for durations in [['1e3', '2'], ['1.5E-2', '3.0'], ['inf', '1'], ['-inf', 'inf']]:
+            self.assertIsNone(self.assertGenericOrEqual(self.writeFile(durations)), durations)
+
+    def test_missing_values(self):
+        for durations in [['NA', '1.5'], ['', '1.5'], ['nan', 'NaN'], ['1.5', 'NULL']]:
+            self.assertIsNone(self.assertGenericOrEqual(self.writeFile(durations)), durations)
+        for targets in [['NA', 'SUN'], [' NA', 'SUN'], ['True', 'SUN']]:
+            self.assertIsNone(self.assertGenericOrEqual(self.writeFile(['1', '2'], targets=targets)), targets)
+
+    def test_mixed_columns(self):
+        for durations in [['1.5', 'abc'], ['abc', ' 2']]:
+            self.assertIsNone(self.assertGenericOrEqual(self.writeFile(durations)), durations)
+        self.assertIsNone(self.assertGenericOrEqual(self.writeFile(['1', '2'], targets=['SUN', '7'])))
+
+    def test_byte_ranges(self):
+        filename = self.writeFile(['%d.%d' % (k, k % 7) for k in xrange(200)])
+        text = open(filename, 'rb').read()
+        bounds = [text.index('\n') + 1, text.index('\n', len(text)//2) + 1, len(text)]
+        frames = []
+        for start,stop in zip(bounds[:-1], bounds[1:]):
+            df = StkTokenizer.readStkEventFile(filename, cols, na_values=na_values, start=start, stop=stop)
+            expected = pd.read_csv(StringIO(text[start:stop]), header=None, names=cols)
+            expected['StartTime'] = pd.to_datetime(expected.Start, format=time_format)
+            expected['StopTime'] = pd.to_datetime(expected.Stop, format=time_format)
+            assert_frame_equal(df, expected, check_exact=True)
+            frames.append(df)
+        assert_frame_equal(pd.concat(frames, ignore_index=True), self.genericFrame(filename), check_exact=True)
+
+    def test_decode_decimals(self):
+        random.seed(11)
+        texts = ['%d.%0*d' % (random.randint(0, 10**8), n, random.randint(0, 10**n - 1))
+                 for n in [random.randint(1, 7) for k in xrange(20000)]]
+        chars = np.array([list(text.ljust(20, '\0')) for text in texts], dtype='S1').view(np.uint8)
+        digit = (chars >= ord('0')) & (chars <= ord('9'))
+        values = StkTokenizer.decodeDecimals(chars, digit, chars == ord('.'))
+        expected = pd.read_csv(StringIO('\n'.join(['x'] + texts))).x.values
+        self.assertTrue((values.view(np.int64) == expected.view(np.int64)).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
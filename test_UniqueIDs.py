@@ -0,0 +1,76 @@
+##! /usr/bin/python
+__author__ = 'Zach Dischner'
+__copyright__ = "NA"
+__credits__ = ["NA"]
+__license__ = "NA"
+__version__ = "1.0.0"
+__maintainer__ = "Zach Dischner"
+__email__ = "zach.dischner@gmail.com"
+__status__ = "Dev"
+
+"""
+File name: test_UniqueIDs.py
+Authors: Zach Dischner
+Created: 7/7/2014
+Modified:
+
+Checks the `UniqueIDs` counter: concurrent leases never share an ID, and a failed write never loses the counter.
+
+Examples:
+    python -m unittest test_UniqueIDs
+"""
+
+# -------------------------
+# --- IMPORT AND GLOBAL ---
+# -------------------------
+import os, pickle, shutil, tempfile, unittest, multiprocessing
+import UniqueIDs
+
+
+def _leaseMany(pname):
+    """Leases a run of blocks, returns every ID handed out"""
+    uids = []
+    for k in xrange(50):
+        with UniqueIDs.leaseUniqueIDs(3, pname) as lease:
+            first = lease.takeIDs(k % 4)
+            uids.extend(range(first, first + k % 4))
+    return uids
+
+
+class UniqueIDsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.pname = os.path.join(self.tmp_dir, "UniqueID.pickle")
+        pickle.dump(100, open(self.pname, 'w'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_concurrent_leases(self):
+        pool = multiprocessing.Pool(4)
+        try:
+            uids = sum(pool.map(_leaseMany, [self.pname] * 4), [])
+        finally:
+            pool.close()
+            pool.join()
+        self.assertEqual(len(uids), len(set(uids)))
+        self.assertTrue(min(uids) > 100)
+        self.assertTrue(pickle.load(open(self.pname)) >= max(uids))
+
+    def test_failed_write(self):
+        dump = pickle.dump
+        def failingDump(value, f):
+            f.write("I")
+            raise IOError("No space left on device")
+        pickle.dump = failingDump
+        try:
+            with self.assertRaises(IOError):
+                UniqueIDs.reserveUniqueIDs(10, self.pname)
+        finally:
+            pickle.dump = dump
+        self.assertEqual(pickle.load(open(self.pname)), 100)
+        self.assertEqual(UniqueIDs.reserveUniqueIDs(10, self.pname), 101)
+
+
+if __name__ == "__main__":
+    unittest.main()